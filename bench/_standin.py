@@ -0,0 +1,10 @@
+"""
+Puts src/ on sys.path so the benchmarks run from a checkout without
+installing the package. The fake Red Pitaya they talk to is
+rp_comm.fake_redpitaya.FakeRedPitaya.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
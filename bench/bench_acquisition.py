@@ -0,0 +1,66 @@
+"""
+Sustained frame rate of RedPitaya.read_data called in a loop versus the
+background AcquisitionEngine, against the fake board.
+
+    python bench/bench_acquisition.py [seconds] [reply_latency_ms]
+"""
+
+import sys
+import time
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_comm.fake_redpitaya import FakeBoard, FakeRedPitaya
+from rp_plot.acquisition import AcquisitionEngine
+from rp_plot.redpitaya import RedPitaya
+
+SETTINGS = dict(decimation=8, trigger_level=0.0, data_units='Volts', data_format='bin', trigger_source='NOW')
+
+
+def connect(latency):
+    board = FakeBoard()
+    server = FakeRedPitaya(board, latency=latency)
+    rp = RedPitaya(server.host, port=server.port)
+    rp.generate_signal(1, 10000, 0.5)
+    return rp, server
+
+
+def run_read_data(seconds, latency):
+    rp, server = connect(latency)
+    frames, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        rp.read_data(**SETTINGS)
+        frames += 1
+    rate = frames / (time.perf_counter() - start)
+    rp.close()
+    server.close()
+    return rate
+
+
+def run_engine(seconds, latency):
+    rp, server = connect(latency)
+    engine = AcquisitionEngine(rp, **SETTINGS)
+    engine.start()
+    consumed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        if engine.latest() is not None:
+            consumed += 1
+        time.sleep(0.001)
+    engine.stop()
+    stats = engine.stats()
+    rp.close()
+    server.close()
+    assert stats['error'] is None, stats['error']
+    return stats, consumed
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    latency = float(sys.argv[2]) / 1e3 if len(sys.argv) > 2 else 0.5e-3
+
+    before = run_read_data(seconds, latency)
+    stats, consumed = run_engine(seconds, latency)
+    print(f"frames/s ({latency*1e3:.1f} ms reply latency): read_data loop {before:7.1f}   "
+          f"engine {stats['rate']:7.1f}   ({stats['rate'] / before:.1f}x)")
+    print(f"engine: {stats['frames']} frames, {consumed} consumed, {stats['dropped']} dropped, "
+          f"{stats['timeouts']} timeouts")
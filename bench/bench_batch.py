@@ -0,0 +1,49 @@
+"""
+Latency of a full generator + acquisition reconfiguration, sending one write
+per command versus one batched write.
+
+    python bench/bench_batch.py [repeats] [reply_latency_ms]
+"""
+
+import sys
+import time
+from contextlib import nullcontext
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+import rp_comm.redpitaya_scpi as scpi
+from rp_comm.fake_redpitaya import FakeRedPitaya
+
+
+def reconfigure(rp):
+    with rp.batch(opc=True):
+        rp.gen_set(1, scpi.Waveform.SINE, 0.5, 1000, offset=0.1, phase=0)
+        rp.gen_set(2, scpi.Waveform.SQUARE, 0.8, 2000, offset=0.0, phase=90)
+        rp.tx_txt('OUTPUT:STATE ON')
+        rp.acq_set(16, scpi.Units.VOLTS, scpi.DataFormat.BIN)
+        rp.acq_trig_set(0.1, 0)
+        rp.uart_set(115200)
+
+
+def run(batched, repeats, latency):
+    server = FakeRedPitaya(latency=latency)
+    rp = scpi.scpi(server.host, port=server.port)
+    if not batched:
+        rp.batch = lambda opc=False: nullcontext()
+
+    reconfigure(rp)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        reconfigure(rp)
+    elapsed = time.perf_counter() - start
+
+    rp.close()
+    server.close()
+    return elapsed / repeats * 1e3
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) / 1e3 if len(sys.argv) > 2 else 0.0005
+    before = run(False, repeats, latency)
+    after = run(True, repeats, latency)
+    print(f"reconfiguration ({latency * 1e3:.1f} ms reply latency): before {before:6.2f} ms   after {after:6.2f} ms")
@@ -0,0 +1,58 @@
+"""
+Display decimation: cost of minmax/LTTB and the points SerialPlot sends to
+the browser for a 16k-sample capture and a long real time roll over.
+
+    python bench/bench_decimation.py [roll_over]
+"""
+
+import sys
+import time
+
+import numpy as np
+from bokeh.plotting import figure
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_plot.decimation import decimate
+from rp_plot.plot_data import SerialPlot
+
+
+def timeit(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return (time.perf_counter() - start) * 1e3
+
+
+def browser_points(plot):
+    return sum(len(source.data['x']) for source in plot.sources)
+
+
+if __name__ == '__main__':
+    roll_over = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+
+    print("decimation to 2000 points:")
+    for n in (16384, 1_000_000, 10_000_000):
+        x = np.arange(n, dtype=float)
+        y = np.sin(x / 1000) + rng.normal(scale=0.1, size=n)
+        times = "   ".join(f"{m} {timeit(decimate, x, y, 2000, m):7.1f} ms" for m in ('minmax', 'lttb'))
+        print(f"  {n:>9d} samples   {times}")
+
+    capture = rng.normal(size=(16384, 2)).astype(np.float32)
+    samples = rng.normal(size=(2, roll_over))
+    for method in (None, 'minmax', 'lttb'):
+        plot = SerialPlot(figure(width=1000), None, n_plots=2, roll_over=roll_over, rp=object(),
+                          decimation=method, max_batch=100000)
+        capture_ms = timeit(plot.plot_bunch, capture)
+        capture_points = browser_points(plot)
+
+        plot.sources = [type(s)(data=dict(x=[], y=[])) for s in plot.sources]
+        start = time.perf_counter()
+        for pos in range(0, roll_over, 100000):
+            plot.queue_samples(np.arange(pos, pos + 100000, dtype=float), samples[:, pos:pos + 100000])
+            plot.flush_stream()
+        if plot.history is not None:
+            plot.redraw_history()
+        real_time_ms = (time.perf_counter() - start) * 1e3
+
+        print(f"{str(method):6s}: capture {capture_points:6d} points in browser ({capture_ms:6.1f} ms)   "
+              f"real time {roll_over} samples -> {browser_points(plot):8d} points ({real_time_ms:7.1f} ms)")
@@ -0,0 +1,58 @@
+"""
+Capture time of a rack of fake boards, read one after the other with
+RedPitaya.read_data versus in parallel with Fleet.read_data. The boards
+trigger after different delays, so the parallel capture should take as long
+as the slowest board. Finally one board is taken down mid-run.
+
+    python bench/bench_fleet.py [boards] [captures] [latency_ms]
+"""
+
+import sys
+import time
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_comm.fake_redpitaya import FakeBoard, FakeRedPitaya
+from rp_plot.fleet import Fleet
+
+SETTINGS = dict(decimation=64, trigger_level=0.0, data_format='bin', trigger_source='NOW')
+
+
+if __name__ == '__main__':
+    n_boards = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    captures = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    latency = float(sys.argv[3]) / 1e3 if len(sys.argv) > 3 else 1.0e-3
+
+    # Trigger delays from 5 to 20 ms
+    delays = [0.005 + 0.015 * i / max(n_boards - 1, 1) for i in range(n_boards)]
+    servers = [FakeRedPitaya(FakeBoard(trigger_delay=d), latency=latency) for d in delays]
+    hosts = {f'board{i}': f'{s.host}:{s.port}' for i, s in enumerate(servers)}
+
+    with Fleet(hosts) as fleet:
+        fleet.generate_signal(channel=1, frequency=10000, amplitude=0.5)
+
+        start = time.perf_counter()
+        for _ in range(captures):
+            for name in fleet.names:
+                fleet[name].read_data(**SETTINGS)
+        sequential = (time.perf_counter() - start) / captures
+
+        start = time.perf_counter()
+        for _ in range(captures):
+            capture = fleet.read_data(**SETTINGS)
+            assert capture.ok, capture.errors
+        parallel = (time.perf_counter() - start) / captures
+        names, timestamps, data = capture.aligned()
+
+        print(f"{n_boards} boards, trigger after {delays[0] * 1e3:.0f}-{delays[-1] * 1e3:.0f} ms, "
+              f"{latency * 1e3:.1f} ms link latency:")
+        print(f"  sequential read_data   {sequential * 1e3:7.1f} ms per rack capture")
+        print(f"  Fleet.read_data        {parallel * 1e3:7.1f} ms per rack capture   ({sequential / parallel:.1f}x)")
+        print(f"  aligned frames {data.shape}, fill timestamps spread {capture.skew * 1e3:.1f} ms")
+
+        servers[-1].close()
+        capture = fleet.read_data(timeout=0.5, **SETTINGS)
+        print(f"  with board{n_boards - 1} down: {len(capture.aligned()[0])} frames, "
+              f"errors {({k: type(e).__name__ for k, e in capture.errors.items()})}")
+
+    for server in servers[:-1]:
+        server.close()
@@ -0,0 +1,49 @@
+"""
+Bytes per sample, decode rate and the sample rate a UART link can carry with
+CSV text versus binary frames, for two channels of 14-bit ADC codes.
+
+    python bench/bench_framing.py [samples] [baud_rate] [frame_samples]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_plot.framing import StreamDecoder, encode_frame
+
+
+def decode(data, chunk=4096):
+    decoder = StreamDecoder(2)
+    rows = []
+    start = time.perf_counter()
+    for pos in range(0, len(data), chunk):
+        r, _ = decoder.feed(data[pos:pos + chunk])
+        rows.append(r)
+    return time.perf_counter() - start, np.concatenate(rows)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    baud = int(sys.argv[2]) if len(sys.argv) > 2 else 115200
+    frame_samples = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+
+    rng = np.random.default_rng(0)
+    codes = rng.integers(-8192, 8192, size=(n, 2))
+
+    text = b''.join(f"{a},{b}\n".encode() for a, b in codes)
+    frames = b''.join(encode_frame(codes[i:i + frame_samples], sequence=k)
+                      for k, i in enumerate(range(0, n, frame_samples)))
+
+    # 8N1: 10 bits on the line per byte
+    print(f"{n} two-channel samples, {baud} baud, {frame_samples} samples per frame")
+    results = {}
+    for name, data in (('csv', text), ('binary', frames)):
+        elapsed, rows = decode(data)
+        assert np.array_equal(rows, codes)
+        per_sample = len(data) / n
+        results[name] = baud / 10 / per_sample
+        print(f"  {name:7s} {per_sample:5.2f} bytes/sample   decode {n / elapsed / 1e6:6.2f} Msamples/s   "
+              f"link limit {results[name]:8.0f} samples/s")
+    print(f"  binary carries {results['binary'] / results['csv']:.1f}x the samples per second")
@@ -0,0 +1,92 @@
+"""
+Cost of the instrumentation probe: a span and a timed call, disabled and
+enabled, and the *IDN? round trip against the fake Red Pitaya with the probe
+off and on. Then reads frames with the probe enabled and prints the phase
+breakdown of read_data (or writes it as JSON).
+
+    python bench/bench_instrumentation.py [frames] [--json path]
+"""
+
+import json
+import sys
+import timeit
+
+from bokeh.document import Document
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+import rp_comm.redpitaya_scpi as scpi
+from rp_comm.fake_redpitaya import FakeRedPitaya
+from rp_comm.instrumentation import Probe, probe
+from rp_plot.diagnostics import DiagnosticsPanel
+from rp_plot.redpitaya import RedPitaya
+
+
+def overhead(n=200000):
+    local = Probe()
+    timed = local.timed('call')(lambda: None)
+
+    def span():
+        with local.span('span'):
+            pass
+
+    results = {}
+    for enabled in (False, True):
+        local.enable(enabled)
+        state = 'enabled' if enabled else 'disabled'
+        results[f'span {state}'] = min(timeit.repeat(span, number=n, repeat=5)) / n
+        results[f'timed call {state}'] = min(timeit.repeat(timed, number=n, repeat=5)) / n
+    results['plain call'] = min(timeit.repeat(lambda: None, number=n, repeat=5)) / n
+    return results
+
+
+def round_trip(server, n=5000):
+    rp = scpi.scpi(server.host, port=server.port)
+    results = {}
+    for enabled in (False, True):
+        probe.enable(enabled)
+        results['*IDN? ' + ('enabled' if enabled else 'disabled')] = min(
+            timeit.repeat(lambda: rp.txrx_txt('*IDN?'), number=n, repeat=3)) / n
+    rp.close()
+    probe.disable()
+    return results
+
+
+def read_frames(server, frames):
+    probe.reset()
+    probe.enable()
+    rp = RedPitaya(server.host, port=server.port)
+    rp.rp.tx_txt('OUTPUT1:STATE ON')
+    for _ in range(frames):
+        rp.read_data(decimation=64, trigger_level=0.0, data_format='bin', trigger_source='NOW')
+    rp.close()
+    probe.disable()
+
+    # The panel renders what was recorded
+    panel = DiagnosticsPanel()
+    panel.attach_doc(Document())
+    assert len(panel.spans.data['name']) == len(probe.histograms)
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    frames = int(args[0]) if args else 200
+    path = sys.argv[sys.argv.index('--json') + 1] if '--json' in sys.argv else None
+
+    for name, t in overhead().items():
+        print(f"  {name:24s} {t * 1e9:7.1f} ns")
+    with FakeRedPitaya(latency=0.2e-3) as server:
+        for name, t in round_trip(server).items():
+            print(f"  {name:24s} {t * 1e6:7.1f} µs")
+        read_frames(server, frames)
+
+    snapshot = probe.snapshot(buckets=path is not None)
+    if path:
+        with open(path, 'w') as f:
+            json.dump(snapshot, f, indent=2)
+        print(f"Snapshot written to {path}")
+    print(f"read_data, {frames} frames at decimation 64 over a 0.2 ms link:")
+    for name, s in snapshot['spans'].items():
+        print(f"  {name:24s} n={s['count']:6d}   p50 {s['p50_us']:9.1f} µs   p99 {s['p99_us']:9.1f} µs   "
+              f"max {s['max_us']:9.1f} µs   total {s['total_ms']:8.1f} ms")
+    for name, value in snapshot['counters'].items():
+        print(f"  {name:24s} {value}")
@@ -0,0 +1,42 @@
+"""
+Zoom-aware level of detail: cost of building the LODPyramid while streaming
+and the points served for windows from the whole history down to a few
+samples.
+
+    python bench/bench_lod.py [samples] [n_out]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_plot.lod import LODPyramid
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    n_out = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = np.random.default_rng(0)
+    t = np.arange(n) * 1e-3
+    y = np.stack((np.sin(t), np.cos(t))) + rng.normal(scale=0.1, size=(2, n))
+
+    pyramid = LODPyramid(2, capacity=n)
+    start = time.perf_counter()
+    for pos in range(0, n, 2000):
+        pyramid.extend(t[pos:pos + 2000], y[:, pos:pos + 2000])
+    elapsed = time.perf_counter() - start
+    print(f"{n} samples streamed in blocks of 2000: {elapsed * 1e3:.0f} ms "
+          f"({elapsed / n * 1e9:.0f} ns/sample, {len(pyramid.levels)} levels)")
+
+    print(f"windows served with n_out={n_out}:")
+    width = t[-1]
+    while width > 1e-2:
+        x1 = t[-1] / 2 + width / 2
+        start = time.perf_counter()
+        points = pyramid.query(x1 - width, x1, n_out)
+        served = (time.perf_counter() - start) * 1e3
+        lo, hi = pyramid.index(x1 - width, x1)
+        print(f"  {hi - lo:>9d} samples visible -> {len(points[0][0]):5d} points per channel   {served:6.2f} ms")
+        width /= 10
@@ -0,0 +1,65 @@
+"""
+The /metrics endpoint on a Bokeh server plotting a fake serial device with
+the threaded reader, one browser-like client session connected: scrape
+latency while the plot updates, and the exposition text of the last scrape.
+
+    python bench/bench_metrics.py [seconds] [line_rate]
+"""
+
+import sys
+import threading
+import time
+import urllib.request
+
+from bokeh.client import pull_session
+from bokeh.plotting import figure
+from bokeh.server.server import Server
+from tornado.ioloop import IOLoop
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_comm.instrumentation import probe
+from rp_plot.fake_serial import FakeSerialPort
+from rp_plot.metrics import metrics_route
+from rp_plot.plot_data import SerialPlot
+
+
+def serve(plot, started):
+    loop = IOLoop()
+    server = Server({'/': plot.attach_doc}, io_loop=loop, port=0, extra_patterns=[metrics_route(plot)])
+    server.start()
+    started.append((server, loop))
+    loop.start()
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    line_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    probe.enable()
+    port = FakeSerialPort(line_rate=line_rate, jitter=0.002)
+    plot = SerialPlot(figure(), port, n_plots=2, roll_over=5000, rp=object(), threaded_reader=True)
+
+    started = []
+    threading.Thread(target=serve, args=(plot, started), daemon=True).start()
+    while not started:
+        time.sleep(0.01)
+    server, loop = started[0]
+    url = f'http://localhost:{server.port}'
+
+    session = pull_session(url=url)
+    times = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        with urllib.request.urlopen(url + '/metrics') as reply:
+            text = reply.read().decode()
+        times.append(time.perf_counter() - t0)
+        time.sleep(0.05)
+    session.close()
+    plot.reader.stop()
+    loop.add_callback(loop.stop)
+
+    times.sort()
+    print(f"{len(times)} scrapes, p50 {times[len(times) // 2] * 1e3:.2f} ms, max {times[-1] * 1e3:.2f} ms, "
+          f"{len(text.splitlines())} lines:")
+    print(text)
@@ -0,0 +1,74 @@
+"""
+Parsing a synthetic 1 MB two-channel CSV capture: per line decode/split/float
+as SerialPlot.extract_data did, versus the vectorized CSVParser.
+
+    python bench/bench_parsing.py [megabytes] [malformed_fraction]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_plot.parsing import CSVParser
+
+
+def capture(megabytes, malformed, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(megabytes * 1e6 / 16)
+    values = rng.normal(scale=1.5, size=(n, 2))
+    lines = [f"{a:.4f},{b:.4f}\n".encode() for a, b in values]
+    for i in rng.choice(n, int(n * malformed), replace=False):
+        lines[i] = b"1.0,#err\n"
+    return b''.join(lines), n
+
+
+def per_line(data):
+    """Former extract_data + float() per field, over readline() chunks."""
+    rows = []
+    malformed = 0
+    for line in data.splitlines(keepends=True):
+        fields = line.decode('utf-8').rstrip('\n').split(',')
+        row = []
+        for i in range(2):
+            try:
+                row.append(float(fields[i]))
+            except:
+                row.append(np.nan)
+                malformed += 1
+        rows.append(row)
+    return np.array(rows, dtype=np.float32), malformed
+
+
+def vectorized(data, chunk):
+    parser = CSVParser(2)
+    rows = []
+    for pos in range(0, len(data), chunk):
+        r, _ = parser.feed(data[pos:pos + chunk])
+        rows.append(r)
+    return np.concatenate(rows), parser.malformed
+
+
+def timeit(f, *args, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    malformed = float(sys.argv[2]) if len(sys.argv) > 2 else 0.001
+    data, n = capture(megabytes, malformed)
+
+    before, (expected, _) = timeit(per_line, data)
+    print(f"{len(data) / 1e6:.2f} MB, {n} lines, {malformed:.2%} malformed")
+    print(f"  per line          {before * 1e3:8.1f} ms   {len(data) / before / 1e6:7.1f} MB/s")
+    for chunk in (4096, 65536, len(data)):
+        after, (rows, bad) = timeit(vectorized, data, chunk)
+        assert np.allclose(rows, expected, equal_nan=True, atol=1e-4)
+        print(f"  CSVParser {chunk:>7d} B chunks {after * 1e3:8.1f} ms   {len(data) / after / 1e6:7.1f} MB/s"
+              f"   ({before / after:.1f}x, {bad} malformed)")
@@ -0,0 +1,75 @@
+"""
+Sustained recording throughput of the Recorder writer thread, and the cost
+recording adds to SerialPlot.flush_stream (the live view).
+
+    python bench/bench_recorder.py [seconds] [block_samples] [directory]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from bokeh.plotting import figure
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_plot.plot_data import SerialPlot
+from rp_plot.recorder import Recorder, h5py
+
+
+def sustained(directory, format, seconds, block):
+    """Queue blocks as fast as the writer takes them (blocking put)."""
+    t = np.arange(block, dtype=float)
+    y = np.random.default_rng(0).normal(size=(2, block)).astype(np.float32)
+    recorder = Recorder(os.path.join(directory, format), 2, format=format, max_bytes=64 * 2**20)
+    start = time.perf_counter()
+    blocks = 0
+    while time.perf_counter() - start < seconds:
+        recorder.queue.put((t + blocks * block, y))
+        blocks += 1
+    recorder.close()
+    elapsed = time.perf_counter() - start
+    size = sum(os.path.getsize(f) for f in recorder.files)
+    assert recorder.samples == blocks * block
+    return recorder.samples / elapsed, size / elapsed, len(recorder.files)
+
+
+def live_view(directory, block, repeats=2000):
+    """Mean and worst flush_stream time with and without a recorder."""
+    rng = np.random.default_rng(0)
+    result = {}
+    for recording in (False, True):
+        plot = SerialPlot(figure(), None, rp=object(), roll_over=100000, max_batch=block + 1)
+        if recording:
+            plot.start_recording(os.path.join(directory, 'live'))
+        times = []
+        for k in range(repeats):
+            plot.queue_samples(np.arange(k * block, (k + 1) * block, dtype=float), rng.normal(size=(2, block)))
+            start = time.perf_counter()
+            plot.flush_stream()
+            times.append(time.perf_counter() - start)
+        dropped = plot.recorder.dropped if recording else 0
+        plot.stop_recording()
+        result[recording] = (np.mean(times) * 1e6, np.max(times) * 1e3, dropped)
+    return result
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    block = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    directory = sys.argv[3] if len(sys.argv) > 3 else None
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        print(f"sustained write, two channels, blocks of {block} samples ({tmp}):")
+        for format in ('npy', 'hdf5'):
+            if format == 'hdf5' and h5py is None:
+                print("  hdf5  skipped, h5py not installed")
+                continue
+            rate, bandwidth, files = sustained(tmp, format, seconds, block)
+            print(f"  {format:5s} {rate / 1e6:7.2f} Msamples/s   {bandwidth / 2**20:7.1f} MiB/s   {files} segment(s)")
+
+        print("SerialPlot.flush_stream:")
+        for recording, (mean, worst, dropped) in live_view(tmp, block).items():
+            print(f"  {'recording' if recording else 'not recording':14s} mean {mean:7.1f} us   "
+                  f"worst {worst:6.2f} ms   {dropped} blocks dropped")
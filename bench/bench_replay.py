@@ -0,0 +1,61 @@
+"""
+Deterministic replay of a recording through SerialPlot.update_real_time
+(read -> parse -> buffer -> render), as fast as possible, with CSV text and
+binary frames. Records a synthetic capture first unless a recording path is
+given; with --profile the slowest functions of each run are listed.
+
+    python bench/bench_replay.py [recording] [--profile]
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import time
+
+import numpy as np
+from bokeh.plotting import figure
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_plot.plot_data import SerialPlot
+from rp_plot.recorder import Recorder
+from rp_plot.replay import ReplaySerial
+
+
+def synthetic(path, n=200000):
+    t = np.arange(n) * 1e-4
+    y = np.stack((np.sin(2 * np.pi * 50 * t), np.sign(np.sin(2 * np.pi * 5 * t))))
+    with Recorder(path, 2) as recorder:
+        recorder.write(t, y)
+    return path
+
+
+def replay(path, encoding):
+    port = ReplaySerial(path, speed=None, encoding=encoding)
+    plot = SerialPlot(figure(), port, n_plots=port.y.shape[0], rp=object(), roll_over=len(port.t))
+    start = time.perf_counter()
+    while not port.finished:
+        plot.update_real_time()
+    plot.flush_stream()
+    elapsed = time.perf_counter() - start
+    assert len(plot.store) == len(port.t)
+    return elapsed, len(port.t)
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if a != '--profile']
+    profile = '--profile' in sys.argv
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args[0] if args else synthetic(os.path.join(tmp, 'synthetic'))
+        for encoding in ('csv', 'binary'):
+            profiler = cProfile.Profile() if profile else None
+            if profiler:
+                profiler.enable()
+            elapsed, n = replay(path, encoding)
+            if profiler:
+                profiler.disable()
+            print(f"{encoding:7s} {n} samples in {elapsed * 1e3:7.1f} ms   {n / elapsed / 1e6:5.2f} Msamples/s")
+            if profiler:
+                pstats.Stats(profiler).sort_stats('cumulative').print_stats(12)
@@ -0,0 +1,64 @@
+"""
+Throughput of scpi.rx_arb for a full 16k-sample float buffer, before and after
+the preallocated block reader.
+
+    python bench/bench_rx_arb.py [repeats]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+import rp_comm.redpitaya_scpi as scpi
+from rp_comm.fake_redpitaya import FakeRedPitaya
+
+
+def legacy_rx_arb(rp):
+    """Byte-wise header parsing and ``data +=`` payload growth (previous implementation)."""
+    data = b''
+    while len(data) != 1:
+        data = rp._socket.recv(1)
+    if data != b'#':
+        return False
+    data = b''
+    while len(data) != 1:
+        data = rp._socket.recv(1)
+    numOfNumBytes = int(data)
+    data = b''
+    while len(data) != numOfNumBytes:
+        data += rp._socket.recv(1)
+    numOfBytes = int(data)
+    data = b''
+    while len(data) < numOfBytes:
+        r_size = min(numOfBytes - len(data), 4096)
+        data += rp._socket.recv(r_size)
+    rp._socket.recv(2)
+    return data
+
+
+def run(reader, repeats, n_samples=16384):
+    server = FakeRedPitaya()
+    rp = scpi.scpi(server.host, port=server.port)
+    rp.tx_txt('OUTPUT1:STATE ON')
+    rp.tx_txt('ACQ:DATA:FORMAT BIN')
+    reply_size = len(server.board.data(1))
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        rp.tx_txt('ACQ:SOUR1:DATA?')
+        buff = np.frombuffer(reader(rp), dtype='>f4')
+    elapsed = time.perf_counter() - start
+
+    assert buff.shape[0] == n_samples
+    rp.close()
+    server.close()
+    return repeats * reply_size / elapsed / 1e6
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    before = run(legacy_rx_arb, repeats)
+    after = run(lambda rp: rp.rx_arb(), repeats)
+    print(f"rx_arb 16k float32: before {before:8.1f} MB/s   after {after:8.1f} MB/s   ({after / before:.1f}x)")
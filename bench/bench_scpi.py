@@ -0,0 +1,76 @@
+"""
+Latency and throughput of the blocking SCPI client against the fake Red
+Pitaya, with an emulated network link, and how it behaves under injected
+faults.
+
+    python bench/bench_scpi.py [repeats] [latency_ms] [bandwidth_MBps]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+import rp_comm.redpitaya_scpi as scpi
+from rp_comm.fake_redpitaya import Faults, FakeRedPitaya
+
+
+def query_latency(server, repeats):
+    rp = scpi.scpi(server.host, port=server.port)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rp.txrx_txt('*IDN?')
+        times.append(time.perf_counter() - start)
+    rp.close()
+    return np.percentile(times, [50, 99]) * 1e3
+
+
+def data_throughput(server, data_format, repeats):
+    rp = scpi.scpi(server.host, port=server.port)
+    rp.tx_txt('OUTPUT1:STATE ON')
+    rp.acq_set(16, scpi.Units.VOLTS, data_format)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        y = rp.acq_data(1)
+    elapsed = time.perf_counter() - start
+    rp.close()
+    return repeats * len(y) / elapsed / 1e6, elapsed / repeats * 1e3
+
+
+def under_faults(repeats):
+    faults = Faults(error_rate=0.05, drop_rate=0.02, corrupt_rate=0.02, seed=1)
+    with FakeRedPitaya(faults=faults) as server:
+        rp = scpi.scpi(server.host, timeout=0.2, port=server.port)
+        timeouts = mismatched = 0
+        for _ in range(repeats):
+            try:
+                if rp.txrx_txt('*IDN?').strip() != 'REDPITAYA,FAKE,0,0':
+                    mismatched += 1
+            except OSError:
+                timeouts += 1
+            except ValueError:
+                # Corrupted bytes that are not valid UTF-8
+                mismatched += 1
+        rp.close()
+        return server.stats, timeouts, mismatched
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) / 1e3 if len(sys.argv) > 2 else 0.0
+    bandwidth = float(sys.argv[3]) * 1e6 if len(sys.argv) > 3 else None
+
+    print(f"link: {latency * 1e3:.2f} ms latency, "
+          f"{'unlimited' if bandwidth is None else f'{bandwidth / 1e6:.1f} MB/s'} bandwidth")
+    with FakeRedPitaya(latency=latency, bandwidth=bandwidth) as server:
+        p50, p99 = query_latency(server, repeats)
+        print(f"  *IDN? round trip   p50 {p50:6.3f} ms   p99 {p99:6.3f} ms")
+        for data_format in (scpi.DataFormat.ASCII, scpi.DataFormat.BIN):
+            rate, per = data_throughput(server, data_format, max(repeats // 10, 5))
+            print(f"  ACQ DATA? {data_format.name:5s}    {rate:6.2f} Msamples/s   {per:6.2f} ms per 16k buffer")
+
+    stats, timeouts, mismatched = under_faults(repeats)
+    print(f"faults over {repeats} queries: {stats['dropped']} dropped -> {timeouts} client timeouts, "
+          f"{stats['corrupted']} corrupted -> {mismatched} bad replies, {stats['errors']} board errors queued")
@@ -0,0 +1,92 @@
+"""
+End-to-end load test of SerialPlot with a fake serial device: samples/s
+ingested through update_real_time and update_oscilloscope, the Bokeh
+document events (patches) generated per second and the share of wall time
+spent in the callbacks, at several line rates. The periodic callback is
+emulated every update_time ms.
+
+    python bench/bench_serialplot.py [seconds] [update_time_ms] [--pty]
+"""
+
+import sys
+import time
+
+import serial
+from bokeh.document import Document
+from bokeh.plotting import figure
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_plot.fake_serial import FakeSerialPort, PtySerialDevice
+from rp_plot.plot_data import SerialPlot
+
+
+def drive(plot, callback, seconds, update_time):
+    doc = Document()
+    doc.add_root(plot.plot_b)
+    events = []
+    doc.on_change(lambda event: events.append(event))
+
+    busy = 0.0
+    start = time.perf_counter()
+    tick = start
+    while tick - start < seconds:
+        t0 = time.perf_counter()
+        callback()
+        busy += time.perf_counter() - t0
+        tick += update_time / 1e3
+        time.sleep(max(0.0, tick - time.perf_counter()))
+    plot.flush_stream()
+    elapsed = time.perf_counter() - start
+    return elapsed, len(events), busy
+
+
+def real_time(line_rate, seconds, update_time, jitter=0.002):
+    port = FakeSerialPort(line_rate=line_rate, jitter=jitter)
+    plot = SerialPlot(figure(), port, n_plots=2, roll_over=5000, rp=object(), update_time=update_time)
+    elapsed, events, busy = drive(plot, plot.update_real_time, seconds, update_time)
+    return port.sent_samples / elapsed, plot.counter / elapsed, events / elapsed, busy / elapsed
+
+
+def oscilloscope(bunch_size, bunch_rate, seconds, update_time):
+    port = FakeSerialPort(bunch_size=bunch_size, bunch_rate=bunch_rate)
+    plot = SerialPlot(figure(), port, n_plots=2, rp=object(), oscilloscope_mode=True, update_time=update_time)
+    plotted = []
+    plot_bunch = plot.plot_bunch
+    plot.plot_bunch = lambda data: (plotted.append(len(data)), plot_bunch(data))
+    elapsed, events, busy = drive(plot, plot.update_oscilloscope, seconds, update_time)
+    return port.sent_samples / elapsed, sum(plotted) / elapsed, events / elapsed, busy / elapsed
+
+
+def pty_real_time(line_rate, seconds, update_time):
+    with PtySerialDevice(line_rate=line_rate) as device:
+        port = serial.Serial(device.port, baudrate=115200)
+        plot = SerialPlot(figure(), port, n_plots=2, roll_over=5000, rp=object(), update_time=update_time,
+                          threaded_reader=True)
+        elapsed, events, busy = drive(plot, plot.update_real_time, seconds, update_time)
+        plot.reader.stop()
+        port.close()
+        return device.sent_samples / elapsed, plot.reader.ring.written / elapsed, events / elapsed, busy / elapsed
+
+
+def report(label, offered, ingested, events, busy):
+    print(f"  {label:24s} offered {offered:9.0f}/s   ingested {ingested:9.0f}/s   "
+          f"{events:6.1f} patches/s   callbacks {busy:6.1%} of wall time")
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if a != '--pty']
+    seconds = float(args[0]) if args else 2.0
+    update_time = float(args[1]) if len(args) > 1 else 25.0
+
+    print(f"update_real_time, two channels, callback every {update_time:.0f} ms:")
+    for line_rate in (1000, 10000, 100000, 300000):
+        report(f"{line_rate} lines/s", *real_time(line_rate, seconds, update_time))
+
+    print("update_oscilloscope, start/stop bursts:")
+    for bunch_size, bunch_rate in ((1024, 20), (16384, 10), (16384, 40)):
+        report(f"{bunch_size} x {bunch_rate}/s", *oscilloscope(bunch_size, bunch_rate, seconds, update_time))
+
+    if '--pty' in sys.argv:
+        print("threaded reader on a pseudo terminal:")
+        for line_rate in (1000, 10000, 50000):
+            report(f"{line_rate} lines/s", *pty_real_time(line_rate, seconds, update_time))
@@ -0,0 +1,92 @@
+"""
+Time and number of Bokeh document events for SerialPlot.update_real_time
+draining a backlog of serial lines: one stream() per sample and channel
+versus one stream() per source and callback.
+
+    python bench/bench_stream.py [lines]
+"""
+
+import sys
+import time
+
+import numpy as np
+from bokeh.document import Document
+from bokeh.plotting import figure
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_plot.plot_data import SerialPlot
+
+
+class LinePort:
+    """Serial port stand-in returning prepared lines."""
+    is_open = True
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.pos = 0
+        self.in_waiting = sum(len(line) for line in lines)
+
+    def readline(self):
+        line = self.lines[self.pos]
+        self.pos += 1
+        self.in_waiting -= len(line)
+        return line
+
+    def read(self, size):
+        # Whole lines only, enough for the benchmark
+        lines = []
+        while size > 0 and self.pos < len(self.lines):
+            lines.append(self.lines[self.pos])
+            size -= len(self.lines[self.pos])
+            self.in_waiting -= len(self.lines[self.pos])
+            self.pos += 1
+        return b''.join(lines)
+
+
+def update_per_sample(self):
+    """SerialPlot.update_real_time before batching."""
+    if self.data_collect is not None and self.data_collect.is_open:
+        while self.data_collect.in_waiting:
+            data = self.data_collect.readline().decode('utf-8').rstrip('\n').split(',')
+
+            for i in range(self.n_plots):
+                try:
+                    y_temp = float(data[i])
+                    end = time.time()
+                except:
+                    print("Data not recognized, skipping plot.")
+                    continue
+
+                elapsed_time = end - self.start
+                new_data = dict(x=[elapsed_time], y=[y_temp])
+
+                self.sources[i].stream(new_data, rollover=self.roll_over)
+
+            self.counter += 1
+
+
+def run(update, lines):
+    port = LinePort(lines)
+    plot = SerialPlot(figure(), port, n_plots=2, roll_over=5000, rp=object(), max_batch=len(lines))
+    doc = Document()
+    doc.add_root(plot.plot_b)
+    events = []
+    doc.on_change(lambda event: events.append(event))
+
+    start = time.perf_counter()
+    while port.in_waiting:
+        update(plot)
+    elapsed = time.perf_counter() - start
+    assert len(plot.sources[0].data['x']) == min(len(lines), 5000)
+    return elapsed, len(events)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = np.random.default_rng(0)
+    lines = [f"{a:.4f},{b:.4f}\n".encode() for a, b in rng.normal(size=(n, 2))]
+
+    before, before_events = run(update_per_sample, lines)
+    after, after_events = run(SerialPlot.update_real_time, lines)
+    print(f"{n} lines: per sample {before * 1e3:8.1f} ms, {before_events} events   "
+          f"batched {after * 1e3:8.1f} ms, {after_events} events   ({before / after:.1f}x)")
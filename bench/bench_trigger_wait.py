@@ -0,0 +1,69 @@
+"""
+CPU time, FILL? queries and trigger-to-data latency of waiting for the
+acquisition buffer: the former busy loop versus RedPitaya.wait_filled,
+against the fake board.
+
+    python bench/bench_trigger_wait.py [repeats] [reply_latency_ms]
+"""
+
+import sys
+import time
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_comm.fake_redpitaya import FakeBoard, FakeRedPitaya
+from rp_comm.instrumentation import probe
+from rp_plot.redpitaya import RedPitaya
+
+# (label, decimation, trigger delay in s)
+CASES = [
+    ('fast trigger, dec 8', 8, 0.0),
+    ('fast trigger, dec 1024', 1024, 0.0),
+    ('slow trigger (0.3 s), dec 64', 64, 0.3),
+]
+
+
+def busy_wait(rp, timeout=5):
+    """RedPitaya.read_data polling before adaptive waiting."""
+    start = time.time()
+    while True:
+        probe.count('read_data.fill_queries')
+        rp.rp.tx_txt('ACQ:TRig:FILL?')
+        if rp.rp.rx_txt().strip() == '1':
+            break
+        if time.time() - start > timeout:
+            raise TimeoutError("Trigger timeout")
+
+
+def run(wait, board, rp, decimation, repeats):
+    cpu = latency = 0.0
+    probe.reset()
+    probe.enable()
+    for _ in range(repeats):
+        rp.arm(decimation, 0.0, 'volts', 'bin', 'NOW')
+        t0 = time.thread_time()
+        wait(rp)
+        cpu += time.thread_time() - t0
+        rp.read_channels()
+        # Time from the buffer being full on the board to the data on the host
+        latency += time.monotonic() - (board.acq_started + board.trigger_delay + board.fill_time())
+        rp.stop_acquisition()
+    probe.disable()
+    return cpu / repeats, probe.counters.get('read_data.fill_queries', 0) / repeats, latency / repeats
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    reply_latency = float(sys.argv[2]) / 1e3 if len(sys.argv) > 2 else 0.2e-3
+
+    for label, decimation, trigger_delay in CASES:
+        board = FakeBoard(trigger_delay)
+        server = FakeRedPitaya(board, latency=reply_latency)
+        rp = RedPitaya(server.host, port=server.port)
+
+        print(f"{label} (fill {rp.fill_time(decimation) * 1e3:.1f} ms):")
+        for name, wait in (('busy loop', busy_wait), ('wait_filled', RedPitaya.wait_filled)):
+            cpu, queries, latency = run(wait, board, rp, decimation, repeats)
+            print(f"  {name:12s} cpu {cpu * 1e3:8.2f} ms   FILL? {queries:7.1f}   trigger-to-data {latency * 1e3:6.2f} ms")
+
+        rp.close()
+        server.close()
@@ -0,0 +1,76 @@
+"""
+Runs the asyncio SCPI client against the fake Red Pitaya server while a
+ticker coroutine measures how long the event loop is blocked.
+
+    python bench/harness_async.py [acquisitions]
+"""
+
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+from rp_comm.fake_redpitaya import AsyncFakeRedPitaya
+from rp_comm.redpitaya_scpi import DataFormat, Units, Waveform
+from rp_comm.redpitaya_scpi_async import scpi_async
+
+
+async def ticker(stop, stalls, period=0.001):
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(period)
+        now = time.perf_counter()
+        stalls.append(now - last - period)
+        last = now
+
+
+async def acquire(rp, units, data_format):
+    async with rp.batch():
+        await rp.acq_set(64, units, data_format)
+        await rp.acq_trig_set(0.0, 0)
+        await rp.acq_start()
+        await rp.tx_txt('ACQ:TRig NOW')
+    while not await rp.acq_trig_fill():
+        await asyncio.sleep(0.0005)
+    return await rp.acq_data(1), await rp.acq_data(2)
+
+
+async def main(acquisitions):
+    stop, stalls = asyncio.Event(), []
+    async with AsyncFakeRedPitaya() as server:
+        rp = await scpi_async.open(server.host, port=server.port, skip_redundant=True)
+        tick = asyncio.create_task(ticker(stop, stalls))
+
+        async with rp.batch(opc=True):
+            await rp.gen_set(1, Waveform.SINE, 0.5, 1000)
+            await rp.gen_set(2, Waveform.SQUARE, 0.8, 2000)
+            await rp.tx_txt('OUTPUT:STATE ON')
+        print(await rp.idn_q())
+
+        start = time.perf_counter()
+        for i in range(acquisitions):
+            units, data_format = [(Units.VOLTS, DataFormat.BIN), (Units.RAW, DataFormat.BIN),
+                                  (Units.VOLTS, DataFormat.ASCII)][i % 3]
+            ch1, ch2 = await acquire(rp, units, data_format)
+            expected = server.board.waveform(1)
+            if units == Units.RAW:
+                expected = np.round(expected * 2**13)
+            assert np.allclose(ch1, expected, atol=1e-5), "channel 1 data mismatch"
+            assert ch2.size == expected.size
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        await tick
+        await rp.close()
+
+    stalls = np.array(stalls) * 1e3
+    print(f"{acquisitions} acquisitions in {elapsed:.2f} s")
+    print(f"loop stall: median {np.median(stalls):.3f} ms, p99 {np.percentile(stalls, 99):.3f} ms, "
+          f"max {stalls.max():.3f} ms")
+    assert not rp.pop_errors()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 30))
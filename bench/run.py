@@ -0,0 +1,222 @@
+"""
+Headless benchmark suite of the SCPI, parsing and plotting hot paths.
+
+Every case is timed over repeated rounds after a warm-up round; the results
+(best, median and spread per call, and the throughput in the case's unit)
+are written as JSON together with the commit and the library versions, so
+runs of two commits can be compared.
+
+    python bench/run.py [-o results.json] [-k pattern] [--min-time 0.5]
+    python bench/run.py --compare before.json after.json [--threshold 0.25]
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from bokeh.document import Document
+from bokeh.models import ColumnDataSource
+from bokeh.plotting import figure
+
+import _standin  # noqa: F401  (adds src/ to sys.path)
+import rp_comm.redpitaya_scpi as scpi
+from rp_comm.fake_redpitaya import FakeBoard, FakeRedPitaya
+from rp_plot.fake_serial import SignalGenerator
+from rp_plot.plot_data import SerialPlot
+from rp_plot.redpitaya import RedPitaya
+
+CASES = {}
+
+
+def case(unit, per_call):
+    """
+    Register a benchmark: the decorated function does the setup and returns
+    (run, cleanup), run() is timed and processes `per_call` units.
+    """
+    def register(setup):
+        CASES[setup.__name__] = (setup, unit, per_call)
+        return setup
+    return register
+
+
+@case('queries', 1)
+def scpi_rx_txt():
+    server = FakeRedPitaya()
+    rp = scpi.scpi(server.host, port=server.port)
+
+    def run():
+        rp.txrx_txt('*IDN?')
+    return run, lambda: (rp.close(), server.close())
+
+
+@case('MB', 16384 * 4 / 1e6)
+def scpi_rx_arb():
+    server = FakeRedPitaya()
+    rp = scpi.scpi(server.host, port=server.port)
+    rp.tx_txt('OUTPUT1:STATE ON')
+    rp.tx_txt('ACQ:DATA:FORMAT BIN')
+
+    def run():
+        rp.tx_txt('ACQ:SOUR1:DATA?')
+        rp.rx_arb()
+    return run, lambda: (rp.close(), server.close())
+
+
+def _acq_reply(data_format):
+    board = FakeBoard(noise=0.01)
+    for cmd in ('OUTPUT1:STATE ON', f'ACQ:DATA:FORMAT {data_format}'):
+        board.handle(cmd)
+    return board.data(1)
+
+
+@case('Msamples', 16384 / 1e6)
+def acq_decode_ascii():
+    reply = _acq_reply('ASCII').decode()
+
+    def run():
+        scpi.scpi._decode_acq_ascii(reply)
+    return run, None
+
+
+@case('Msamples', 16384 / 1e6)
+def acq_decode_bin():
+    reply = _acq_reply('BIN')
+    payload = reply[2 + int(reply[1:2]):-2]
+
+    def run():
+        scpi.scpi._decode_acq_bin(payload, scpi.Units.VOLTS).astype(np.float32)
+    return run, None
+
+
+@case('frames', 1)
+def read_data():
+    server = FakeRedPitaya(latency=0.2e-3)
+    rp = RedPitaya(server.host, port=server.port)
+    rp.rp.tx_txt('OUTPUT1:STATE ON')
+
+    def run():
+        rp.read_data(decimation=8, trigger_level=0.0, data_format='bin', trigger_source='NOW')
+    return run, lambda: (rp.close(), server.close())
+
+
+class _BytesPort:
+    is_open = True
+
+    def __init__(self, data):
+        self.data = data
+        self.in_waiting = len(data)
+
+    def read(self, size):
+        self.in_waiting = len(self.data)
+        return self.data
+
+
+@case('Msamples', 16384 / 1e6)
+def extract_bunch():
+    port = _BytesPort(SignalGenerator(2).bunch(16384))
+    plot = SerialPlot(figure(), port, n_plots=2, rp=object(), oscilloscope_mode=True)
+
+    def run():
+        assert len(plot.extract_bunch()) == 16384
+    return run, None
+
+
+@case('updates', 1)
+def cds_stream():
+    source = ColumnDataSource(data=dict(x=[], y=[]))
+    doc = Document()
+    plot = figure()
+    plot.line('x', 'y', source=source)
+    doc.add_root(plot)
+    x = np.arange(2000, dtype=float)
+    y = np.random.default_rng(0).normal(size=2000)
+
+    def run():
+        source.stream(dict(x=x, y=y), rollover=5000)
+    return run, None
+
+
+def measure(setup, min_time, min_rounds=5, max_rounds=10000):
+    run, cleanup = setup()
+    try:
+        run()
+        times = []
+        start = time.perf_counter()
+        while len(times) < max_rounds and (len(times) < min_rounds or time.perf_counter() - start < min_time):
+            t0 = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - t0)
+    finally:
+        if cleanup is not None:
+            cleanup()
+    return times
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import bokeh
+    return dict(commit=commit, python=platform.python_version(), numpy=np.__version__, bokeh=bokeh.__version__,
+                machine=platform.machine(), system=platform.system(), date=time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+
+def run_suite(pattern, min_time):
+    results = {}
+    for name, (setup, unit, per_call) in CASES.items():
+        if pattern and pattern not in name:
+            continue
+        times = measure(setup, min_time)
+        best, median = min(times), statistics.median(times)
+        results[name] = dict(unit=unit, rounds=len(times), best=best, median=median,
+                             stdev=statistics.stdev(times) if len(times) > 1 else 0.0,
+                             throughput=per_call / median)
+        print(f"{name:20s} {median * 1e3:9.3f} ms/call (best {best * 1e3:8.3f})   "
+              f"{per_call / median:12.2f} {unit}/s   {len(times)} rounds")
+    return results
+
+
+def compare(before, after, threshold):
+    """
+    Print the throughput change of the cases in both result files, returns
+    the number of regressions larger than `threshold`.
+    """
+    print(f"{before['environment']['commit']} -> {after['environment']['commit']}")
+    regressions = 0
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if old is None:
+            continue
+        change = new['throughput'] / old['throughput'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{name:20s} {old['throughput']:12.2f} -> {new['throughput']:12.2f} {new['unit']}/s   {change:+7.1%}{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-o', '--output', help='JSON file for the results')
+    parser.add_argument('-k', dest='pattern', help='only cases whose name contains this')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds spent timing each case')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.25, help='throughput loss reported as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            sys.exit(1 if compare(json.load(f), json.load(g), args.threshold) else 0)
+
+    output = dict(environment=environment(), results=run_suite(args.pattern, args.min_time))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Results written to {args.output}")
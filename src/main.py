@@ -6,6 +6,8 @@ from threading import Thread
 from tornado.ioloop import IOLoop
 
 from rp_plot.plot_data import SerialPlot
+from rp_plot.diagnostics import DiagnosticsPanel
+from rp_plot.metrics import metrics_route
 import serial
 
 from bokeh.plotting import figure as bk_figure
@@ -13,6 +15,7 @@ from bokeh.models import Range1d
 from ui_pyside.applications import Oscilloscope
 
 import sys
+import os
 
 dark_theme = """
     QWidget {
@@ -179,18 +182,27 @@ bokeh_plot = SerialPlot(plot_b=p,
                         update_time=1,
                         scatter_plot=True,
                         # oscilloscope_mode=True,
-                        data_collect=serial_rp
+                        data_collect=serial_rp,
+                        threaded_reader=True
 )
 
 def modify_doc(doc, bokeh_plot):
   bokeh_plot.attach_doc(doc)
 
+def diagnostics_doc(doc):
+  # Timing spans and counters of the pipeline, one panel per browser session
+  # (instrumentation is off until enabled there or with RP_INSTRUMENTATION=1)
+  DiagnosticsPanel().attach_doc(doc)
+
 def start_bokeh_server():
     loop = IOLoop()
     loop.make_current()
-    server = Server({'/': lambda doc: modify_doc(doc, bokeh_plot=bokeh_plot)}, io_loop=loop, allow_websocket_origin=["localhost:5006"])
+    # Prometheus metrics at http://localhost:5006/metrics with RP_METRICS=1,
+    # the span latencies need RP_INSTRUMENTATION=1 as well
+    extra_patterns = [metrics_route(bokeh_plot)] if os.environ.get('RP_METRICS', '') not in ('', '0') else []
+    server = Server({'/': lambda doc: modify_doc(doc, bokeh_plot=bokeh_plot), '/diagnostics': diagnostics_doc}, io_loop=loop, allow_websocket_origin=["localhost:5006"], extra_patterns=extra_patterns)
     server.start()
-    print("Bokeh server started at http://localhost:5006")
+    print("Bokeh server started at http://localhost:5006 (diagnostics at /diagnostics)")
     loop.start()
 
 if __name__ == '__main__':
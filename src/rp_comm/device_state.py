@@ -0,0 +1,122 @@
+"""
+Shadow copy of the Red Pitaya settings written over SCPI.
+"""
+
+import re
+from typing import Dict, Optional, Tuple
+
+
+# Settings whose last written value is tracked, matched against the normalised header
+TRACKED = re.compile(
+    r"^(?:"
+    r"SOUR[12]:(?:FUNC|FREQ:FIX|VOLT|VOLT:OFFS|PHAS|DCYC|LOAD|TRIG:SOUR"
+    r"|BURS:STAT|BURS:NCYC|BURS:NOR|BURS:INT:PER|BURS:LASTVALUE|INITVALUE)"
+    r"|OUTPUT[12]:STATE"
+    r"|ACQ:(?:DEC:FACTOR|AVG|DATA:UNITS|DATA:FORMAT|SOUR[1-4]:GAIN|SOUR[1-4]:COUP"
+    r"|TRIG:LEV|TRIG:DLY|TRIG:DLY:NS|TRIG:HYST|TRIG:EXT:DEBOUNCER:US)"
+    r")$"
+)
+
+# Alternative headers of the same setting
+ALIASES = {
+    "ACQ:DEC": "ACQ:DEC:FACTOR",
+}
+
+# Settings written through more than one header: the trigger delay in
+# samples or in ns, and the shared or per-channel (split trigger mode)
+# decimation, averaging, delay and level. A write through one header drops
+# the values cached for the others.
+FAMILIES = (
+    ("ACQ:DEC:FACTOR",) + tuple(f"ACQ:DEC:FACTOR:CH{n}" for n in range(1, 5)),
+    ("ACQ:AVG",) + tuple(f"ACQ:AVG:CH{n}" for n in range(1, 5)),
+    ("ACQ:TRIG:DLY", "ACQ:TRIG:DLY:NS") + tuple(f"ACQ:TRIG:DLY{ns}:CH{n}" for ns in ("", ":NS") for n in range(1, 5)),
+    ("ACQ:TRIG:LEV",) + tuple(f"ACQ:TRIG:LEV:CH{n}" for n in range(1, 5)),
+)
+SIBLINGS = {key: tuple(k for k in family if k != key) for family in FAMILIES for key in family}
+
+# Commands that reset part of the device, mapped to the prefixes they invalidate
+RESETS = {
+    "*RST": ("",),
+    "ACQ:RST": ("ACQ:",),
+    "SOUR:FUNC:RESET": ("SOUR1:", "SOUR2:", "OUTPUT1:", "OUTPUT2:"),
+    "SOUR1:FUNC:RESET": ("SOUR1:", "OUTPUT1:"),
+    "SOUR2:FUNC:RESET": ("SOUR2:", "OUTPUT2:"),
+}
+
+
+class DeviceState:
+    """
+    Last value written to each generator, acquisition and trigger setting.
+
+    ``write()`` is called with every outgoing command and tells whether it
+    changes the device, so identical re-writes of a setting can be skipped.
+    Queries and commands that are not settings (ACQ:START, ACQ:TRig CH1_PE, ...)
+    are always sent. Reset commands drop the values they affect.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, str] = {}
+
+    @staticmethod
+    def parse(msg: str) -> Tuple[str, str]:
+        """
+        Split a command into its normalised header and its argument string.
+        """
+        header, _, value = msg.strip().partition(" ")
+        header = header.lstrip(":").upper()
+        return ALIASES.get(header, header), value.strip()
+
+    def write(self, msg: str) -> bool:
+        """
+        Record an outgoing command. Returns False if it would rewrite a setting
+        with the value it already has.
+        """
+        key, value = self.parse(msg)
+
+        if key.endswith("?"):
+            return True
+        if key in RESETS:
+            for prefix in RESETS[key]:
+                self.invalidate(prefix)
+            return True
+        for other in SIBLINGS.get(key, ()):
+            self._values.pop(other, None)
+        if key == "OUTPUT:STATE":
+            self._values["OUTPUT1:STATE"] = value
+            self._values["OUTPUT2:STATE"] = value
+            return True
+        if not TRACKED.match(key):
+            return True
+
+        if self._values.get(key) == value:
+            return False
+        self._values[key] = value
+        return True
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Last value of a setting (normalised header, e.g. "ACQ:DATA:UNITS").
+        """
+        return self._values.get(key, default)
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a value read back from the device.
+        """
+        self._values[key] = value
+
+    def invalidate(self, prefix: str = "") -> None:
+        """
+        Forget the settings whose header starts with ``prefix`` (all of them by default).
+        """
+        if not prefix:
+            self._values.clear()
+            return
+        for key in [k for k in self._values if k.startswith(prefix)]:
+            del self._values[key]
+
+    def snapshot(self) -> Dict[str, str]:
+        return dict(self._values)
+
+    def restore(self, values: Dict[str, str]) -> None:
+        self._values = dict(values)
@@ -0,0 +1,464 @@
+"""
+Fake Red Pitaya SCPI server, for exercising the SCPI clients without a board.
+
+FakeBoard models the commands, FakeRedPitaya (threads, for the blocking
+clients) and AsyncFakeRedPitaya (asyncio) serve it over TCP through a Link
+emulating the network latency and bandwidth and injecting Faults.
+"""
+
+import asyncio
+import random
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rp_comm.device_state import DeviceState
+
+BUFFER_SIZE = 16384
+ADC_RATE = 125e6
+ADC_BITS = 14
+
+# Value returned by a query of a setting that was never written
+DEFAULTS = {
+    "ACQ:DEC:FACTOR": "1",
+    "ACQ:AVG": "ON",
+    "ACQ:DATA:UNITS": "VOLTS",
+    "ACQ:DATA:FORMAT": "ASCII",
+    "ACQ:TRIG:LEV": "0",
+    "ACQ:TRIG:DLY": "0",
+    "ACQ:BUF:SIZE": str(BUFFER_SIZE),
+    "SOUR1:FUNC": "SINE",
+    "SOUR2:FUNC": "SINE",
+    "SOUR1:FREQ:FIX": "1000",
+    "SOUR2:FREQ:FIX": "1000",
+    "SOUR1:VOLT": "1",
+    "SOUR2:VOLT": "1",
+    "SOUR1:VOLT:OFFS": "0",
+    "SOUR2:VOLT:OFFS": "0",
+    "SOUR1:PHAS": "0",
+    "SOUR2:PHAS": "0",
+    "OUTPUT1:STATE": "OFF",
+    "OUTPUT2:STATE": "OFF",
+    "ACQ:SOUR1:GAIN": "LV",
+    "ACQ:SOUR2:GAIN": "LV",
+    "UART:SPEED": "9600",
+    "UART:BITS": "CS8",
+    "UART:STOPB": "STOP1",
+    "UART:PARITY": "NONE",
+    "UART:TIMEOUT": "0",
+    "SPI:SETTINGS:MODE": "LISL",
+    "SPI:SETTINGS:CSMODE": "NORMAL",
+    "SPI:SETTINGS:SPEED": "50000000",
+    "SPI:SETTINGS:WORD": "8",
+}
+
+# Commands without arguments that are accepted and have no modelled effect
+ACTIONS = {
+    "SOUR:TRIG:INT", "SOUR1:TRIG:INT", "SOUR2:TRIG:INT",
+    "UART:INIT", "UART:RELEASE", "SPI:INIT", "SPI:RELEASE", "SPI:SETTINGS:SET", "SPI:SETTINGS:GET",
+}
+
+
+class FakeBoard:
+    """
+    Command model of the subset of the Red Pitaya SCPI server used by this project.
+
+    Settings are stored as written and returned by the matching query. The
+    acquisition buffer is filled with the waveform configured on the generator
+    of the same channel, plus Gaussian noise of ``noise`` V rms, so a loopback
+    (OUT1 -> IN1) setup is emulated. UART is looped back too: bytes written
+    with UART:WRITE are returned by UART:READ.
+    """
+
+    def __init__(self, trigger_delay: float = 0.0, noise: float = 0.0, seed: int = 0):
+        # Time (s) from ACQ:START to the trigger event, emulates a slow trigger
+        self.trigger_delay = trigger_delay
+        self.noise = noise
+        self._rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        self.settings: Dict[str, str] = {}
+        self.errors: deque = deque()
+        self.acq_started: Optional[float] = None
+        self.uart: deque = deque()
+        self._replies: Dict[tuple, bytes] = {}
+
+    def _error(self, code: int, message: str):
+        self.errors.append(f'{code},"{message}"')
+
+    def get(self, key: str) -> str:
+        return self.settings.get(key, DEFAULTS.get(key, "0"))
+
+    def fill_time(self) -> float:
+        """Time to fill the acquisition buffer with the current decimation (s)."""
+        return BUFFER_SIZE * int(self.get("ACQ:DEC:FACTOR")) / ADC_RATE
+
+    def filled(self) -> bool:
+        return (self.acq_started is not None
+                and time.monotonic() - self.acq_started >= self.trigger_delay + self.fill_time())
+
+    def waveform(self, chan: int, n: int = BUFFER_SIZE) -> np.ndarray:
+        """Samples (V) seen on input ``chan``."""
+        t = np.arange(n) * int(self.get("ACQ:DEC:FACTOR")) / ADC_RATE
+        if self.get(f"OUTPUT{chan}:STATE") != "ON":
+            return np.zeros(n, dtype=np.float32)
+        amp = float(self.get(f"SOUR{chan}:VOLT"))
+        freq = float(self.get(f"SOUR{chan}:FREQ:FIX"))
+        offs = float(self.get(f"SOUR{chan}:VOLT:OFFS"))
+        phase = np.deg2rad(float(self.get(f"SOUR{chan}:PHAS")))
+        arg = 2 * np.pi * freq * t + phase
+        func = self.get(f"SOUR{chan}:FUNC")
+        if func == "SQUARE":
+            y = np.sign(np.sin(arg))
+        elif func == "TRIANGLE":
+            y = 2 / np.pi * np.arcsin(np.sin(arg))
+        elif func == "DC":
+            y = np.ones(n)
+        else:
+            y = np.sin(arg)
+        y = amp * y + offs
+        if self.noise:
+            y = y + self._rng.normal(scale=self.noise, size=n)
+        return y.astype(np.float32)
+
+    def data(self, chan: int, query: str = "DATA?", args: str = "") -> bytes:
+        """Reply to ACQ:SOUR<chan>:DATA[...]? in the configured units and format."""
+        # Without noise the reply only depends on the settings
+        key = (chan, query, args, tuple(sorted(self.settings.items())))
+        if not self.noise and key in self._replies:
+            return self._replies[key]
+        reply = self._data(chan, query, args)
+        if not self.noise:
+            if len(self._replies) > 16:
+                self._replies.clear()
+            self._replies[key] = reply
+        return reply
+
+    def _data(self, chan: int, query: str, args: str) -> bytes:
+        y = self._select(self.waveform(chan), query, [int(a) for a in args.split(",") if a.strip().isdigit()])
+        raw = self.get("ACQ:DATA:UNITS") == "RAW"
+        if raw:
+            y = np.clip(np.round(y * 2**(ADC_BITS - 1)), -2**(ADC_BITS - 1), 2**(ADC_BITS - 1) - 1)
+
+        if self.get("ACQ:DATA:FORMAT") == "BIN":
+            payload = y.astype(">i2" if raw else ">f4").tobytes()
+            length = str(len(payload)).encode()
+            return b"#" + str(len(length)).encode() + length + payload + b"\r\n"
+
+        fmt = "{:.0f}" if raw else "{:.6f}"
+        return ("{" + ",".join(fmt.format(v) for v in y) + "}\r\n").encode()
+
+    @staticmethod
+    def _select(y: np.ndarray, query: str, args: List[int]) -> np.ndarray:
+        """Part of the buffer read by the DATA query variants, positions wrap around."""
+        n = len(y)
+        if query == "DATA:START:END?" and len(args) == 2:
+            start, end = args
+            count = (end - start) % n + 1
+        elif query == "DATA:START:N?" and len(args) == 2:
+            start, count = args
+        elif query == "DATA:OLD:N?" and args:
+            start, count = 0, args[0]
+        elif query == "DATA:LATEST:N?" and args:
+            start, count = n - args[0], args[0]
+        elif query == "DATA:TRIG?" and args:
+            # The trigger is at the middle of the buffer
+            start, count = n // 2 - args[0] // 2, args[0]
+        else:
+            return y
+        return np.take(y, np.arange(start, start + min(count, n)) % n)
+
+    def uart_write(self, key: str, value: str):
+        """UART:WRITE<n> #H<byte>,#H<byte>,... (hexadecimal) or decimal values."""
+        values = [v.strip() for v in value.split(",") if v.strip()]
+        for v in values[:int(key[10:] or len(values))]:
+            self.uart.append(int(v[2:], 16) if v.upper().startswith("#H") else int(v))
+
+    def uart_read(self, key: str) -> bytes:
+        """UART:READ<n>? returns up to n looped back bytes as {b,b,...}."""
+        n = int(key[9:-1] or 1)
+        values = [str(self.uart.popleft()) for _ in range(min(n, len(self.uart)))]
+        return ("{" + ",".join(values) + "}\r\n").encode()
+
+    def handle(self, line: str) -> Optional[bytes]:
+        """Execute one command, returns the reply or None."""
+        key, value = DeviceState.parse(line)
+        if not key:
+            return None
+
+        if key == "*RST":
+            self.reset()
+        elif key == "*CLS":
+            self.errors.clear()
+        elif key in ("*OPC?", "*IDN?", "*STB?", "SYST:ERR:NEXT?", "SYST:ERR:COUN?"):
+            return (self._ieee(key) + "\r\n").encode()
+        elif key == "ACQ:RST":
+            self.acq_started = None
+            for k in [k for k in self.settings if k.startswith("ACQ:")]:
+                del self.settings[k]
+        elif key == "ACQ:START":
+            self.acq_started = time.monotonic()
+        elif key == "ACQ:STOP":
+            self.acq_started = None
+        elif key == "ACQ:TRIG:FILL?":
+            return b"1\r\n" if self.filled() else b"0\r\n"
+        elif key.startswith("ACQ:SOUR") and key[9:14] == ":DATA" and key.endswith("?"):
+            return self.data(int(key[8]), key[10:], value)
+        elif key.startswith("UART:WRITE"):
+            self.uart_write(key, value)
+        elif key.startswith("UART:READ") and key.endswith("?"):
+            return self.uart_read(key)
+        elif key.endswith("?"):
+            return (self.get(key[:-1]) + "\r\n").encode()
+        elif value:
+            if key == "OUTPUT:STATE":
+                self.settings["OUTPUT1:STATE"] = self.settings["OUTPUT2:STATE"] = value.upper()
+            else:
+                self.settings[key] = value.upper()
+        elif key in ACTIONS:
+            pass
+        elif key.startswith("SOUR") and key.endswith(":FUNC:RESET"):
+            # SOUR:FUNC:RESET resets both channels
+            chans = key[4] if key[4].isdigit() else "12"
+            prefixes = tuple(f"{name}{c}:" for c in chans for name in ("SOUR", "OUTPUT"))
+            for k in [k for k in self.settings if k.startswith(prefixes)]:
+                del self.settings[k]
+        else:
+            self._error(-113, "Undefined header")
+        return None
+
+    def _ieee(self, key: str) -> str:
+        if key == "*OPC?":
+            return "1"
+        if key == "*IDN?":
+            return "REDPITAYA,FAKE,0,0"
+        if key == "*STB?":
+            return "4" if self.errors else "0"
+        if key == "SYST:ERR:COUN?":
+            return str(len(self.errors))
+        return self.errors.popleft() if self.errors else '0,"No error"'
+
+
+class Faults:
+    """
+    Faults injected by the fake servers, probabilities are per command.
+
+    ``error_rate`` queues an SCPI execution error on the board, ``drop_rate``
+    loses the reply of a query, ``truncate_rate`` sends only the first half
+    of a reply, ``corrupt_rate`` flips one byte of a reply, ``stall_rate``
+    delays a reply by ``stall`` s and the connection is closed after
+    ``disconnect_after`` commands. ``seed`` makes the sequence reproducible.
+    """
+
+    def __init__(self, error_rate: float = 0.0, drop_rate: float = 0.0, truncate_rate: float = 0.0,
+                 corrupt_rate: float = 0.0, stall_rate: float = 0.0, stall: float = 0.5,
+                 disconnect_after: Optional[int] = None, seed: int = 0):
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.truncate_rate = truncate_rate
+        self.corrupt_rate = corrupt_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.disconnect_after = disconnect_after
+        self.seed = seed
+
+
+class Link:
+    """
+    Network model between a client and the fake board: every reply is
+    delayed by ``latency`` s plus its transfer time at ``bandwidth`` bytes/s
+    (None for unlimited), and ``faults`` are injected. Counts the commands,
+    replies, bytes and faults of all connections.
+    """
+
+    def __init__(self, board: FakeBoard, latency: float = 0.0, bandwidth: Optional[float] = None,
+                 faults: Optional[Faults] = None):
+        self.board = board
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.faults = faults if faults is not None else Faults()
+        self._random = random.Random(self.faults.seed)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = dict(commands=0, replies=0, bytes=0, errors=0, dropped=0, truncated=0,
+                                          corrupted=0, stalled=0, disconnects=0)
+
+    def transfer_time(self, size: int) -> float:
+        return self.latency + (size / self.bandwidth if self.bandwidth else 0.0)
+
+    def command(self, line: str, count: int) -> Tuple[Optional[bytes], float, bool]:
+        """
+        Execute the ``count``-th command of a connection.
+
+        Returns the reply to send (or None), the time to wait before
+        sending it and whether to close the connection afterwards.
+        """
+        faults = self.faults
+        with self._lock:
+            self.stats["commands"] += 1
+            if faults.disconnect_after is not None and count >= faults.disconnect_after:
+                self.stats["disconnects"] += 1
+                return None, 0.0, True
+            reply = self.board.handle(line)
+            chance = self._random.random
+            if faults.error_rate and chance() < faults.error_rate:
+                self.stats["errors"] += 1
+                self.board._error(-200, "Execution error")
+            if reply is None:
+                return None, 0.0, False
+
+            delay = self.transfer_time(len(reply))
+            if faults.drop_rate and chance() < faults.drop_rate:
+                self.stats["dropped"] += 1
+                return None, 0.0, False
+            if faults.truncate_rate and chance() < faults.truncate_rate:
+                self.stats["truncated"] += 1
+                reply = reply[:len(reply) // 2]
+            if faults.corrupt_rate and chance() < faults.corrupt_rate:
+                self.stats["corrupted"] += 1
+                i = self._random.randrange(len(reply))
+                reply = reply[:i] + bytes([reply[i] ^ 0xFF]) + reply[i + 1:]
+            if faults.stall_rate and chance() < faults.stall_rate:
+                self.stats["stalled"] += 1
+                delay += faults.stall
+            self.stats["replies"] += 1
+            self.stats["bytes"] += len(reply)
+        return reply, delay, False
+
+
+class FakeRedPitaya:
+    """
+    TCP server answering SCPI commands with a FakeBoard from background
+    threads, one per connection, for the blocking clients.
+
+        with FakeRedPitaya(latency=0.5e-3) as server:
+            rp = scpi(server.host, port=server.port)
+    """
+
+    def __init__(self, board: Optional[FakeBoard] = None, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, bandwidth: Optional[float] = None, faults: Optional[Faults] = None):
+        self.board = board if board is not None else FakeBoard()
+        self.link = Link(self.board, latency, bandwidth, faults)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(8)
+        self.host, self.port = self._sock.getsockname()
+        self._clients: List[socket.socket] = []
+        self._closed = False
+        threading.Thread(target=self._accept, name="fake-rp-accept", daemon=True).start()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(self.link.stats)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._closed = True
+        self._sock.close()
+        for conn in list(self._clients):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._clients.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), name="fake-rp-client", daemon=True).start()
+
+    def _serve(self, conn: socket.socket):
+        buf = b""
+        count = 0
+        try:
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    return
+                buf += chunk
+                *lines, buf = buf.split(b"\n")
+                for line in lines:
+                    reply, delay, disconnect = self.link.command(line.decode("utf-8"), count)
+                    count += 1
+                    if disconnect:
+                        return
+                    if reply is not None:
+                        if delay:
+                            time.sleep(delay)
+                        conn.sendall(reply)
+        except OSError:
+            pass
+        finally:
+            if conn in self._clients:
+                self._clients.remove(conn)
+            conn.close()
+
+
+class AsyncFakeRedPitaya:
+    """
+    asyncio TCP server answering SCPI commands with a FakeBoard.
+
+        async with AsyncFakeRedPitaya() as server:
+            rp = await scpi_async.open(server.host, port=server.port)
+    """
+
+    def __init__(self, board: Optional[FakeBoard] = None, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, bandwidth: Optional[float] = None, faults: Optional[Faults] = None):
+        self.board = board if board is not None else FakeBoard()
+        self.link = Link(self.board, latency, bandwidth, faults)
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._client, self.host, self.port, limit=2**22)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        count = 0
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply, delay, disconnect = self.link.command(line.decode("utf-8"), count)
+                count += 1
+                if disconnect:
+                    break
+                if reply is not None:
+                    if delay:
+                        await asyncio.sleep(delay)
+                    writer.write(reply)
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,224 @@
+"""
+Timing spans, latency histograms and counters for the acquisition pipeline.
+
+The module level ``probe`` is shared by the SCPI client, RedPitaya and
+SerialPlot. It is disabled by default (or enabled with the environment
+variable RP_INSTRUMENTATION=1); disabled, a span is a shared no-op context
+and a timed function costs one extra call.
+
+    from rp_comm.instrumentation import probe
+
+    probe.enable()
+    with probe.span("read_data.decode"):
+        ...
+    probe.count("serial.samples", len(rows))
+    probe.to_json("diagnostics.json")
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+# Sub-buckets per power of two: values are kept with a relative error below 1/64
+SUB_BUCKET_BITS = 7
+_HALF = 1 << (SUB_BUCKET_BITS - 1)
+
+_NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    """Log-linear histogram of durations in ns, in the manner of HdrHistogram.
+
+    Values below 2**SUB_BUCKET_BITS ns are counted exactly, larger ones in
+    buckets 1/64 of their power of two wide, so any value from 1 ns up is
+    recorded in constant time with ~1.5 % resolution. Buckets are kept in a
+    dict, only the occupied ones take memory.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    @staticmethod
+    def bucket(value: int) -> int:
+        """Index of the bucket of a value in ns."""
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return 2 * _HALF + (shift - 1) * _HALF + (value >> shift) - _HALF
+
+    @staticmethod
+    def bounds(index: int) -> "tuple[int, int]":
+        """Lowest and one past the highest value (ns) of a bucket."""
+        if index < 2 * _HALF:
+            return index, index + 1
+        shift, sub = divmod(index - 2 * _HALF, _HALF)
+        shift += 1
+        return (sub + _HALF) << shift, (sub + _HALF + 1) << shift
+
+    def record(self, value: int):
+        value = max(int(value), 0)
+        index = self.bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram"):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Value (ns) below which q percent of the recorded values are, 0 if empty."""
+        if not self.count:
+            return 0.0
+        rank = max(q / 100 * self.count, 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = self.bounds(index)
+                return min(max((low + high - 1) / 2, self.min), self.max) # type: ignore
+        return float(self.max) # type: ignore
+
+    def buckets(self) -> List[List[int]]:
+        """Occupied buckets as [low_ns, high_ns, count], in increasing order."""
+        return [[*self.bounds(index), self.counts[index]] for index in sorted(self.counts)]
+
+    def summary(self) -> Dict[str, float]:
+        """Count and statistics in µs."""
+        if not self.count:
+            return dict(count=0)
+        return dict(
+            count=self.count,
+            total_ms=self.total / 1e6,
+            mean_us=self.total / self.count / 1e3,
+            min_us=self.min / 1e3, # type: ignore
+            p50_us=self.percentile(50) / 1e3,
+            p90_us=self.percentile(90) / 1e3,
+            p99_us=self.percentile(99) / 1e3,
+            max_us=self.max / 1e3, # type: ignore
+        )
+
+
+class _Span:
+    __slots__ = ("probe", "name", "start")
+
+    def __init__(self, probe: "Probe", name: str):
+        self.probe = probe
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.probe.record(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+class Probe:
+    """Registry of named latency histograms and counters.
+
+    Spans and counts are dropped while the probe is disabled. Recording is
+    serialized by a lock, spans may be closed from any thread.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Drop everything recorded so far."""
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+            self.started = time.time()
+
+    def span(self, name: str):
+        """Context timing its block into the histogram ``name``."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def timed(self, name: str) -> Callable:
+        """Decorator timing every call of the function into the histogram ``name``."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter_ns() - start)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, ns: int):
+        """Add a duration in ns to the histogram ``name``."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(ns)
+
+    def count(self, name: str, n: int = 1):
+        """Add n to the counter ``name``, if enabled."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self, buckets: bool = False) -> dict:
+        """Summary of every histogram and counter, with the buckets if requested."""
+        with self._lock:
+            spans = {}
+            for name, histogram in sorted(self.histograms.items()):
+                spans[name] = histogram.summary()
+                if buckets:
+                    spans[name]["buckets"] = histogram.buckets()
+            return dict(
+                enabled=self.enabled,
+                started=self.started,
+                elapsed=time.time() - self.started,
+                spans=spans,
+                counters=dict(sorted(self.counters.items())),
+            )
+
+    def to_json(self, path: Optional[str] = None, buckets: bool = True) -> str:
+        """Snapshot as JSON text, also written to ``path`` if given."""
+        text = json.dumps(self.snapshot(buckets=buckets), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+
+probe = Probe(enabled=os.environ.get("RP_INSTRUMENTATION", "") not in ("", "0"))
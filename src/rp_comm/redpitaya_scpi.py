@@ -3,10 +3,16 @@ Provides SCPI access to Red Pitaya from host computer.
 """
 
 import socket
+import warnings
+from collections import deque
+from contextlib import contextmanager
 from enum import Enum
-from typing import List, Optional, Union
+from typing import List, NamedTuple, Optional, Union
 import numpy as np
 
+from rp_comm.device_state import DeviceState
+from rp_comm.instrumentation import probe
+
 __author__ = "Luka Golinar, Iztok Jeras, Miha Gjura"
 __copyright__ = "Copyright 2025, Red Pitaya"
 __OS_version__ = "IN DEV"
@@ -134,9 +140,30 @@ class LCRExtShunt(Enum):
     S100K = "S100k"
     S1M = "S1M"
 
+# Error codes above this one are fatal: check_error() raises for them by default
+FATAL_ERROR_CODE = 9500
+
+class ErrorPolicy(Enum):
+    """When check_error() queries the error queue of Red Pitaya."""
+    IMMEDIATE = "IMMEDIATE"     # On every call (and once at the end of a batch)
+    DEFERRED = "DEFERRED"       # Only at the end of a batch, or when forced
+    SAMPLED = "SAMPLED"         # On every N-th call
+
+class SCPIErrorEntry(NamedTuple):
+    """One entry of the Red Pitaya error queue."""
+    code: int
+    message: str
+
+class SCPIError(Exception):
+    """Raised when Red Pitaya reports errors from the executed commands."""
+    def __init__(self, errors: List[SCPIErrorEntry]):
+        self.errors = errors
+        super().__init__("; ".join(f"{e.code}, {e.message}" for e in errors))
+
 class scpi (object):
     """SCPI class used to access Red Pitaya over an IP network."""
     delimiter = '\r\n'
+    _delimiter = delimiter.encode('utf-8')
 
 
     ####################################################
@@ -146,27 +173,79 @@ class scpi (object):
     #! Functions in this section should not be modified as they take care of the communication between Red Pitaya and the computer
     #
 
-    def __init__(self, host: str, timeout: Optional[float]=None, port: int=5000):
+    def __init__(
+        self,
+        host: str,
+        timeout: Optional[float]=None,
+        port: int=5000,
+        error_policy: ErrorPolicy=ErrorPolicy.IMMEDIATE,
+        error_sample: int=10,
+        error_queue_len: int=100,
+        skip_redundant: bool=False,
+        fatal_code: Optional[int]=FATAL_ERROR_CODE
+    ):
         """Initialize object and open IP connection.
         Host IP should be a string in parentheses, like '192.168.1.100' or 'rp-xxxxxx.local'.
+
+        ``error_policy`` selects when check_error() talks to the board, ``error_sample``
+        is N for ErrorPolicy.SAMPLED, and the last ``error_queue_len`` errors read from
+        the board are kept in ``self.errors``. check_error() raises only for codes
+        above ``fatal_code`` (None: for every error), the others are printed.
+
+        Every setting written is tracked in ``self.state``; with ``skip_redundant``
+        commands that would rewrite a setting with its current value are not sent.
         """
         self.host    = host
         self.port    = port
         self.timeout = timeout
 
+        self.error_policy = error_policy
+        self.error_sample = error_sample
+        self.fatal_code = fatal_code
+        self.errors: deque = deque(maxlen=error_queue_len)
+        self._error_calls = 0
+        self._deferred_check: Optional[bool] = None
+
+        # Bytes received from the socket but not yet consumed by a reader
+        self._rxbuf  = bytearray()
+
+        # Commands queued by batch() and the deferred check_error() request
+        self._batch: Optional[List[str]] = None
+        self._batch_check: Optional[bool] = None
+
+        # Shadow copy of the settings written through this object
+        self.state = DeviceState()
+        self.skip_redundant = skip_redundant
+
+        self._socket = None
+        self.connect()
+
+    def connect(self):
+        """Open the IP connection."""
         try:
             self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-            if timeout is not None:
-                self._socket.settimeout(timeout)
+            if self.timeout is not None:
+                self._socket.settimeout(self.timeout)
 
-            self._socket.connect((host, port))
+            self._socket.connect((self.host, self.port))
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
         except socket.error as e:
-            print('SCPI >> connect({!s:s}:{:d}) failed: {!s:s}'.format(host, port, e))
+            print('SCPI >> connect({!s:s}:{:d}) failed: {!s:s}'.format(self.host, self.port, e))
+
+    def reconnect(self):
+        """Close and reopen the IP connection.
+        Pending data and the shadow state are dropped, the board may have been reset meanwhile."""
+        self.close()
+        self._rxbuf.clear()
+        self._batch = None
+        self._batch_check = None
+        self.state.invalidate()
+        self.connect()
 
     def __del__(self):
-        if self._socket is not None:
+        if getattr(self, '_socket', None) is not None:
             self._socket.close()
         self._socket = None
 
@@ -174,14 +253,33 @@ class scpi (object):
         """Close IP connection."""
         self.__del__()
 
+    @property
+    def rx_buffered(self) -> int:
+        """Bytes received from the socket and not yet consumed by a reader."""
+        return len(self._rxbuf)
+
+    @probe.timed('scpi.rx_txt')
     def rx_txt(self, chunksize: int = 4096):
-        """Receive text string and return it after removing the delimiter."""
-        msg = ''
+        """Receive text string and return it after removing the delimiter.
+
+        Bytes are accumulated in the per-connection receive buffer and only
+        the newly received part is scanned for the delimiter, so long replies
+        are read in linear time. The message is decoded once, and anything
+        received after the delimiter is kept for the next reply.
+        """
+        self._flush_batch()
+        scan = 0
         while 1:
-            chunk = self._socket.recv(chunksize).decode('utf-8')        # Receive chunk size of 2^n preferably # type: ignore
-            msg += chunk
-            if (len(msg) >= 2 and msg[-2:] == self.delimiter):
-                return msg[:-2]
+            end = self._rxbuf.find(self._delimiter, scan)
+            if end >= 0:
+                break
+            scan = max(len(self._rxbuf) - len(self._delimiter) + 1, 0)
+            self._rx_fill(chunksize)                                    # Receive chunk size of 2^n preferably
+
+        with memoryview(self._rxbuf) as view:
+            msg = str(view[:end], 'utf-8')
+        del self._rxbuf[:end + len(self._delimiter)]
+        return msg
 
     def rx_txt_check_error(self, chunksize: int = 4096, stop: bool = True):
         """Receive text string and return it after removing the delimiter.
@@ -190,46 +288,151 @@ class scpi (object):
         self.check_error(stop)
         return msg
 
-    def rx_arb(self):
-        """ Recieve binary data from scpi server"""
-        numOfBytes = 0
-        data=b''
-        while len(data) != 1:
-            data = self._socket.recv(1) # type: ignore
-        if data != b'#':
-            return False
-        data=b''
+    @probe.timed('scpi.rx_arb')
+    def rx_arb(self, out=None):
+        """ Recieve binary data from scpi server.
+
+        The IEEE-488.2 definite length block ``#<n><len><data>`` is read into a
+        preallocated ``bytearray`` with ``recv_into`` so the payload is copied
+        only once; the result can be passed to ``np.frombuffer`` directly.
 
-        while len(data) != 1:
-            data = self._socket.recv(1) # type: ignore
-        numOfNumBytes = int(data)
+        Args:
+            out (writable buffer, optional): Buffer reused for the payload when it is
+                large enough, a memoryview of the received part is returned then.
+                Defaults to None (a new bytearray per call).
+        """
+        self._flush_batch()
+        header = self._rx_exact(2)
+        if header[:1] != b'#':
+            return False
+        numOfNumBytes = int(header[1:2])
         if numOfNumBytes <= 0:
             return False
-        data=b''
+        numOfBytes = int(self._rx_exact(numOfNumBytes))
+        probe.count('scpi.rx_arb.bytes', numOfBytes)
 
-        while len(data) != numOfNumBytes:
-            data += (self._socket.recv(1)) # type: ignore
-        numOfBytes = int(data)
-        data=b''
+        if out is not None and memoryview(out).nbytes >= numOfBytes:
+            data = memoryview(out).cast('B')[:numOfBytes]
+            self._rx_into(data)
+        else:
+            data = bytearray(numOfBytes)
+            self._rx_into(memoryview(data))
 
-        while len(data) < numOfBytes:
-            r_size = min(numOfBytes - len(data),4096)
-            data += (self._socket.recv(r_size)) # type: ignore
+        self._rx_exact(2)           # recive \r\n
 
-        self._socket.recv(2)        # recive \r\n # type: ignore
+        return data
 
+    def _rx_fill(self, chunksize: int = 4096):
+        """Append at least one more chunk from the socket to the receive buffer."""
+        chunk = self._socket.recv(chunksize) # type: ignore
+        if not chunk:
+            raise ConnectionError('SCPI >> connection closed by {!s:s}:{:d}'.format(self.host, self.port))
+        self._rxbuf += chunk
+
+    def _rx_exact(self, size: int) -> bytes:
+        """Return exactly ``size`` bytes, consuming them from the receive buffer."""
+        while len(self._rxbuf) < size:
+            self._rx_fill(max(size - len(self._rxbuf), 4096))
+        data = bytes(self._rxbuf[:size])
+        del self._rxbuf[:size]
         return data
 
+    def _rx_into(self, view: memoryview):
+        """Fill ``view`` completely, first from buffered bytes then straight from the socket."""
+        pos = min(len(self._rxbuf), len(view))
+        if pos:
+            view[:pos] = self._rxbuf[:pos]
+            del self._rxbuf[:pos]
+        while pos < len(view):
+            n = self._socket.recv_into(view[pos:]) # type: ignore
+            if not n:
+                raise ConnectionError('SCPI >> connection closed by {!s:s}:{:d}'.format(self.host, self.port))
+            pos += n
+
     def rx_arb_check_error(self, stop: bool = True):
         """ Recieve binary data from scpi server. Check for error."""
         data = self.rx_arb()
         self.check_error(stop)
         return data
 
+    @probe.timed('scpi.tx_txt')
     def tx_txt(self, msg: str):
-        """Send text string ending and append delimiter."""
+        """Send text string ending and append delimiter.
+        Inside batch() the command is queued instead."""
+        if not self.state.write(msg) and self.skip_redundant:
+            return None
+        if self._batch is not None:
+            self._batch.append(msg)
+            return None
         return self._socket.sendall((msg + self.delimiter).encode('utf-8'))     # was send(().encode('utf-8')) # type: ignore
 
+    @contextmanager
+    def batch(self, opc: bool = False):
+        """Accumulate commands sent inside the block and transmit them with a single write.
+
+        Error checks requested inside the block are deferred to its end, or to the
+        next check_error() call if the block sent queries, whose replies come first.
+        Reading a reply inside the block flushes the queued commands first.
+        If the block raises, the queued commands are discarded.
+
+        Args:
+            opc (bool, optional): Append ``*OPC?`` to the batch and wait for the reply,
+                so the block returns after Red Pitaya has executed every command.
+                Defaults to False.
+
+        Example::
+
+            with rp.batch(opc=True):
+                rp.gen_set(1, Waveform.SINE, 0.5, 1000)
+                rp.tx_txt("OUTPUT1:STATE ON")
+        """
+        if self._batch is not None:         # Nested batch, the outermost one sends
+            yield self
+            return
+
+        self._batch = []
+        state = self.state.snapshot()
+        try:
+            yield self
+        except BaseException:
+            self._batch = None
+            self._batch_check = None
+            self.state.restore(state)
+            raise
+
+        check, self._batch_check = self._batch_check, None
+        # Replies to queries in the batch are read by the caller after the block
+        queries = any(command.endswith('?') for command in self._batch)
+        try:
+            if opc:
+                self._batch.append('*OPC?')
+            self._flush_batch()
+            self._batch = None
+            if opc:
+                self.rx_txt()
+        except BaseException:
+            # Unknown which of the commands reached the board
+            self.state.invalidate()
+            raise
+        finally:
+            # Later commands are sent again, even if the write failed
+            self._batch = None
+
+        if queries:
+            # Reading the errors now would take the place of those replies
+            if check is not None:
+                self._deferred_check = bool(self._deferred_check) or check
+        elif check is not None or self._deferred_check is not None:
+            self.check_error(bool(check), force=self.error_policy is ErrorPolicy.DEFERRED)
+
+    def _flush_batch(self):
+        """Send the commands queued by batch() in one write."""
+        if not self._batch:
+            return
+        msg = self.delimiter.join(self._batch) + self.delimiter
+        self._batch.clear()
+        self._socket.sendall(msg.encode('utf-8')) # type: ignore
+
     def tx_txt_check_error(self, msg: str, stop: bool= True):
         """Send text string ending and append delimiter. Check for error."""
         self.tx_txt(msg)
@@ -240,18 +443,79 @@ class scpi (object):
         self.tx_txt(msg)
         return self.rx_txt()
 
-    def check_error(self, stop = True):
-        """Read error from Red Pitaya and print it."""
+    def check_error(self, stop: bool = True, force: bool = False):
+        """Read errors from Red Pitaya into ``self.errors``, according to ``error_policy``.
+
+        Inside batch() the check is deferred to the end of the batch. With
+        ErrorPolicy.DEFERRED the check is postponed until the end of the next batch
+        (or a call with ``force=True``), and with ErrorPolicy.SAMPLED only every
+        ``error_sample``-th call reads the board.
+
+        Every error read is printed and kept in ``self.errors``.
+
+        Args:
+            stop (bool, optional): Raise SCPIError if the board reported errors
+                with a code above ``fatal_code``. Defaults to True.
+            force (bool, optional): Read the errors now, regardless of the policy.
+                Defaults to False.
+
+        Raises:
+            SCPIError: With the fatal errors read in this call, if ``stop`` is True.
+        """
+        if self._batch is not None:
+            self._batch_check = bool(self._batch_check) or stop
+            return
+
+        if not force:
+            if self.error_policy is ErrorPolicy.DEFERRED:
+                self._deferred_check = bool(self._deferred_check) or stop
+                return
+            if self.error_policy is ErrorPolicy.SAMPLED:
+                self._error_calls += 1
+                if self._error_calls < self.error_sample:
+                    return
+
+        stop = stop or bool(self._deferred_check)
+        self._deferred_check = None
+        self._error_calls = 0
+
         res = int(self.stb_q()) # type: ignore
-        if (res & 0x4):
-            while 1:
-                err = self.err_n()
-                if (err.startswith('0,')): # type: ignore
-                    break
-                print(err)
-                n = err.split(",") # type: ignore
-                if (len(n) > 0 and stop and int(n[0]) > 9500):
-                    exit(1)
+        if not (res & 0x4):
+            return
+
+        # Fetch the whole error queue in one round trip
+        count = int(self.err_c()) # type: ignore
+        with self.batch():
+            for _ in range(count):
+                self.tx_txt('SYST:ERR:NEXT?')
+
+        new_errors = []
+        for _ in range(count):
+            code, _, message = self.rx_txt().partition(',') # type: ignore
+            if int(code) != 0:
+                new_errors.append(SCPIErrorEntry(int(code), message.strip().strip('"')))
+        self.errors.extend(new_errors)
+        if new_errors:
+            # Unknown which write failed, the shadow state can not be trusted
+            self.state.invalidate()
+        for error in new_errors:
+            print('{:d},"{!s:s}"'.format(error.code, error.message))
+
+        fatal = self.fatal_errors(new_errors)
+        if stop and fatal:
+            raise SCPIError(fatal)
+
+    def fatal_errors(self, errors: List[SCPIErrorEntry]) -> List[SCPIErrorEntry]:
+        """The errors check_error() raises for, codes above ``fatal_code``."""
+        if self.fatal_code is None:
+            return list(errors)
+        return [e for e in errors if e.code > self.fatal_code]
+
+    def pop_errors(self) -> List[SCPIErrorEntry]:
+        """Return and clear the errors collected by check_error()."""
+        errors = list(self.errors)
+        self.errors.clear()
+        return errors
 
 
     ###########################################
@@ -299,9 +563,10 @@ class scpi (object):
 
         """
 
-        self.tx_txt(f"SYSTem:DATE \"{date}\"")
-        self.tx_txt(f"SYSTem:TIME \"{time}\"")
-        self.check_error()
+        with self.batch():
+            self.tx_txt(f"SYSTem:DATE \"{date}\"")
+            self.tx_txt(f"SYSTem:TIME \"{time}\"")
+            self.check_error()
 
     def board_get_date_time(
         self
@@ -365,17 +630,18 @@ class scpi (object):
         if trig_mode is not None and trig_mode.upper() not in trig_mode_list:
             raise ValueError(f"{trig_mode.upper()} is not a defined trigger source")
     
-        if x_channel:
-            # Set up X-channel daisy chain
-            self.tx_txt("DAISY:SYNC:CLK ON")
-            self.tx_txt("DAISY:SYNC:TRIG ON")
-
-        elif click_shield:
-            # Set up Click Shield daisy chain
-            self.tx_txt("DAISY:TRig:Out:ENable ON")
-            if trig_mode is not None:
-                self.tx_txt(f"DAISY:TRig:Out:SOUR {trig_mode.upper()}")
-        self.check_error()
+        with self.batch():
+            if x_channel:
+                # Set up X-channel daisy chain
+                self.tx_txt("DAISY:SYNC:CLK ON")
+                self.tx_txt("DAISY:SYNC:TRIG ON")
+
+            elif click_shield:
+                # Set up Click Shield daisy chain
+                self.tx_txt("DAISY:TRig:Out:ENable ON")
+                if trig_mode is not None:
+                    self.tx_txt(f"DAISY:TRig:Out:SOUR {trig_mode.upper()}")
+            self.check_error()
 
     def daisy_get_settings(
         self
@@ -551,34 +817,35 @@ class scpi (object):
         """
         self._validate_gen_set_params(chan, func, volt, freq, offset, phase, dcyc, data, trig_sour, ext_trig_deb_us, ext_trig_lev, load, sdrlab, siglab)
 
-        # Load needs to be set before the amplitude
-        if siglab:
-            if ext_trig_lev is not None:
-                self.tx_txt(f"TRig:EXT:LEV {ext_trig_lev}")
-            if load is not None:
-                self.tx_txt(f"SOUR{chan}:LOAD {load.value}")
-
-        self.tx_txt(f"SOUR{chan}:FUNC {func.value}")
-        self.tx_txt(f"SOUR{chan}:VOLT {volt}")
-
-        if func not in {Waveform.DC, Waveform.DC_NEG}:
-            self.tx_txt(f"SOUR{chan}:FREQ:FIX {freq}")
+        with self.batch():
+            # Load needs to be set before the amplitude
+            if siglab:
+                if ext_trig_lev is not None:
+                    self.tx_txt(f"TRig:EXT:LEV {ext_trig_lev}")
+                if load is not None:
+                    self.tx_txt(f"SOUR{chan}:LOAD {load.value}")
+
+            self.tx_txt(f"SOUR{chan}:FUNC {func.value}")
+            self.tx_txt(f"SOUR{chan}:VOLT {volt}")
+
+            if func not in {Waveform.DC, Waveform.DC_NEG}:
+                self.tx_txt(f"SOUR{chan}:FREQ:FIX {freq}")
+
+            if offset is not None:
+                self.tx_txt(f"SOUR{chan}:VOLT:OFFS {offset}")
+            if phase is not None:
+                self.tx_txt(f"SOUR{chan}:PHAS {phase}")
+            if func == Waveform.PWM and dcyc is not None:
+                self.tx_txt(f"SOUR{chan}:DCYC {dcyc}")
+            if data is not None and func == Waveform.ARBITRARY:
+                cust_wf = ",".join(map(str, data))
+                self.tx_txt(f"SOUR{chan}:TRAC:DATA:DATA {cust_wf}")
+            if trig_sour is not None:
+                self.tx_txt(f"SOUR{chan}:TRig:SOUR {trig_sour.value}")
+            if ext_trig_deb_us is not None:
+                self.tx_txt(f"SOUR:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
 
-        if offset is not None:
-            self.tx_txt(f"SOUR{chan}:VOLT:OFFS {offset}")
-        if phase is not None:
-            self.tx_txt(f"SOUR{chan}:PHAS {phase}")
-        if func == Waveform.PWM and dcyc is not None:
-            self.tx_txt(f"SOUR{chan}:DCYC {dcyc}")
-        if data is not None and func == Waveform.ARBITRARY:
-            cust_wf = ",".join(map(str, data))
-            self.tx_txt(f"SOUR{chan}:TRAC:DATA:DATA {cust_wf}")
-        if trig_sour is not None:
-            self.tx_txt(f"SOUR{chan}:TRig:SOUR {trig_sour.value}")
-        if ext_trig_deb_us is not None:
-            self.tx_txt(f"SOUR:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
-
-        self.check_error()
+            self.check_error()
 
     def gen_get_settings(self, chan: int, siglab: bool = False) -> List[str | None]:
         """
@@ -704,17 +971,18 @@ class scpi (object):
         """
         self._validate_burst_params(chan, ncyc, nor, period, init_val, last_val, siglab)
 
-        self.tx_txt(f"SOUR{chan}:BURS:STAT BURST")
-        self.tx_txt(f"SOUR{chan}:BURS:NCYC {ncyc}")
-        self.tx_txt(f"SOUR{chan}:BURS:NOR {nor}")
+        with self.batch():
+            self.tx_txt(f"SOUR{chan}:BURS:STAT BURST")
+            self.tx_txt(f"SOUR{chan}:BURS:NCYC {ncyc}")
+            self.tx_txt(f"SOUR{chan}:BURS:NOR {nor}")
 
-        if period is not None:
-            self.tx_txt(f"SOUR{chan}:BURS:INT:PER {period}")
+            if period is not None:
+                self.tx_txt(f"SOUR{chan}:BURS:INT:PER {period}")
 
-        self.tx_txt(f"SOUR{chan}:BURS:LASTValue {last_val}")
-        self.tx_txt(f"SOUR{chan}:INITValue {init_val}")
+            self.tx_txt(f"SOUR{chan}:BURS:LASTValue {last_val}")
+            self.tx_txt(f"SOUR{chan}:INITValue {init_val}")
 
-        self.check_error()
+            self.check_error()
 
     def gen_get_burst_settings(self, chan: int) -> List[str | None]:
         """
@@ -798,14 +1066,15 @@ class scpi (object):
 
         self._validate_sweep_params(chan, start_freq, stop_freq, time_us, mode, direction, sdrlab)
 
-        self.tx_txt(f"SOUR{chan}:SWeep:STATE ON")
-        self.tx_txt(f"SOUR{chan}:SWeep:FREQ:START {start_freq}")
-        self.tx_txt(f"SOUR{chan}:SWeep:FREQ:STOP {stop_freq}")
-        self.tx_txt(f"SOUR{chan}:SWeep:TIME {time_us}")
-        self.tx_txt(f"SOUR{chan}:SWeep:MODE {mode.value}")
-        self.tx_txt(f"SOUR{chan}:SWeep:DIR {direction.value}")
+        with self.batch():
+            self.tx_txt(f"SOUR{chan}:SWeep:STATE ON")
+            self.tx_txt(f"SOUR{chan}:SWeep:FREQ:START {start_freq}")
+            self.tx_txt(f"SOUR{chan}:SWeep:FREQ:STOP {stop_freq}")
+            self.tx_txt(f"SOUR{chan}:SWeep:TIME {time_us}")
+            self.tx_txt(f"SOUR{chan}:SWeep:MODE {mode.value}")
+            self.tx_txt(f"SOUR{chan}:SWeep:DIR {direction.value}")
 
-        self.check_error()
+            self.check_error()
 
     def gen_get_sweep_settings(self, chan: int) -> List[str | None]:
         """
@@ -1048,21 +1317,22 @@ class scpi (object):
 
         #!!!!! n = 4 if input4 else 2
 
-        self.tx_txt(f"ACQ:DEC:Factor {dec}")
-        self.tx_txt(f"ACQ:AVG {'ON' if averaging else 'OFF'}")
-        if units is not None:
-            self.tx_txt(f"ACQ:DATA:Units {units.value}")
-        if data_format is not None:
-            self.tx_txt(f"ACQ:DATA:FORMAT {data_format.value}")
+        with self.batch():
+            self.tx_txt(f"ACQ:DEC:Factor {dec}")
+            self.tx_txt(f"ACQ:AVG {'ON' if averaging else 'OFF'}")
+            if units is not None:
+                self.tx_txt(f"ACQ:DATA:Units {units.value}")
+            if data_format is not None:
+                self.tx_txt(f"ACQ:DATA:FORMAT {data_format.value}")
+
+            if gain is not None:
+                for i, g in enumerate(gain, start=1):
+                    self.tx_txt(f"ACQ:SOUR{i}:GAIN {g.value}")
+            if coupling is not None and siglab:
+                for i, c in enumerate(coupling, start=1):
+                    self.tx_txt(f"ACQ:SOUR{i}:COUP {c.value}")
 
-        if gain is not None:
-            for i, g in enumerate(gain, start=1):
-                self.tx_txt(f"ACQ:SOUR{i}:GAIN {g.value}")
-        if coupling is not None and siglab:
-            for i, c in enumerate(coupling, start=1):
-                self.tx_txt(f"ACQ:SOUR{i}:COUP {c.value}")
-
-        self.check_error()
+            self.check_error()
 
     def acq_get_settings(self, siglab: bool = False, input4: bool = False) -> List[str | None]:
         """
@@ -1194,23 +1464,24 @@ class scpi (object):
         """
         self._validate_acq_trig_params(trig_lvl, trig_delay, trig_hyst, ext_trig_deb_us, ext_trig_lvl, siglab, input4)
 
-        if trig_delay_ns:
-            self.tx_txt(f"ACQ:TRig:DLY:NS {trig_delay}")
-        else:
-            self.tx_txt(f"ACQ:TRig:DLY {trig_delay}")
+        with self.batch():
+            if trig_delay_ns:
+                self.tx_txt(f"ACQ:TRig:DLY:NS {trig_delay}")
+            else:
+                self.tx_txt(f"ACQ:TRig:DLY {trig_delay}")
 
-        if trig_hyst is not None:
-            self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
+            if trig_hyst is not None:
+                self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
 
-        if ext_trig_deb_us is not None:
-            self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
+            if ext_trig_deb_us is not None:
+                self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
 
-        self.tx_txt(f"ACQ:TRig:LEV {trig_lvl}")
+            self.tx_txt(f"ACQ:TRig:LEV {trig_lvl}")
 
-        if siglab and ext_trig_lvl is not None:
-            self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
+            if siglab and ext_trig_lvl is not None:
+                self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
 
-        self.check_error()
+            self.check_error()
 
     def acq_get_trig_settings(self, siglab: bool = False) -> List[str | None]:
         """
@@ -1293,15 +1564,16 @@ class scpi (object):
         """# type: ignore
         self._validate_acq_trig_ext_hyst_params(trig_hyst, ext_trig_deb_us, ext_trig_lvl, siglab)
 
-        if trig_hyst is not None:
-            self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
+        with self.batch():
+            if trig_hyst is not None:
+                self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
 
-        if ext_trig_deb_us is not None:
-            self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
+            if ext_trig_deb_us is not None:
+                self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
 
-        if siglab and ext_trig_lvl is not None:
-            self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
-        self.check_error()
+            if siglab and ext_trig_lvl is not None:
+                self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
+            self.check_error()
 
     # Misc
     def acq_set_units_format(
@@ -1323,12 +1595,13 @@ class scpi (object):
                 Defaults to "ASCII".
         """
         self._validate_units_format(units, data_format)
-        if units is not None:
-            self.tx_txt(f"ACQ:DATA:Units {units.value}")
-        if data_format is not None:
-            self.tx_txt(f"ACQ:DATA:FORMAT {data_format.value}")
+        with self.batch():
+            if units is not None:
+                self.tx_txt(f"ACQ:DATA:Units {units.value}")
+            if data_format is not None:
+                self.tx_txt(f"ACQ:DATA:FORMAT {data_format.value}")
 
-        self.check_error()
+            self.check_error()
 
     # Split trigger mode
     def acq_split_enable(self) -> None:
@@ -1397,14 +1670,15 @@ class scpi (object):
         """
         self._validate_acq_split_params(chan, dec, gain, coupling, siglab, input4)
 
-        self.tx_txt(f"ACQ:DEC:Factor:CH{chan} {dec}")
-        self.tx_txt(f"ACQ:AVG:CH{chan} {'ON' if averaging else 'OFF'}")
-        if gain is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:GAIN {gain.value}")
-        if siglab and coupling is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:COUP {coupling.value}")
+        with self.batch():
+            self.tx_txt(f"ACQ:DEC:Factor:CH{chan} {dec}")
+            self.tx_txt(f"ACQ:AVG:CH{chan} {'ON' if averaging else 'OFF'}")
+            if gain is not None:
+                self.tx_txt(f"ACQ:SOUR{chan}:GAIN {gain.value}")
+            if siglab and coupling is not None:
+                self.tx_txt(f"ACQ:SOUR{chan}:COUP {coupling.value}")
 
-        self.check_error()
+            self.check_error()
 
     def acq_split_trig_set(
         self,
@@ -1442,13 +1716,14 @@ class scpi (object):
         """
         self._validate_acq_split_trig_params(chan, trig_lvl, trig_delay, trig_delay_ns, input4) # type: ignore
 
-        if trig_delay_ns:
-            self.tx_txt(f"ACQ:TRig:DLY:NS:CH{chan} {trig_delay}")
-        else:
-            self.tx_txt(f"ACQ:TRig:DLY:CH{chan} {trig_delay}")
+        with self.batch():
+            if trig_delay_ns:
+                self.tx_txt(f"ACQ:TRig:DLY:NS:CH{chan} {trig_delay}")
+            else:
+                self.tx_txt(f"ACQ:TRig:DLY:CH{chan} {trig_delay}")
 
-        self.tx_txt(f"ACQ:TRig:LEV:CH{chan} {trig_lvl}")
-        self.check_error()
+            self.tx_txt(f"ACQ:TRig:LEV:CH{chan} {trig_lvl}")
+            self.check_error()
 
     # Get data from RP
     def acq_data(
@@ -1509,41 +1784,108 @@ class scpi (object):
         """
         self._validate_acq_data_params(chan, start, end, num_samples, old, last, trig_pos, input4)
 
-        # Determine the output data
+        # Data type from the shadow state, read from Red Pitaya only if unknown
+        if self.state.get("ACQ:DATA:UNITS") is None or self.state.get("ACQ:DATA:FORMAT") is None:
+            self.refresh_state(input4=input4)
+        units = Units(self.state.get("ACQ:DATA:UNITS"))
+        data_format = DataFormat(self.state.get("ACQ:DATA:FORMAT"))
+
+        self.tx_txt(self._acq_data_query(chan, start, end, num_samples, old, last, trig_pos))
+
+        # Convert data
+        if data_format == DataFormat.BIN:
+            buff = self._decode_acq_bin(self.rx_arb(), units)
+        else:
+            buff = self._decode_acq_ascii(self.rx_txt()) # type: ignore
+        self.check_error()
+
+        return buff
+
+    def _acq_data_query(
+        self,
+        chan: int,
+        start: Optional[int],
+        end: Optional[int],
+        num_samples: Optional[int],
+        old: bool,
+        last: bool,
+        trig_pos: Optional[DataTriggerPosition]
+    ) -> str:
+        """
+        Determine the output data query for acq_data function.
+        """
         if start is not None and end is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:STArt:End? {start},{end}")
+            return f"ACQ:SOUR{chan}:DATA:STArt:End? {start},{end}"
         elif start is not None and num_samples is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:STArt:N? {start},{num_samples}")
+            return f"ACQ:SOUR{chan}:DATA:STArt:N? {start},{num_samples}"
         elif old and num_samples is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:Old:N? {num_samples}")
+            return f"ACQ:SOUR{chan}:DATA:Old:N? {num_samples}"
         elif last and num_samples is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:LATest:N? {num_samples}")
+            return f"ACQ:SOUR{chan}:DATA:LATest:N? {num_samples}"
         elif trig_pos is not None and num_samples is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:TRig? {num_samples},{trig_pos.value}")
-        else:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA?")
+            return f"ACQ:SOUR{chan}:DATA:TRig? {num_samples},{trig_pos.value}"
+        return f"ACQ:SOUR{chan}:DATA?"
 
-        # Get data type from Red Pitaya
-        units = self.txrx_txt('ACQ:DATA:Units?')
-        data_format = self.txrx_txt("ACQ:DATA:FORMAT?")
-        self.check_error()
+    @staticmethod
+    def _decode_acq_bin(buff_byte, units: Units) -> np.ndarray:
+        """
+        Convert a binary block of acquired data.
+        """
+        if units == Units.RAW:
+            return np.frombuffer(buff_byte, dtype='>i2') # type: ignore
+        return np.frombuffer(buff_byte, dtype='>f4') # type: ignore
 
-        #! Check if data_format is correct
-        # Convert data
-        if data_format == "BIN":
-            buff_byte = self.rx_arb()
-            if units == "VOLTS":
-                buff = np.frombuffer(buff_byte, dtype='>f4') # type: ignore
-                #buff = [struct.unpack('!f',bytearray(buff_byte[i:i+4]))[0] for i in range(0, len(buff_byte), 4)]
-            elif units == "RAW":
-                buff = np.frombuffer(buff_byte, dtype='>i2') # type: ignore
-                #buff = [struct.unpack('!h',bytearray(buff_byte[i:i+2]))[0] for i in range(0, len(buff_byte), 2)]
-        else:
-            buff_string = self.rx_txt().strip('{}\n\r').replace("  ", "").split(',') # type: ignore
-            buff = np.array(buff_string).astype(np.float64)
-        self.check_error()
+    @staticmethod
+    def _decode_acq_ascii(buff_string: str) -> np.ndarray:
+        """
+        Convert an ASCII reply of acquired data, in one vectorized step.
+        """
+        try:
+            with warnings.catch_warnings():
+                # Older NumPy warns instead of raising on a field that is not a number
+                warnings.simplefilter('error', DeprecationWarning)
+                return np.fromstring(buff_string.strip('{}\n\r'), sep=',')
+        except (ValueError, DeprecationWarning):
+            raise ValueError(f"Invalid ASCII acquisition data: {buff_string[:40]!r}") from None
+
+    # Shadow state
+    def refresh_state(self, input4: bool = False) -> None:
+        """
+        Resynchronise the shadow copy of the acquisition settings (units, data format
+        and input gains) with Red Pitaya. Use it when the settings may have been
+        changed by another client, e.g. the Red Pitaya web applications.
 
-        return buff # type: ignore
+        Parameters
+        ----------
+            input4 (bool, optional) :
+                Set to True if operating with STEMlab 125-14 4-Input.
+                Defaults to False.
+        """
+        n = 4 if input4 else 2
+
+        with self.batch():
+            self.tx_txt("ACQ:DATA:Units?")
+            self.tx_txt("ACQ:DATA:FORMAT?")
+            for i in range(n):
+                self.tx_txt(f"ACQ:SOUR{i+1}:GAIN?")
+        units = self.rx_txt().strip().upper() # type: ignore
+        data_format = self.rx_txt().strip().upper() # type: ignore
+        gains = [self.rx_txt().strip().upper() for _ in range(n)] # type: ignore
+
+        self.state.set("ACQ:DATA:UNITS", units)
+        self.state.set("ACQ:DATA:FORMAT", data_format)
+        for i, g in enumerate(gains):
+            self.state.set(f"ACQ:SOUR{i+1}:GAIN", g)
+
+    def _input_gain(self, chan: int) -> str:
+        """
+        Input gain ("LV"/"HV") of a channel from the shadow state, read from Red Pitaya if unknown.
+        """
+        gain = self.state.get(f"ACQ:SOUR{chan}:GAIN")
+        if gain is None:
+            gain = self.txrx_txt(f"ACQ:SOUR{chan}:GAIN?").strip().upper() # type: ignore
+            self.state.set(f"ACQ:SOUR{chan}:GAIN", gain)
+        return gain
 
     # Validations
     def _validate_acq_set_params(
@@ -1607,7 +1949,7 @@ class scpi (object):
         """
         Validate parameters for acq_trig_set function.
         """
-        trig_lvl_lim = 20.0 if any(self.txrx_txt(f"ACQ:SOUR{i+1}:GAIN?").upper() == "HV" for i in range(4 if input4 else 2)) else 1.0 # type: ignore
+        trig_lvl_lim = 20.0 if any(self._input_gain(i+1) == "HV" for i in range(4 if input4 else 2)) else 1.0
         ext_trig_lvl_limit = 5.0
 
         assert abs(trig_lvl) <= trig_lvl_lim, f"Trigger level out of range {-trig_lvl_lim, trig_lvl_lim} V"
@@ -1682,8 +2024,8 @@ class scpi (object):
 
         assert chan <= n, f"Channel {chan} out of range for the current Red Pitaya board"
 
-        gain = self.txrx_txt(f"ACQ:SOUR{chan}:GAIN?")
-        if gain.upper() == "HV": # type: ignore
+        gain = self._input_gain(chan)
+        if gain == "HV":
             trig_lvl_lim = 20.0
             gain_lvl = "HV"
 
@@ -1750,12 +2092,13 @@ class scpi (object):
         """
         self._validate_uart_params(speed, bits, parity, stop, timeout)
 
-        self.tx_txt("UART:INIT")
-        self.tx_txt(f"UART:SPEED {speed}")
-        self.tx_txt(f"UART:BITS {bits.value}")
-        self.tx_txt(f"UART:STOPB STOP{stop}")
-        self.tx_txt(f"UART:PARITY {parity.value}")
-        self.tx_txt(f"UART:TIMEOUT {timeout}")
+        with self.batch():
+            self.tx_txt("UART:INIT")
+            self.tx_txt(f"UART:SPEED {speed}")
+            self.tx_txt(f"UART:BITS {bits.value}")
+            self.tx_txt(f"UART:STOPB STOP{stop}")
+            self.tx_txt(f"UART:PARITY {parity.value}")
+            self.tx_txt(f"UART:TIMEOUT {timeout}")
 
     def uart_get_settings(self) -> List[str | None]:
         """
@@ -1889,12 +2232,13 @@ class scpi (object):
 
         # Configuring SPI
 
-        self.tx_txt(f"SPI:SETtings:MODE {spi_mode.upper()}")
-        self.tx_txt(f"SPI:SETtings:CSMODE {cs_mode.upper()}")
-        self.tx_txt(f"SPI:SETtings:SPEED {speed}")
-        self.tx_txt(f"SPI:SETtings:WORD {word_len}")
+        with self.batch():
+            self.tx_txt(f"SPI:SETtings:MODE {spi_mode.upper()}")
+            self.tx_txt(f"SPI:SETtings:CSMODE {cs_mode.upper()}")
+            self.tx_txt(f"SPI:SETtings:SPEED {speed}")
+            self.tx_txt(f"SPI:SETtings:WORD {word_len}")
 
-        self.tx_txt("SPI:SETtings:SET")
+            self.tx_txt("SPI:SETtings:SET")
         print("SPI is configured")
 
     def spi_get_settings(
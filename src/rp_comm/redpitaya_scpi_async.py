@@ -0,0 +1,423 @@
+"""
+asyncio counterpart of the blocking scpi class, for use from Bokeh/Tornado coroutines.
+"""
+
+import asyncio
+import functools
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Optional
+
+import numpy as np
+
+from rp_comm.device_state import DeviceState
+from rp_comm.redpitaya_scpi import (
+    FATAL_ERROR_CODE, DataFormat, DataTriggerPosition, ErrorPolicy, SCPIError, SCPIErrorEntry, Units, scpi
+)
+
+
+class _CommandRecorder(scpi):
+    """
+    Runs the validation and command building of the blocking scpi class,
+    collecting the commands instead of sending them.
+    """
+
+    def __init__(self, state: DeviceState):
+        # Every attribute of scpi is set, a setter may read any of them
+        super().__init__("")
+        self.state = state
+        self.commands: List[str] = []
+        self.check: Optional[bool] = None
+
+    def connect(self):
+        pass
+
+    def tx_txt(self, msg: str):
+        self.commands.append(msg)
+
+    @contextmanager
+    def batch(self, opc: bool = False):
+        yield self
+
+    def check_error(self, stop: bool = True, force: bool = False):
+        self.check = bool(self.check) or stop
+
+    def _input_gain(self, chan: int) -> str:
+        # Filled in by scpi_async._ensure_gains() before running the trigger setters
+        return self.state.get(f"ACQ:SOUR{chan}:GAIN", "LV") # type: ignore
+
+
+def _recorded(method):
+    """Async wrapper of a setter of the blocking scpi class."""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs) -> None:
+        await self._run(method, *args, **kwargs)
+    return wrapper
+
+
+class scpi_async(object):
+    """
+    SCPI client for Red Pitaya built on asyncio streams.
+
+    Offers the same commands as ``scpi`` (``gen_set``, ``acq_set``, ``acq_trig_set``,
+    ``acq_data``, ...) as coroutines, so acquisition can be awaited without blocking
+    the event loop. The setters reuse the validation and command building of ``scpi``
+    and send each call in a single write.
+
+    A connection serves one coroutine at a time; share it through ``lock``
+    or open one connection per task.
+
+        rp = await scpi_async.open('rp-f0c5e4.local')
+        await rp.acq_set(16, Units.VOLTS, DataFormat.BIN)
+        data = await rp.acq_data(1)
+    """
+    delimiter = scpi.delimiter
+    _delimiter = scpi._delimiter
+    fatal_errors = scpi.fatal_errors
+
+    def __init__(
+        self,
+        host: str,
+        timeout: Optional[float]=None,
+        port: int=5000,
+        error_policy: ErrorPolicy=ErrorPolicy.IMMEDIATE,
+        error_sample: int=10,
+        error_queue_len: int=100,
+        skip_redundant: bool=False,
+        limit: int=2**22,
+        fatal_code: Optional[int]=FATAL_ERROR_CODE
+    ):
+        """Initialize object, the connection is opened by connect().
+        ``limit`` is the largest text reply accepted (bytes).
+        """
+        self.host    = host
+        self.port    = port
+        self.timeout = timeout
+        self.limit   = limit
+
+        self.error_policy = error_policy
+        self.error_sample = error_sample
+        self.fatal_code = fatal_code
+        self.errors: deque = deque(maxlen=error_queue_len)
+        self._error_calls = 0
+        self._deferred_check: Optional[bool] = None
+
+        self.state = DeviceState()
+        self.skip_redundant = skip_redundant
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: List[str] = []
+        self._in_batch = False
+        self._batch_check: Optional[bool] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    async def open(cls, host: str, **kwargs) -> "scpi_async":
+        """Create a client and open its connection."""
+        self = cls(host, **kwargs)
+        await self.connect()
+        return self
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """Lock for sharing the connection between coroutines."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def connect(self):
+        """Open IP connection."""
+        self._reader, self._writer = await self._wait(
+            asyncio.open_connection(self.host, self.port, limit=self.limit)
+        )
+
+    async def reconnect(self):
+        """Close and reopen the IP connection, dropping pending data and the shadow state."""
+        await self.close()
+        self._pending.clear()
+        self._in_batch = False
+        self._batch_check = None
+        self.state.invalidate()
+        await self.connect()
+
+    async def close(self):
+        """Close IP connection."""
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        self._reader = self._writer = None
+
+    async def __aenter__(self):
+        if self._writer is None:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _wait(self, aw):
+        if self.timeout is None:
+            return await aw
+        return await asyncio.wait_for(aw, self.timeout)
+
+    ### Transport ###
+
+    def _queue(self, msg: str):
+        if not self.state.write(msg) and self.skip_redundant:
+            return
+        self._pending.append(msg)
+
+    async def flush(self):
+        """Send the queued commands in one write."""
+        if not self._pending:
+            return
+        msg = self.delimiter.join(self._pending) + self.delimiter
+        self._pending.clear()
+        self._writer.write(msg.encode('utf-8')) # type: ignore
+        await self._wait(self._writer.drain()) # type: ignore
+
+    async def tx_txt(self, msg: str):
+        """Send text string and append delimiter. Inside batch() the command is queued instead."""
+        self._queue(msg)
+        if not self._in_batch:
+            await self.flush()
+
+    async def rx_txt(self) -> str:
+        """Receive text string and return it after removing the delimiter."""
+        await self.flush()
+        line = await self._wait(self._reader.readuntil(self._delimiter)) # type: ignore
+        return line[:-len(self._delimiter)].decode('utf-8')
+
+    async def rx_arb(self):
+        """Receive an IEEE-488.2 definite length block, returns the payload or False."""
+        await self.flush()
+        header = await self._wait(self._reader.readexactly(2)) # type: ignore
+        if header[:1] != b'#':
+            return False
+        num_digits = int(header[1:2])
+        if num_digits <= 0:
+            return False
+        num_bytes = int(await self._wait(self._reader.readexactly(num_digits))) # type: ignore
+        data = await self._wait(self._reader.readexactly(num_bytes + 2)) # type: ignore
+        return memoryview(data)[:num_bytes]
+
+    async def txrx_txt(self, msg: str) -> str:
+        """Send/receive text string."""
+        await self.tx_txt(msg)
+        return await self.rx_txt()
+
+    @asynccontextmanager
+    async def batch(self, opc: bool = False):
+        """Async counterpart of scpi.batch(): the commands of the block are sent in one write."""
+        if self._in_batch:
+            yield self
+            return
+
+        self._in_batch = True
+        state = self.state.snapshot()
+        try:
+            yield self
+        except BaseException:
+            self._pending.clear()
+            self._in_batch = False
+            self._batch_check = None
+            self.state.restore(state)
+            raise
+        self._in_batch = False
+
+        check, self._batch_check = self._batch_check, None
+        try:
+            if opc:
+                self._pending.append('*OPC?')
+            await self.flush()
+            if opc:
+                await self.rx_txt()
+        except BaseException:
+            # Unknown which of the commands reached the board
+            self._pending.clear()
+            self.state.invalidate()
+            raise
+
+        if check is not None or self._deferred_check is not None:
+            await self.check_error(bool(check), force=self.error_policy is ErrorPolicy.DEFERRED)
+
+    async def check_error(self, stop: bool = True, force: bool = False):
+        """Async counterpart of scpi.check_error()."""
+        if self._in_batch:
+            self._batch_check = bool(self._batch_check) or stop
+            return
+
+        if not force:
+            if self.error_policy is ErrorPolicy.DEFERRED:
+                self._deferred_check = bool(self._deferred_check) or stop
+                return
+            if self.error_policy is ErrorPolicy.SAMPLED:
+                self._error_calls += 1
+                if self._error_calls < self.error_sample:
+                    return
+
+        stop = stop or bool(self._deferred_check)
+        self._deferred_check = None
+        self._error_calls = 0
+
+        if not (int(await self.stb_q()) & 0x4):
+            return
+
+        count = int(await self.err_c())
+        self._pending.extend(['SYST:ERR:NEXT?'] * count)
+        new_errors = []
+        for _ in range(count):
+            code, _, message = (await self.rx_txt()).partition(',')
+            if int(code) != 0:
+                new_errors.append(SCPIErrorEntry(int(code), message.strip().strip('"')))
+        self.errors.extend(new_errors)
+        if new_errors:
+            self.state.invalidate()
+        for error in new_errors:
+            print('{:d},"{!s:s}"'.format(error.code, error.message))
+
+        fatal = self.fatal_errors(new_errors)
+        if stop and fatal:
+            raise SCPIError(fatal)
+
+    def pop_errors(self) -> List[SCPIErrorEntry]:
+        """Return and clear the errors collected by check_error()."""
+        errors = list(self.errors)
+        self.errors.clear()
+        return errors
+
+    async def _run(self, method, *args, **kwargs):
+        """Run a setter of the blocking class and send the commands it produced."""
+        recorder = _CommandRecorder(self.state)
+        method(recorder, *args, **kwargs)
+        for msg in recorder.commands:
+            self._queue(msg)
+
+        if self._in_batch:
+            if recorder.check is not None:
+                self._batch_check = bool(self._batch_check) or recorder.check
+            return
+        await self.flush()
+        if recorder.check is not None:
+            await self.check_error(recorder.check)
+
+    ### Commands ###
+
+    daisy_set = _recorded(scpi.daisy_set)
+
+    gen_set = _recorded(scpi.gen_set)
+    gen_burst_enable = _recorded(scpi.gen_burst_enable)
+    gen_burst_disable = _recorded(scpi.gen_burst_disable)
+    gen_burst_set = _recorded(scpi.gen_burst_set)
+    gen_sweep_set = _recorded(scpi.gen_sweep_set)
+    gen_sweep_enable = _recorded(scpi.gen_sweep_enable)
+    gen_sweep_disable = _recorded(scpi.gen_sweep_disable)
+    gen_sweep_pause = _recorded(scpi.gen_sweep_pause)
+    gen_sweep_resume = _recorded(scpi.gen_sweep_resume)
+
+    acq_set = _recorded(scpi.acq_set)
+    acq_start = _recorded(scpi.acq_start)
+    acq_stop = _recorded(scpi.acq_stop)
+    acq_trig_ext_hyst_set = _recorded(scpi.acq_trig_ext_hyst_set)
+    acq_set_units_format = _recorded(scpi.acq_set_units_format)
+    acq_split_enable = _recorded(scpi.acq_split_enable)
+    acq_split_disable = _recorded(scpi.acq_split_disable)
+    acq_split_set = _recorded(scpi.acq_split_set)
+
+    uart_set = _recorded(scpi.uart_set)
+    spi_set = _recorded(scpi.spi_set)
+
+    @functools.wraps(scpi.acq_trig_set)
+    async def acq_trig_set(self, *args, **kwargs) -> None:
+        await self._ensure_gains(4 if kwargs.get('input4') else 2)
+        await self._run(scpi.acq_trig_set, *args, **kwargs)
+
+    @functools.wraps(scpi.acq_split_trig_set)
+    async def acq_split_trig_set(self, chan: int, *args, **kwargs) -> None:
+        await self._ensure_gains(chan)
+        await self._run(scpi.acq_split_trig_set, chan, *args, **kwargs)
+
+    async def acq_trig_fill(self) -> bool:
+        """Returns True when the acquisition buffer has been filled after the trigger."""
+        return (await self.txrx_txt('ACQ:TRig:FILL?')).strip() == '1'
+
+    async def acq_data(
+        self,
+        chan: int,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        num_samples: Optional[int] = None,
+        old: bool = False,
+        last: bool = False,
+        trig_pos: Optional[DataTriggerPosition] = None,
+        input4: bool = False
+    ) -> np.ndarray:
+        """Async counterpart of scpi.acq_data(), see there for the options."""
+        recorder = _CommandRecorder(self.state)
+        recorder._validate_acq_data_params(chan, start, end, num_samples, old, last, trig_pos, input4)
+
+        if self.state.get("ACQ:DATA:UNITS") is None or self.state.get("ACQ:DATA:FORMAT") is None:
+            await self.refresh_state(input4=input4)
+        units = Units(self.state.get("ACQ:DATA:UNITS"))
+        data_format = DataFormat(self.state.get("ACQ:DATA:FORMAT"))
+
+        await self.tx_txt(recorder._acq_data_query(chan, start, end, num_samples, old, last, trig_pos))
+
+        if data_format == DataFormat.BIN:
+            buff = scpi._decode_acq_bin(await self.rx_arb(), units)
+        else:
+            buff = scpi._decode_acq_ascii(await self.rx_txt())
+        await self.check_error()
+
+        return buff
+
+    async def refresh_state(self, input4: bool = False) -> None:
+        """Async counterpart of scpi.refresh_state()."""
+        n = 4 if input4 else 2
+
+        self._pending.extend(["ACQ:DATA:Units?", "ACQ:DATA:FORMAT?"] + [f"ACQ:SOUR{i+1}:GAIN?" for i in range(n)])
+        self.state.set("ACQ:DATA:UNITS", (await self.rx_txt()).strip().upper())
+        self.state.set("ACQ:DATA:FORMAT", (await self.rx_txt()).strip().upper())
+        for i in range(n):
+            self.state.set(f"ACQ:SOUR{i+1}:GAIN", (await self.rx_txt()).strip().upper())
+
+    async def _ensure_gains(self, n: int):
+        """Read the input gains of channels 1..n that are not in the shadow state."""
+        missing = [i for i in range(1, n + 1) if self.state.get(f"ACQ:SOUR{i}:GAIN") is None]
+        self._pending.extend(f"ACQ:SOUR{i}:GAIN?" for i in missing)
+        for i in missing:
+            self.state.set(f"ACQ:SOUR{i}:GAIN", (await self.rx_txt()).strip().upper())
+
+    ### IEEE Mandated Commands ###
+
+    async def cls(self):
+        """Clear Status Command"""
+        await self.tx_txt('*CLS')
+
+    async def idn_q(self) -> str:
+        """Identification Query"""
+        return await self.txrx_txt('*IDN?')
+
+    async def opc_q(self) -> str:
+        """Operation Complete Query"""
+        return await self.txrx_txt('*OPC?')
+
+    async def rst(self):
+        """Reset Command"""
+        await self.tx_txt('*RST')
+
+    async def stb_q(self) -> str:
+        """Read Status Byte Query"""
+        return await self.txrx_txt('*STB?')
+
+    async def err_c(self) -> str:
+        """Error count."""
+        return await self.txrx_txt('SYST:ERR:COUN?')
+
+    async def err_n(self) -> str:
+        """Error next."""
+        return await self.txrx_txt('SYST:ERR:NEXT?')
@@ -0,0 +1,174 @@
+import threading
+import time
+
+import numpy as np
+
+from rp_comm.instrumentation import probe
+from rp_plot.redpitaya import BUFFER_SIZE
+
+
+class Frame:
+    """
+    One acquisition of both channels.
+
+    data : (2, BUFFER_SIZE) float32 array, only data[:, :length] is valid
+    index : frame counter of the engine
+    timestamp : time.time() when the frame was read
+    """
+    def __init__(self, samples=BUFFER_SIZE, n_channels=2):
+        self.data = np.zeros((n_channels, samples), dtype=np.float32)
+        self.length = 0
+        self.index = -1
+        self.timestamp = 0.0
+
+    def channel(self, i):
+        return self.data[i, :self.length]
+
+
+class FrameBuffer:
+    """
+    Triple buffer of preallocated frames between one writer and one reader.
+
+    The writer fills the frame returned by `write_frame` and publishes it
+    with `publish`. The reader gets the newest published frame with `latest`
+    and owns it until the next call. Neither side waits for the other: a
+    frame published before the previous one was read replaces it, and is
+    counted in `dropped`.
+    """
+    def __init__(self, samples=BUFFER_SIZE, n_channels=2):
+        self.frames = [Frame(samples, n_channels) for _ in range(3)]
+        self._write, self._ready, self._read = 0, 1, 2
+        self._fresh = False
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def write_frame(self):
+        return self.frames[self._write]
+
+    def publish(self):
+        with self._lock:
+            self._write, self._ready = self._ready, self._write
+            if self._fresh:
+                self.dropped += 1
+            self._fresh = True
+            self.published += 1
+
+    def latest(self):
+        """
+        Newest frame not returned yet, or None.
+        """
+        with self._lock:
+            if not self._fresh:
+                return None
+            self._read, self._ready = self._ready, self._read
+            self._fresh = False
+        return self.frames[self._read]
+
+
+class AcquisitionEngine:
+    """
+    Keeps a RedPitaya acquiring in a background thread.
+
+    The board is armed once, and re-armed in the same write as the data
+    queries of each filled buffer, so the next acquisition runs while the
+    previous one is transferred. Frames are decoded into the preallocated
+    arrays of a FrameBuffer, the plotting side takes them with `latest()`.
+
+    Parameters
+    ----------
+    rp : RedPitaya
+    decimation, trigger_level, data_units, data_format, trigger_source, to_volts :
+        see RedPitaya.read_data; unlike read_data the engine defaults to
+        binary transfers and to_volts=True, so data_units='RAW' still gives Volts
+    timeout : float
+        in s, a trigger that does not come in this time is counted in
+        stats()['timeouts'] and the board is re-armed
+    """
+    def __init__(self, rp, decimation=8, trigger_level=0.1, data_units='Volts', data_format='bin', trigger_source='CH1_PE', to_volts=True, timeout=5, samples=BUFFER_SIZE):
+        self.rp = rp
+        self.settings = dict(decimation=decimation, trigger_level=trigger_level, data_units=data_units, data_format=data_format, trigger_source=trigger_source)
+        self.to_volts = to_volts
+        self.timeout = timeout
+        self.buffer = FrameBuffer(samples)
+
+        self.frames = 0
+        self.timeouts = 0
+        self.error = None
+        self._started = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name='rp-acquisition', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def latest(self):
+        """
+        Newest frame not returned yet, or None. Valid until the next call.
+        """
+        return self.buffer.latest()
+
+    def stats(self):
+        elapsed = time.time() - self._started if self._started else 0.0
+        return dict(
+            frames=self.frames,
+            published=self.buffer.published,
+            dropped=self.buffer.dropped,
+            timeouts=self.timeouts,
+            rate=self.frames / elapsed if elapsed > 0 else 0.0,
+            error=self.error,
+        )
+
+    def _run(self):
+        rp = self.rp
+        self._started = time.time()
+        try:
+            rp.arm(**self.settings)
+            while not self._stop.is_set():
+                try:
+                    with probe.span('acquisition.trigger_wait'):
+                        rp.wait_filled(self.timeout)
+                except TimeoutError:
+                    self.timeouts += 1
+                    rp.rearm()
+                    continue
+
+                frame = self.buffer.write_frame()
+                with rp.lock, probe.span('acquisition.transfer'):
+                    # Re-arm together with the data queries, the board answers them before starting again
+                    with rp.rp.batch():
+                        rp.request_channels()
+                        if not self._stop.is_set():
+                            rp.rearm()
+                    frame.length = rp.read_channels(self.to_volts, out=frame.data, requested=True)
+                # The board starts the next acquisition only after sending the data
+                rp.mark_armed()
+
+                frame.index = self.frames
+                frame.timestamp = time.time()
+                self.frames += 1
+                self.buffer.publish()
+                probe.count('acquisition.frames')
+        except Exception as e:
+            self.error = e
+            print(f"Acquisition stopped: {e}")
+        finally:
+            try:
+                rp.stop_acquisition()
+            except Exception:
+                pass
@@ -0,0 +1,107 @@
+import numpy as np
+
+
+def minmax(x, y, n_out):
+    """
+    Min/max envelope decimation.
+
+    Keeps the first and last samples and splits the samples in between into
+    (n_out - 2) // 2 buckets of consecutive samples, each reduced to its
+    minimum and maximum in x order, so peaks are kept whatever the reduction
+    factor. NaN values propagate to the bucket (a gap in the line).
+
+    Returns the selected (x, y), n_out points (n_out - 1 if odd), unchanged
+    if len(y) <= n_out.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 2:
+        return x, y
+    idx = minmax_indices(y, n_out)
+    return x[idx], y[idx]
+
+
+def minmax_indices(y, n_out):
+    """
+    Indices selected by `minmax`, sorted.
+    """
+    n = len(y)
+    buckets = (n_out - 2) // 2
+    idx = [[0]]
+    if buckets:
+        # The first `larger` buckets hold one sample more than the others
+        size, larger = divmod(n - 2, buckets)
+        split = 1 + larger * (size + 1)
+        idx.append(_bucket_extrema(y[1:split].reshape(larger, size + 1), 1))
+        idx.append(_bucket_extrema(y[split:n - 1].reshape(buckets - larger, size), split))
+    idx.append([n - 1])
+    return np.concatenate(idx)
+
+
+def _bucket_extrema(buckets, offset):
+    size = buckets.shape[1]
+    imin = np.argmin(buckets, axis=1)
+    imax = np.argmax(buckets, axis=1)
+    base = offset + np.arange(len(buckets)) * size
+    pairs = np.stack((np.minimum(imin, imax), np.maximum(imin, imax)), axis=1) + base[:, None]
+    return pairs.ravel()
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets decimation (Steinarsson, 2013).
+
+    Keeps the first and last samples and, from each of the n_out - 2 buckets
+    in between, the sample forming the largest triangle with the sample kept
+    from the previous bucket and the mean of the next bucket. Follows the
+    visual shape closely with one point per bucket.
+
+    Returns the selected (x, y), unchanged if len(y) <= n_out.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return x, y
+    idx = lttb_indices(np.asarray(x, dtype=float), np.asarray(y, dtype=float), n_out)
+    return x[idx], y[idx]
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices selected by `lttb`, sorted.
+    """
+    n = len(y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+
+    # Mean of every bucket, the point the triangles are built towards
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    mean_x = np.append(mean_x, x[-1])
+    mean_y = np.append(mean_y, y[-1])
+
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        cx, cy = mean_x[b + 1], mean_y[b + 1]
+        # Twice the triangle area, for every candidate of the bucket
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[b + 1] = a
+    return idx
+
+
+METHODS = {
+    'minmax': minmax,
+    'lttb': lttb,
+}
+
+
+def decimate(x, y, n_out, method='minmax'):
+    """
+    Reduce (x, y) to about n_out points with `method` ('minmax' or 'lttb',
+    None returns the data unchanged).
+    """
+    if method is None:
+        return x, y
+    return METHODS[method](x, y, n_out)
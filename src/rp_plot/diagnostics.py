@@ -0,0 +1,115 @@
+import time
+
+from bokeh.layouts import column, row
+from bokeh.models import Button, ColumnDataSource, DataTable, NumberFormatter, Select, TableColumn, Toggle
+from bokeh.plotting import figure
+
+from rp_comm.instrumentation import probe as default_probe
+
+SPAN_COLUMNS = ['count', 'mean_us', 'p50_us', 'p90_us', 'p99_us', 'max_us', 'total_ms']
+
+
+class DiagnosticsPanel:
+    """
+    Bokeh page showing the timing spans and counters of an instrumentation
+    probe: a table of the latency percentiles per span, the counters with
+    their rate, and the latency histogram of the selected span. Refreshed
+    every update_time ms; served next to the plot, see main.py.
+
+    Parameters
+    ----------
+    probe : rp_comm.instrumentation.Probe
+        defaults to the shared probe
+    update_time : int
+        in ms, refresh interval
+    export_path : str
+        JSON file name written by the export button, formatted with time.strftime
+    """
+    def __init__(self, probe=None, update_time=1000, export_path='diagnostics_%Y%m%d_%H%M%S.json'):
+        self.probe = default_probe if probe is None else probe
+        self.update_time = update_time
+        self.export_path = export_path
+        self.periodic_callback = None
+        self._counts = {}
+        self._counted = time.time()
+
+        self.spans = ColumnDataSource(data=dict(name=[], **{c: [] for c in SPAN_COLUMNS}))
+        self.counters = ColumnDataSource(data=dict(name=[], value=[], rate=[]))
+        self.buckets = ColumnDataSource(data=dict(left=[], right=[], count=[]))
+        self.setup_panel()
+
+    def setup_panel(self):
+        number = NumberFormatter(format='0,0.0')
+        columns = [TableColumn(field='name', title='span', width=220)]
+        columns += [TableColumn(field=c, title=c.replace('_', ' '), formatter=number) for c in SPAN_COLUMNS]
+        self.span_table = DataTable(source=self.spans, columns=columns, index_position=None, height=300, sizing_mode='stretch_width')
+
+        self.counter_table = DataTable(source=self.counters, index_position=None, height=300, width=420, columns=[
+            TableColumn(field='name', title='counter', width=200),
+            TableColumn(field='value', title='value', formatter=NumberFormatter(format='0,0')),
+            TableColumn(field='rate', title='per s', formatter=number),
+        ])
+
+        self.histogram = figure(title='Latency histogram', x_axis_type='log', x_axis_label='µs', y_axis_label='count',
+                                height=300, sizing_mode='stretch_width')
+        self.histogram.quad(left='left', right='right', top='count', bottom=0, source=self.buckets, fill_alpha=0.6)
+
+        self.select = Select(title='Span', options=[], width=260)
+        self.select.on_change('value', lambda attr, old, new: self.refresh())
+
+        self.toggle = Toggle(label='Instrumentation', active=self.probe.enabled, width=140)
+        self.toggle.on_change('active', lambda attr, old, new: self.probe.enable(new))
+        self.reset_button = Button(label='Reset', width=80)
+        self.reset_button.on_click(self.reset)
+        self.export_button = Button(label='Export JSON', width=110)
+        self.export_button.on_click(self.export)
+
+        self.layout = column(
+            row(self.toggle, self.reset_button, self.export_button),
+            self.span_table,
+            row(self.counter_table, column(self.select, self.histogram, sizing_mode='stretch_width'), sizing_mode='stretch_width'),
+            sizing_mode='stretch_width',
+        )
+
+    def attach_doc(self, doc):
+        self.doc = doc
+        doc.theme = "dark_minimal"
+        doc.title = "Diagnostics"
+        doc.add_root(self.layout)
+        self.refresh()
+        self.periodic_callback = doc.add_periodic_callback(self.refresh, self.update_time)
+
+    def refresh(self):
+        snapshot = self.probe.snapshot(buckets=True)
+        spans = snapshot['spans']
+        names = list(spans)
+        self.spans.data = dict(name=names, **{c: [spans[n].get(c, 0) for n in names] for c in SPAN_COLUMNS})
+
+        now = time.time()
+        elapsed = max(now - self._counted, 1e-9)
+        counters = snapshot['counters']
+        self.counters.data = dict(name=list(counters), value=list(counters.values()),
+                                  rate=[(v - self._counts.get(n, 0)) / elapsed for n, v in counters.items()])
+        self._counts, self._counted = counters, now
+
+        if self.select.options != names:
+            self.select.options = names
+        if self.select.value not in names:
+            self.select.value = names[0] if names else ''
+            return
+
+        # Buckets of the selected span, in µs
+        buckets = spans[self.select.value].get('buckets', [])
+        self.buckets.data = dict(left=[max(b[0], 1) / 1e3 for b in buckets], right=[b[1] / 1e3 for b in buckets],
+                                 count=[b[2] for b in buckets])
+
+    def reset(self):
+        self.probe.reset()
+        self._counts = {}
+        self.refresh()
+
+    def export(self):
+        path = time.strftime(self.export_path)
+        self.probe.to_json(path)
+        print(f"Diagnostics written to {path}")
+        return path
@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class SignalGenerator:
+    """
+    Synthetic device output: channel i is a sine of `frequency` * (i + 1) Hz
+    plus Gaussian noise, sampled at `sample_rate`, formatted as the CSV
+    lines the device sends.
+    """
+    def __init__(self, n_channels=2, sample_rate=1000.0, amplitude=1.0, frequency=5.0, noise=0.05, decimals=4, seed=0):
+        self.n_channels = n_channels
+        self.sample_rate = sample_rate
+        self.amplitude = amplitude
+        self.frequency = frequency
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.fmt = ','.join([f'%.{decimals}f'] * n_channels) + '\n'
+        self.index = 0
+
+    def samples(self, n):
+        """
+        Next n samples as a (n, n_channels) array.
+        """
+        t = (self.index + np.arange(n)) / self.sample_rate
+        self.index += n
+        harmonics = np.arange(1, self.n_channels + 1)
+        y = self.amplitude * np.sin(2 * np.pi * self.frequency * t[:, None] * harmonics)
+        if self.noise:
+            y += self.rng.normal(scale=self.noise, size=y.shape)
+        return y
+
+    def lines(self, n):
+        """
+        Next n samples as CSV lines.
+        """
+        if n <= 0:
+            return b''
+        return ((self.fmt * n) % tuple(self.samples(n).ravel())).encode()
+
+    def bunch(self, n):
+        """
+        A burst of n samples between start/stop lines (oscilloscope mode).
+        """
+        return b'start\n' + self.lines(n) + b'stop\n'
+
+
+class FakeSerialPort:
+    """
+    In-process stand-in for serial.Serial, emitting the device output at a
+    configurable rate: `line_rate` CSV lines per second, or in oscilloscope
+    mode (`bunch_size` samples) `bunch_rate` start/stop bursts per second.
+
+    Output becomes readable when due according to `clock`; `jitter` (s rms)
+    delays each release, so data arrives in irregular clumps as through a
+    USB serial adapter, never out of order.
+
+    Parameters
+    ----------
+    line_rate : float
+        lines per second in real time mode
+    n_channels : int
+    bunch_size : int
+        samples per burst, None for real time mode
+    bunch_rate : float
+        bursts per second
+    jitter : float
+        in s, standard deviation of the delivery delay
+    """
+    def __init__(self, line_rate=1000.0, n_channels=2, bunch_size=None, bunch_rate=10.0, jitter=0.0, seed=0,
+                 clock=time.monotonic, port='fake', baudrate=115200, **signal):
+        self.line_rate = line_rate
+        self.bunch_size = bunch_size
+        self.bunch_rate = bunch_rate
+        self.jitter = jitter
+        self.clock = clock
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = None
+        self.signal = SignalGenerator(n_channels, sample_rate=line_rate, seed=seed, **signal)
+        self._rng = np.random.default_rng(seed + 1)
+        self.is_open = False
+        self.open()
+
+    def open(self):
+        self.is_open = True
+        self._buf = bytearray()
+        self._started = self.clock()
+        self._released = 0
+        self._delay = 0.0
+        self.sent_samples = 0
+
+    def close(self):
+        self.is_open = False
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            return 0
+        self._release()
+        return len(self._buf)
+
+    def read(self, size=1):
+        self._release()
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+    def readline(self):
+        self._release()
+        end = self._buf.find(b'\n')
+        return self.read(end + 1 if end >= 0 else len(self._buf))
+
+    def write(self, data):
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._buf.clear()
+
+    def _release(self):
+        if not self.is_open:
+            return
+        elapsed = self.clock() - self._started
+        if self.jitter:
+            # New delivery delay per poll, delays only ever hold data back
+            self._delay = abs(self._rng.normal(scale=self.jitter))
+            elapsed -= self._delay
+        rate = self.bunch_rate if self.bunch_size else self.line_rate
+        due = int(elapsed * rate)
+        if due <= self._released:
+            return
+        count = due - self._released
+        self._released = due
+        if self.bunch_size:
+            for _ in range(count):
+                self._buf += self.signal.bunch(self.bunch_size)
+            self.sent_samples += count * self.bunch_size
+        else:
+            self._buf += self.signal.lines(count)
+            self.sent_samples += count
+
+
+class PtySerialDevice:
+    """
+    Fake serial device behind a pseudo terminal (POSIX only): a thread
+    writes the output of a FakeSerialPort to the master side, `port` is the
+    path of the slave side, opened as a real port with serial.Serial(port).
+
+        with PtySerialDevice(line_rate=5000) as device:
+            data_collect = serial.Serial(device.port)
+    """
+    def __init__(self, poll_interval=0.001, **kwargs):
+        # POSIX only, imported here so the module loads on Windows
+        import tty
+
+        self.source = FakeSerialPort(**kwargs)
+        self.poll_interval = poll_interval
+        self._master, slave = os.openpty()
+        # No echo or line editing, as pyserial would configure it
+        tty.setraw(slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(slave)
+        self._slave = slave
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fake-serial', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def sent_samples(self):
+        return self.source.sent_samples
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _run(self):
+        while not self._stop.is_set():
+            data = self.source.read(self.source.in_waiting)
+            while data and not self._stop.is_set():
+                try:
+                    written = os.write(self._master, data)
+                except BlockingIOError:
+                    written = 0
+                data = data[written:]
+                if data:
+                    # The reader is behind, the tty buffer is full
+                    self._stop.wait(self.poll_interval)
+            self._stop.wait(self.poll_interval)
@@ -0,0 +1,262 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from rp_plot.redpitaya import RedPitaya
+
+
+class BoardFrame:
+    """
+    Capture of one board of a fleet.
+
+    name : board name
+    y : (2, n) float32 array, None if the capture failed
+    timestamp : time.time() when the board reported its buffer filled
+    error : exception raised while capturing, or None
+    """
+    def __init__(self, name, y=None, timestamp=None, error=None):
+        self.name = name
+        self.y = y
+        self.timestamp = timestamp
+        self.error = error
+
+
+class FleetCapture:
+    """
+    Frames of one parallel capture, in board order.
+
+    started : time.time() when the boards were armed
+    elapsed : s, from arming the first board to the last frame read
+    """
+    def __init__(self, frames, started, elapsed):
+        self.frames = frames
+        self.started = started
+        self.elapsed = elapsed
+
+    def __getitem__(self, name):
+        for frame in self.frames:
+            if frame.name == name:
+                return frame
+        raise KeyError(name)
+
+    @property
+    def ok(self):
+        return all(frame.error is None for frame in self.frames)
+
+    @property
+    def errors(self):
+        return {frame.name: frame.error for frame in self.frames if frame.error is not None}
+
+    @property
+    def skew(self):
+        """
+        Spread (s) of the fill timestamps of the captured frames.
+        """
+        timestamps = [frame.timestamp for frame in self.frames if frame.error is None]
+        return max(timestamps) - min(timestamps) if timestamps else 0.0
+
+    def aligned(self):
+        """
+        The captured frames stacked sample by sample.
+
+        Returns
+        -------
+        names, timestamps, data
+            names of the boards that captured, their fill timestamps and a
+            (boards, 2, n) float32 array truncated to the shortest frame
+        """
+        frames = [frame for frame in self.frames if frame.error is None]
+        if not frames:
+            return [], np.empty(0), np.empty((0, 2, 0), dtype=np.float32)
+        n = min(frame.y.shape[1] for frame in frames)
+        data = np.empty((len(frames), 2, n), dtype=np.float32)
+        for i, frame in enumerate(frames):
+            data[i] = frame.y[:, :n]
+        return [frame.name for frame in frames], np.array([frame.timestamp for frame in frames]), data
+
+
+def _split_address(address, port):
+    """
+    (host, port) of 'host', 'host:port', an IPv6 address or '[IPv6]:port',
+    `port` when the address has none.
+    """
+    if address.startswith('['):
+        host, sep, rest = address[1:].partition(']')
+        if not sep or (rest and not rest.startswith(':')):
+            raise ValueError(f"Invalid address: {address}")
+        return host, int(rest[1:]) if rest else port
+    if address.count(':') == 1:
+        host, _, board_port = address.partition(':')
+        return host, int(board_port)
+    # A bare IPv6 address has several colons and no port
+    return address, port
+
+
+class Fleet:
+    """
+    Several Red Pitaya boards driven in parallel, one worker thread per
+    board, so an operation on the rack takes as long as the slowest board
+    instead of the sum of all of them.
+
+    Each board is a RedPitaya, fleet[name] can be given to
+    SerialPlot(rp=...) to plot one board of the rack.
+
+        with Fleet({'left': 'rp-f0c5e4.local', 'right': '192.168.1.101:5000'}) as fleet:
+            fleet.generate_signal(channel=1, frequency=10000)
+            capture = fleet.read_data(decimation=8, data_format='bin', trigger_source='EXT_PE')
+            names, timestamps, data = capture.aligned()
+
+    Parameters
+    ----------
+    hosts : list or dict
+        'host' or 'host:port' per board, or {name: 'host[:port]'}; boards
+        of a list are named after their address. IPv6 addresses take a
+        port in brackets, '[fe80::1]:5000'
+    port : int
+        SCPI port of the addresses without one
+    max_workers : int
+        worker threads, defaults to one per board
+    """
+    def __init__(self, hosts, port=5000, max_workers=None):
+        if not isinstance(hosts, dict):
+            hosts = {host: host for host in hosts}
+        if not hosts:
+            raise ValueError("A fleet needs at least one board")
+        self.names = list(hosts)
+        self.addresses = {}
+        for name, address in hosts.items():
+            self.addresses[name] = _split_address(str(address), port)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(self.names), thread_name_prefix='rp-fleet')
+        self.boards = {}
+        self.identity = {}
+        try:
+            opened = self._submit(self._open, self.names, return_exceptions=True)
+            self.boards = {name: board for name, board in opened.items() if not isinstance(board, Exception)}
+            for board in opened.values():
+                if isinstance(board, Exception):
+                    raise board
+            # The connection errors of scpi only surface with the first query
+            self.identity = self.run(lambda board: board.rp.txrx_txt('*IDN?').strip())
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, name):
+        return self.boards[name]
+
+    def __len__(self):
+        return len(self.names)
+
+    def _open(self, name):
+        host, port = self.addresses[name]
+        return RedPitaya(host, port=port)
+
+    def _submit(self, func, names, *args, return_exceptions=False, **kwargs):
+        futures = {name: self.executor.submit(func, name, *args, **kwargs) for name in names}
+        results = {}
+        first_error = None
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = e
+                first_error = first_error or e
+        if first_error is not None and not return_exceptions:
+            raise first_error
+        return results
+
+    def run(self, func, *args, names=None, return_exceptions=False, **kwargs):
+        """
+        Call func(board, *args, **kwargs) on every board concurrently.
+
+        Returns {name: result}. Every call runs to completion; then the first
+        exception raised is re-raised, or with return_exceptions it is
+        returned as the result of its board.
+        """
+        return self._submit(lambda name: func(self.boards[name], *args, **kwargs), names or self.names,
+                            return_exceptions=return_exceptions)
+
+    def generate_signal(self, **kwargs):
+        """
+        RedPitaya.generate_signal on every board.
+        """
+        return self.run(RedPitaya.generate_signal, **kwargs)
+
+    def stop_signal(self, channel=1):
+        return self.run(RedPitaya.stop_signal, channel)
+
+    def set_calibration(self, calibration):
+        """
+        Calibration per board, {name: dict(channel=..., gain=..., offset=..., input_gain=...)}.
+        """
+        for name, kwargs in calibration.items():
+            self.boards[name].set_calibration(**kwargs)
+
+    def read_data(self, decimation=8, trigger_level=0.1, data_units='Volts', data_format='ascii', trigger_source='CH1_PE', to_volts=False, timeout=None):
+        """
+        Capture both channels of every board.
+
+        All boards are armed first, then each one waits for its trigger and
+        is read in its own thread, so with a trigger shared by the rack
+        (e.g. EXT_PE) every board captures the same event. A board that
+        fails or times out does not stop the others: its frame carries the
+        error instead of data.
+
+        Parameters
+        ----------
+        See RedPitaya.read_data.
+
+        Returns
+        -------
+        FleetCapture
+        """
+        settings = dict(decimation=decimation, trigger_level=trigger_level, data_units=data_units,
+                        data_format=data_format, trigger_source=trigger_source)
+        started = time.time()
+        start = time.perf_counter()
+        armed = self.run(RedPitaya.arm, return_exceptions=True, **settings)
+        ready = [name for name in self.names if not isinstance(armed[name], Exception)]
+        results = self._submit(self._capture, ready, to_volts, timeout, return_exceptions=True)
+        elapsed = time.perf_counter() - start
+
+        frames = []
+        for name in self.names:
+            result = results.get(name, armed[name])
+            if isinstance(result, Exception):
+                frames.append(BoardFrame(name, error=result))
+            else:
+                frames.append(BoardFrame(name, *result))
+        return FleetCapture(frames, started, elapsed)
+
+    def _capture(self, name, to_volts, timeout):
+        board = self.boards[name]
+        with board.lock:
+            try:
+                board.wait_filled(timeout)
+                timestamp = time.time()
+                y1, y2 = board.read_channels(to_volts=to_volts)
+            except Exception:
+                try:
+                    board.stop_acquisition()
+                except Exception:
+                    pass
+                raise
+            board.stop_acquisition()
+        return np.vstack((y1, y2)).astype(np.float32, copy=False), timestamp
+
+    def close(self):
+        for board in self.boards.values():
+            try:
+                board.close()
+            except Exception:
+                pass
+        self.boards = {}
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,263 @@
+import struct
+import zlib
+
+import numpy as np
+
+from rp_plot.parsing import CSVParser
+
+# Frame layout, little endian:
+#   sync      2 bytes  0xA5 0x5A
+#   channels  u8       1..MAX_CHANNELS
+#   type      u8       key of SAMPLE_TYPES
+#   flags     u8       FLAG_BUNCH: the frame is a complete capture (oscilloscope mode)
+#   reserved  u8
+#   samples   u16      samples per channel
+#   sequence  u16      incremented by one per frame, wraps around
+#   payload   samples x channels values, interleaved (sample 0 of every channel first)
+#   crc       u32      zlib.crc32 of everything from `channels` to the end of the payload
+SYNC = b'\xa5\x5a'
+HEADER = struct.Struct('<2sBBBBHH')
+CRC = struct.Struct('<I')
+SAMPLE_TYPES = {
+    0: np.dtype('<i2'),
+    1: np.dtype('<u2'),
+    2: np.dtype('<i4'),
+    3: np.dtype('<f4'),
+}
+FLAG_BUNCH = 0x01
+MAX_CHANNELS = 16
+
+# Printable ASCII and line breaks
+TEXT = np.zeros(256, dtype=bool)
+TEXT[0x20:0x7f] = True
+TEXT[[ord('\r'), ord('\n'), ord('\t')]] = True
+
+
+def encode_frame(samples, sequence=0, bunch=False, sample_type=0):
+    """
+    Build a frame from a (samples, channels) array, values are cast to `sample_type`.
+    """
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    n, channels = samples.shape
+    body = HEADER.pack(SYNC, channels, sample_type, FLAG_BUNCH if bunch else 0, 0, n, sequence & 0xFFFF)[2:]
+    body += samples.astype(SAMPLE_TYPES[sample_type]).tobytes()
+    return SYNC + body + CRC.pack(zlib.crc32(body))
+
+
+def _header(buf, i, max_samples):
+    """
+    Fields of the header at buf[i], None if they are out of range.
+    Returns (channels, sample_type, flags, samples, sequence, end of the payload).
+    """
+    _, channels, sample_type, flags, _, n, sequence = HEADER.unpack_from(buf, i)
+    if not (0 < channels <= MAX_CHANNELS and sample_type in SAMPLE_TYPES and 0 < n <= max_samples):
+        return None
+    end = i + HEADER.size + n * channels * SAMPLE_TYPES[sample_type].itemsize
+    return channels, sample_type, flags, n, sequence, end
+
+
+def frame_at(buf, i, max_samples=8192):
+    """
+    Length of the frame with a valid CRC starting at buf[i], 0 if more bytes
+    are needed to tell, -1 if there is no frame there.
+    """
+    head = bytes(buf[i:i + len(SYNC)])
+    if head != SYNC[:len(head)]:
+        return -1
+    if len(buf) - i < HEADER.size:
+        return 0
+    header = _header(buf, i, max_samples)
+    if header is None:
+        return -1
+    end = header[-1]
+    if len(buf) < end + CRC.size:
+        return 0
+    if zlib.crc32(memoryview(buf)[i + 2:end]) != CRC.unpack_from(buf, end)[0]:
+        return -1
+    return end + CRC.size - i
+
+
+class FrameDecoder:
+    """
+    Decoder of the binary frame format above.
+
+    Bytes are fed in any chunking. Complete frames with a valid CRC are
+    mapped straight into NumPy arrays. After corrupted or missing bytes the
+    decoder resynchronizes on the next sync word, counting the bytes it had
+    to skip and the frames lost according to the sequence numbers.
+
+    Parameters
+    ----------
+    n_channels : int
+        channels returned, missing ones are NaN and extra ones dropped
+    max_samples : int
+        larger frames are taken as a corrupted header
+    """
+    def __init__(self, n_channels=2, max_samples=8192):
+        self.n_channels = n_channels
+        self.max_samples = max_samples
+        self.frames = 0
+        self.crc_errors = 0
+        self.skipped = 0
+        self.lost = 0
+        self._buf = bytearray()
+        self._sequence = None
+        # Bytes skipped since the last valid frame, used for detecting ASCII data
+        self.garbage = bytearray()
+
+    def reset(self):
+        self._buf.clear()
+        self._sequence = None
+        self.garbage.clear()
+
+    def feed(self, chunk):
+        """
+        Decode received bytes.
+
+        Returns
+        -------
+        rows, bunches
+            (k, n_channels) float array of the samples of stream frames, and
+            the list of bunch frames, each a (samples, n_channels) array
+        """
+        buf = self._buf
+        buf += chunk
+        rows, bunches = [], []
+        pos = 0
+        while True:
+            i = buf.find(SYNC, pos)
+            if i < 0:
+                # Keep a last byte that may start a sync word
+                keep = len(buf) - 1 if buf[-1:] == SYNC[:1] else len(buf)
+                self._skip(buf, pos, max(keep, pos))
+                pos = max(keep, pos)
+                break
+            self._skip(buf, pos, i)
+            pos = i
+            if len(buf) - i < HEADER.size:
+                break
+
+            header = _header(buf, i, self.max_samples)
+            if header is None:
+                self._skip(buf, i, i + 1)
+                pos = i + 1
+                continue
+
+            channels, sample_type, flags, n, sequence, end = header
+            dtype = SAMPLE_TYPES[sample_type]
+            if len(buf) < end + CRC.size:
+                break
+
+            if zlib.crc32(memoryview(buf)[i + 2:end]) != CRC.unpack_from(buf, end)[0]:
+                self.crc_errors += 1
+                self._skip(buf, i, i + 1)
+                pos = i + 1
+                continue
+            raw = np.frombuffer(buf, dtype=dtype, count=n * channels, offset=i + HEADER.size)
+            values = self._channels(raw.reshape(n, channels))
+            del raw
+
+            self._check_sequence(sequence)
+            self.frames += 1
+            self.garbage.clear()
+            (bunches if flags & FLAG_BUNCH else rows).append(values)
+            pos = end + CRC.size
+
+        del buf[:pos]
+        rows = np.concatenate(rows) if rows else np.empty((0, self.n_channels))
+        return rows, bunches
+
+    def _channels(self, values):
+        out = np.full((len(values), self.n_channels), np.nan)
+        n = min(values.shape[1], self.n_channels)
+        out[:, :n] = values[:, :n]
+        return out
+
+    def _check_sequence(self, sequence):
+        if self._sequence is not None:
+            self.lost += (sequence - self._sequence - 1) & 0xFFFF
+        self._sequence = sequence
+
+    def _skip(self, buf, start, end):
+        if end <= start:
+            return
+        self.skipped += end - start
+        self.garbage += buf[start:end]
+        if len(self.garbage) > 4096:
+            del self.garbage[:-4096]
+
+
+class StreamDecoder:
+    """
+    Serial data decoder that detects whether the device sends CSV text
+    (CSVParser) or binary frames (FrameDecoder), with the same `feed`
+    interface. Text mode switches to binary at the first complete frame with
+    a valid CRC; from a sync word on, bytes are held back until the frame is
+    complete, and are parsed as text if it turns out not to be one, so noise
+    or a stray 0xA5 in the text does not end text mode. Binary mode switches
+    back to text after `ascii_after` skipped bytes that are all text and hold
+    a line break.
+    """
+    def __init__(self, n_channels=2, ascii_after=64):
+        self.n_channels = n_channels
+        self.ascii_after = ascii_after
+        self.csv = CSVParser(n_channels)
+        self.binary = FrameDecoder(n_channels)
+        self.mode = 'ascii'
+        # Text mode: bytes from a possible frame start on, until it is complete
+        self._held = b''
+
+    @property
+    def lines(self):
+        return self.csv.lines
+
+    @property
+    def malformed(self):
+        return self.csv.malformed
+
+    def reset(self):
+        self.csv.reset()
+        self.binary.reset()
+        self._held = b''
+
+    def feed(self, chunk):
+        chunk = bytes(chunk)
+        if self.mode == 'ascii':
+            return self._feed_text(chunk)
+
+        rows, bunches = self.binary.feed(chunk)
+        garbage = self.binary.garbage
+        if len(garbage) < self.ascii_after:
+            return rows, bunches
+
+        # Trailing run of text in the skipped bytes
+        binary = np.flatnonzero(~TEXT[np.frombuffer(bytes(garbage), dtype=np.uint8)])
+        text = bytes(garbage[binary[-1] + 1:] if len(binary) else garbage)
+        if len(text) >= self.ascii_after and b'\n' in text:
+            # Text from the first complete line on
+            text = text[text.index(b'\n') + 1:] + bytes(self.binary._buf)
+            self.binary.reset()
+            self.mode = 'ascii'
+            more_rows, more_bunches = self.csv.feed(text)
+            return np.concatenate((rows, more_rows)), bunches + more_bunches
+        return rows, bunches
+
+    def _feed_text(self, chunk):
+        data = self._held + chunk
+        self._held = b''
+        i = data.find(SYNC[:1])
+        while i >= 0:
+            length = frame_at(data, i, self.binary.max_samples)
+            if length == 0:
+                self._held = data[i:]
+                return self.csv.feed(data[:i])
+            if length > 0:
+                rows, bunches = self.csv.feed(data[:i])
+                self.csv.reset()
+                self.mode = 'binary'
+                more_rows, more_bunches = self.binary.feed(data[i:])
+                return np.concatenate((rows, more_rows)), bunches + more_bunches
+            i = data.find(SYNC[:1], i + 1)
+        return self.csv.feed(data)
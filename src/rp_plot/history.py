@@ -0,0 +1,125 @@
+import numpy as np
+
+
+class HistoryStore:
+    """
+    Rolling history of the last `capacity` real time samples, float64
+    timestamps and float32 values per channel.
+
+    Storage is mirrored: every sample is written at slot i and at slot
+    i + capacity of arrays twice the capacity, so the last n samples are
+    always contiguous and `last` returns views instead of copies. Appending
+    costs two stores per value, whatever the capacity. The price is memory:
+    2 * capacity * (8 + 4 * n_channels) bytes, twice that of a plain ring
+    buffer, e.g. 32 MB for a million samples of two channels.
+
+    Parameters
+    ----------
+    capacity : int
+        number of samples kept
+    n_channels : int
+    """
+    def __init__(self, capacity, n_channels):
+        self.n_channels = n_channels
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.t = np.full(2 * capacity, np.nan)
+        self.y = np.full((self.n_channels, 2 * capacity), np.nan, dtype=np.float32)
+        self.n = 0
+        # Slot of the next sample, in [0, capacity)
+        self._head = 0
+
+    def __len__(self):
+        return self.n
+
+    def clear(self):
+        self.n = 0
+        self._head = 0
+
+    def append(self, t, values):
+        """
+        Store one sample, `values` holds one value per channel.
+        """
+        i = self._head
+        self.t[i] = self.t[i + self.capacity] = t
+        self.y[:, i] = self.y[:, i + self.capacity] = values
+        self._head = (i + 1) % self.capacity
+        self.n = min(self.n + 1, self.capacity)
+
+    def extend(self, t, y):
+        """
+        Store a block of samples, t : (n,) and y : (n_channels, n).
+        """
+        n = len(t)
+        if n == 0:
+            return
+        cap = self.capacity
+        if n > cap:
+            t, y = t[-cap:], y[:, -cap:]
+            self._head = (self._head + n - cap) % cap
+            n = cap
+
+        start = self._head
+        first = min(n, cap - start)
+        for offset in (0, cap):
+            self.t[offset + start:offset + start + first] = t[:first]
+            self.y[:, offset + start:offset + start + first] = y[:, :first]
+            if first < n:
+                self.t[offset:offset + n - first] = t[first:]
+                self.y[:, offset:offset + n - first] = y[:, first:]
+        self._head = (start + n) % cap
+        self.n = min(self.n + n, cap)
+
+    def last(self, n=None):
+        """
+        Views of the last `n` samples (all stored samples by default), oldest
+        first, valid until the next append.
+
+        Returns
+        -------
+        t, y
+            (n,) float64 timestamps and (n_channels, n) float32 values
+        """
+        n = self.n if n is None else min(n, self.n)
+        end = self._head + self.capacity
+        return self.t[end - n:end], self.y[:, end - n:end]
+
+    def resize(self, capacity):
+        """
+        Change the number of samples kept, keeping the most recent ones.
+        """
+        if capacity == self.capacity:
+            return
+        t, y = self.last(capacity)
+        t, y = t.copy(), y.copy()
+        self._allocate(capacity)
+        self.extend(t, y)
+
+    def measure(self, n=None):
+        """
+        Measurements of every channel over the last `n` samples (all stored
+        samples by default), NaN values are ignored.
+
+        Returns
+        -------
+        dict
+            'min', 'max', 'vpp', 'mean' and 'rms', arrays with one value per
+            channel (NaN for channels without values), and 'samples' and
+            'duration', the number of samples and the time they span
+        """
+        t, y = self.last(n)
+        valid = ~np.isnan(y)
+        count = valid.sum(axis=1)
+        some = count > 0
+        values = np.where(valid, y, 0).astype(np.float64)
+
+        result = dict(samples=len(t), duration=float(t[-1] - t[0]) if len(t) > 1 else 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result['min'] = np.where(some, np.where(valid, y, np.inf).min(axis=1, initial=np.inf), np.nan)
+            result['max'] = np.where(some, np.where(valid, y, -np.inf).max(axis=1, initial=-np.inf), np.nan)
+            result['vpp'] = result['max'] - result['min']
+            result['mean'] = values.sum(axis=1) / count
+            result['rms'] = np.sqrt((values ** 2).sum(axis=1) / count)
+        return result
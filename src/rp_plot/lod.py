@@ -0,0 +1,226 @@
+import numpy as np
+
+from rp_plot.decimation import minmax
+
+
+class LODPyramid:
+    """
+    Multi-resolution store of timestamped multi-channel samples, for serving
+    any time window with a bounded number of points.
+
+    Level 0 holds the raw samples. Every bucket of `factor` consecutive
+    entries of a level is reduced to its minimum and maximum (with the times
+    they occurred at) in the next level, so level k summarizes factor**k
+    samples per entry. Levels are extended incrementally as samples are
+    appended, only the buckets completed by the new samples are computed.
+
+    When `capacity` raw samples are exceeded the oldest samples are dropped,
+    down to about half the capacity, together with the level 1 entries
+    summarizing them; the coarser levels are re-derived from level 1.
+
+    Parameters
+    ----------
+    n_channels : int
+    capacity : int
+        maximum number of raw samples kept
+    factor : int
+        reduction between consecutive levels
+    """
+    def __init__(self, n_channels, capacity=1_000_000, factor=8):
+        self.n_channels = n_channels
+        self.capacity = capacity
+        self.factor = factor
+        self.dropped = 0
+        self.clear()
+
+    def clear(self):
+        self.t = np.empty(0)
+        self.y = np.empty((self.n_channels, 0))
+        self.n = 0
+        # Levels 1.. as [vmin, vmax, tmin, tmax, n], arrays of shape (n_channels, m)
+        self.levels = []
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def span(self):
+        """
+        (first, last) time stored, None if empty.
+        """
+        if self.n == 0:
+            return None
+        return self.t[0], self.t[self.n - 1]
+
+    def extend(self, t, y):
+        """
+        Append a block of samples, t : (n,) increasing and y : (n_channels, n).
+        """
+        n = len(t)
+        if n == 0:
+            return
+        if n > self.capacity:
+            t, y = t[-self.capacity:], y[:, -self.capacity:]
+            self.dropped += n - self.capacity
+            n = self.capacity
+        if self.n + n > self.capacity:
+            self._drop(self.n + n - self.capacity // 2)
+
+        if self.n + n > len(self.t):
+            size = min(self.capacity, max(2 * len(self.t), self.n + n, 1024))
+            self.t = _grow(self.t[:self.n], size)
+            self.y = _grow(self.y[:, :self.n], size)
+        self.t[self.n:self.n + n] = t
+        self.y[:, self.n:self.n + n] = y
+        self.n += n
+        self._build()
+
+    def _build(self):
+        f = self.factor
+        below = self.n
+        k = 0
+        while below >= f:
+            if k == len(self.levels):
+                empty = np.empty((self.n_channels, 0))
+                self.levels.append([empty, empty, empty, empty, 0])
+            level = self.levels[k]
+            done, total = level[4], below // f
+            if total > done:
+                if k == 0:
+                    y = self.y[:, done * f:total * f]
+                    t = np.broadcast_to(self.t[done * f:total * f], y.shape)
+                    new = _reduce(y, y, t, t, f)
+                else:
+                    vmin, vmax, tmin, tmax, _ = self.levels[k - 1]
+                    s = slice(done * f, total * f)
+                    new = _reduce(vmin[:, s], vmax[:, s], tmin[:, s], tmax[:, s], f)
+                for j in range(4):
+                    if total > level[j].shape[1]:
+                        level[j] = _grow(level[j][:, :done], max(2 * level[j].shape[1], total, 64))
+                    level[j][:, done:total] = new[j]
+                level[4] = total
+            below = total
+            k += 1
+
+    def _drop(self, count):
+        # Drop whole buckets of level 1 and re-derive the coarser levels from
+        # the entries kept, rounding to their buckets would drop up to
+        # factor**levels samples
+        f = self.factor
+        count = -(-count // f) * f
+        if count >= self.n:
+            self.dropped += self.n
+            self.clear()
+            return
+        self.dropped += count
+        self.t[:self.n - count] = self.t[count:self.n]
+        self.y[:, :self.n - count] = self.y[:, count:self.n]
+        self.n -= count
+        del self.levels[1:]
+        if self.levels:
+            level = self.levels[0]
+            d = count // f
+            m = level[4] - d
+            for j in range(4):
+                level[j][:, :m] = level[j][:, d:level[4]]
+            level[4] = m
+        self._build()
+
+    def index(self, x0, x1):
+        """
+        Range [lo, hi) of raw sample indices covering the times [x0, x1],
+        with one more sample on each side so lines reach the window edges.
+        """
+        t = self.t[:self.n]
+        lo = max(int(np.searchsorted(t, x0, side='left')) - 1, 0)
+        hi = min(int(np.searchsorted(t, x1, side='right')) + 1, self.n)
+        return lo, hi
+
+    def query(self, x0, x1, n_out):
+        """
+        Points of every channel between the times x0 and x1, at most about
+        n_out per channel, from the finest level that can serve them.
+
+        Returns
+        -------
+        list of (x, y) per channel
+            raw samples, or min/max pairs in time order for coarser levels
+        """
+        lo, hi = self.index(x0, x1)
+        return self.query_index(lo, hi, n_out)
+
+    def query_index(self, lo, hi, n_out):
+        """
+        As `query`, for the raw sample indices [lo, hi).
+        """
+        if hi <= lo:
+            return [(np.empty(0), np.empty(0)) for _ in range(self.n_channels)]
+        # Finest level with at most factor * n_out points, reduced to n_out
+        # points by a min/max pass over its entries
+        k = 0
+        while k < len(self.levels) and 2 * (hi - lo) > n_out * self.factor ** (k + 1):
+            k += 1
+        parts = self._points(k, lo, hi)
+        points = []
+        for i in range(self.n_channels):
+            x = np.concatenate([p[0][i] for p in parts])
+            y = np.concatenate([p[1][i] for p in parts])
+            points.append(minmax(x, y, n_out))
+        return points
+
+    def _points(self, k, lo, hi):
+        # Complete entries of level k overlapping [lo, hi), then the samples
+        # after the last complete entry from the levels below
+        if k == 0:
+            t = np.broadcast_to(self.t[lo:hi], (self.n_channels, hi - lo))
+            return [(t, self.y[:, lo:hi])]
+        vmin, vmax, tmin, tmax, m = self.levels[k - 1]
+        size = self.factor ** k
+        b0, b1 = lo // size, min(-(-hi // size), m)
+        parts = []
+        if b1 > b0:
+            s = slice(b0, b1)
+            parts.append(_pairs(vmin[:, s], vmax[:, s], tmin[:, s], tmax[:, s]))
+        tail = max(lo, b1 * size)
+        if tail < hi:
+            parts += self._points(k - 1, tail, hi)
+        return parts
+
+
+def _grow(a, size):
+    out = np.empty(a.shape[:-1] + (size,), dtype=float)
+    out[..., :a.shape[-1]] = a
+    return out
+
+
+def _reduce(vmin, vmax, tmin, tmax, f):
+    """
+    Min/max of every f consecutive entries, NaN only for buckets without values.
+    """
+    c, n = vmin.shape
+    shape = (c, n // f, f)
+    lo = np.where(np.isnan(vmin), np.inf, vmin).reshape(shape)
+    hi = np.where(np.isnan(vmax), -np.inf, vmax).reshape(shape)
+    imin = np.argmin(lo, axis=2)[..., None]
+    imax = np.argmax(hi, axis=2)[..., None]
+    new_min = np.take_along_axis(lo, imin, axis=2)[..., 0]
+    new_max = np.take_along_axis(hi, imax, axis=2)[..., 0]
+    new_min[np.isinf(new_min)] = np.nan
+    new_max[np.isinf(new_max)] = np.nan
+    new_tmin = np.take_along_axis(tmin.reshape(shape), imin, axis=2)[..., 0]
+    new_tmax = np.take_along_axis(tmax.reshape(shape), imax, axis=2)[..., 0]
+    return new_min, new_max, new_tmin, new_tmax
+
+
+def _pairs(vmin, vmax, tmin, tmax):
+    """
+    Interleave the minimum and maximum of every entry, earliest first.
+    """
+    first = tmin <= tmax
+    x = np.empty(vmin.shape[:-1] + (2 * vmin.shape[-1],))
+    y = np.empty_like(x)
+    x[..., 0::2] = np.where(first, tmin, tmax)
+    x[..., 1::2] = np.where(first, tmax, tmin)
+    y[..., 0::2] = np.where(first, vmin, vmax)
+    y[..., 1::2] = np.where(first, vmax, vmin)
+    return x, y
@@ -0,0 +1,168 @@
+from tornado.web import RequestHandler
+
+from rp_comm.instrumentation import probe as default_probe
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Quantiles of the span summaries, from the probe's percentiles
+QUANTILES = {0.5: 'p50_us', 0.9: 'p90_us', 0.99: 'p99_us'}
+
+
+class Metrics:
+    """
+    Accumulates samples in the Prometheus text exposition format.
+    """
+    def __init__(self):
+        self.lines = []
+        self._described = set()
+
+    def add(self, name, value, kind='gauge', help='', **labels):
+        self.describe(name, kind, help)
+        self.sample(name, value, **labels)
+
+    def describe(self, name, kind, help):
+        if name not in self._described:
+            self._described.add(name)
+            self.lines.append(f'# HELP {name} {help}')
+            self.lines.append(f'# TYPE {name} {kind}')
+
+    def sample(self, name, value, **labels):
+        if labels:
+            text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            name = f'{name}{{{text}}}'
+        self.lines.append(f'{name} {float(value):.9g}')
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def collect(plot=None, rp=None, probe=None, application=None):
+    """
+    Metrics of a SerialPlot, its RedPitaya, the instrumentation probe and the
+    Bokeh server, as Prometheus exposition text. Throughputs are exported as
+    counters (frames/s and samples/s are their rate()), backlogs as gauges.
+
+    Parameters
+    ----------
+    plot : rp_plot.plot_data.SerialPlot
+    rp : rp_plot.redpitaya.RedPitaya
+        defaults to plot.rp
+    probe : rp_comm.instrumentation.Probe
+        span latencies are exported as summaries, SCPI round trips among them;
+        defaults to the shared probe
+    application : bokeh.server.tornado.BokehTornado
+        for the session count and the websocket send backlog
+    """
+    m = Metrics()
+    probe = default_probe if probe is None else probe
+    if rp is None and plot is not None and hasattr(plot.rp, 'read_data'):
+        rp = plot.rp
+
+    if plot is not None:
+        m.add('rp_serial_samples_total', plot.counter, 'counter', 'Real time samples received from the serial port.')
+        m.add('rp_captures_total', plot.captures, 'counter', 'Captures plotted in oscilloscope or acquisition mode.')
+        m.add('rp_stream_pending_samples', plot.pending_samples, help='Real time samples waiting to be streamed to the plot.')
+        m.add('rp_history_samples', len(plot.store), help='Real time samples kept for display and measurements.')
+
+        reader = plot.reader
+        if reader is not None:
+            stats = reader.stats()
+            m.add('rp_serial_reader_samples_total', stats['samples'], 'counter', 'Samples stored by the serial reader thread.')
+            m.add('rp_serial_overrun_samples_total', stats['lost'], 'counter', 'Samples overwritten before the plot read them.')
+            m.add('rp_serial_parse_errors_total', stats['parse_errors'], 'counter', 'Lines not recognized.')
+            m.add('rp_serial_crc_errors_total', stats['crc_errors'], 'counter', 'Binary frames with a wrong CRC.')
+            m.add('rp_serial_frames_lost_total', stats['frames_lost'], 'counter', 'Binary frames missing from the sequence.')
+            m.add('rp_serial_errors_total', stats['serial_errors'], 'counter', 'Errors reading the serial port.')
+            m.add('rp_serial_bunches_total', stats['bunches'], 'counter', 'Oscilloscope bunches received.')
+            m.add('rp_serial_bunches_dropped_total', stats['bunches_dropped'], 'counter', 'Bunches replaced before being plotted.')
+            m.add('rp_serial_reader_backlog_samples', plot.reader_backlog,
+                  help='Samples stored by the reader and not yet taken by the plot.')
+
+        engine = plot.engine
+        if engine is not None:
+            stats = engine.stats()
+            m.add('rp_frames_total', stats['frames'], 'counter', 'Frames read by the acquisition engine.')
+            m.add('rp_frames_dropped_total', stats['dropped'], 'counter', 'Frames replaced before being plotted.')
+            m.add('rp_trigger_timeouts_total', stats['timeouts'], 'counter', 'Acquisitions not triggered in time.')
+            m.add('rp_acquisition_running', int(engine.running), help='1 while the acquisition engine runs.')
+
+        recorder = plot.recorder
+        if recorder is not None:
+            stats = recorder.stats()
+            m.add('rp_recorder_samples_total', stats['samples'], 'counter', 'Samples written by the recorder.')
+            m.add('rp_recorder_dropped_total', stats['dropped'], 'counter', 'Blocks dropped by the recorder, its queue was full.')
+            m.add('rp_recorder_queue_depth', stats['queued'], help='Blocks waiting to be written.')
+
+    if rp is not None:
+        m.add('rp_scpi_errors', len(rp.rp.errors), help='Entries in the error log of the SCPI client.')
+        m.add('rp_scpi_rx_buffered_bytes', rp.rp.rx_buffered, help='Bytes received and not yet consumed.')
+
+    snapshot = probe.snapshot()
+    m.add('rp_instrumentation_enabled', int(snapshot['enabled']), help='1 while the timing spans are recorded.')
+    for name, value in snapshot['counters'].items():
+        m.add('rp_probe_total', value, 'counter', 'Counters of the instrumentation probe.', counter=name)
+    metric = 'rp_span_duration_seconds'
+    for name, span in snapshot['spans'].items():
+        if not span['count']:
+            continue
+        m.describe(metric, 'summary', 'Duration of the timed spans, scpi.rx_txt and scpi.rx_arb are the SCPI round trips.')
+        for q, key in QUANTILES.items():
+            m.sample(metric, span[key] / 1e6, span=name, quantile=q)
+        m.sample(f'{metric}_sum', span['total_ms'] / 1e3, span=name)
+        m.sample(f'{metric}_count', span['count'], span=name)
+
+    if application is not None:
+        server_metrics(m, application)
+    return m.text()
+
+
+def server_metrics(m, application):
+    """
+    Sessions and websocket send backlog per Bokeh app. The backlog is read
+    from Bokeh and Tornado internals: if they change, the metric is left
+    out and the other metrics are still served. Nothing is added for a
+    plain Tornado application.
+    """
+    for path in sorted(getattr(application, 'app_paths', ())):
+        try:
+            sessions = application.get_sessions(path)
+        except Exception:
+            continue
+        m.add('rp_bokeh_sessions', len(sessions), help='Open Bokeh sessions.', app=path)
+        try:
+            backlog = sum(_write_backlog(c) for s in sessions for c in getattr(s, '_subscribed_connections', ()))
+        except Exception:
+            continue
+        m.add('rp_websocket_send_backlog_bytes', backlog, help='Bytes queued in the websocket write buffers.', app=path)
+
+
+def _write_backlog(connection):
+    # Tornado keeps unsent websocket data in the IOStream of the connection
+    handler = getattr(connection, '_socket', None)
+    stream = getattr(getattr(handler, 'ws_connection', None), 'stream', None)
+    return getattr(stream, '_write_buffer_size', 0) or 0
+
+
+class MetricsHandler(RequestHandler):
+    """
+    Tornado handler serving collect() for the given plot, added to the Bokeh
+    server with metrics_route().
+    """
+    def initialize(self, plot=None, rp=None, probe=None):
+        self.plot = plot
+        self.rp = rp
+        self.probe = probe
+
+    def get(self):
+        self.set_header('Content-Type', CONTENT_TYPE)
+        self.write(collect(self.plot, self.rp, self.probe, self.application))
+
+
+def metrics_route(plot=None, rp=None, probe=None, path='/metrics'):
+    """
+    Route for Server(..., extra_patterns=[metrics_route(plot)]).
+    """
+    return (path, MetricsHandler, dict(plot=plot, rp=rp, probe=probe))
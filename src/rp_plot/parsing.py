@@ -0,0 +1,182 @@
+import warnings
+
+import numpy as np
+
+NEWLINE = ord('\n')
+COMMA = ord(',')
+
+# Bytes that can appear in a line of numbers, a line with any other byte is parsed on its own
+NUMERIC = np.zeros(256, dtype=bool)
+NUMERIC[np.frombuffer(b'0123456789.,+-eEnaNAifIF \r\t\n', dtype=np.uint8)] = True
+
+
+class CSVParser:
+    """
+    Bulk parser of comma separated serial telemetry.
+
+    Bytes are fed as they are read, in any chunking. Complete lines are
+    converted to a (lines, n_channels) float array in one vectorized step;
+    a partial trailing line is kept for the next chunk. Lines between
+    'start' and 'stop' markers are collected into bunches (oscilloscope mode).
+
+    Lines that do not give a number for every channel are counted in
+    `malformed`, their missing or unparsable values are NaN. Extra fields
+    are ignored and blank lines are skipped.
+
+    Parameters
+    ----------
+    n_channels : int
+    """
+    def __init__(self, n_channels=2):
+        self.n_channels = n_channels
+        self.lines = 0
+        self.malformed = 0
+        self._tail = b''
+        self._bunch = None
+
+    def reset(self):
+        """
+        Drop the partial line and bunch, e.g. after the port was reopened.
+        """
+        self._tail = b''
+        self._bunch = None
+
+    def feed(self, chunk):
+        """
+        Parse received bytes.
+
+        Returns
+        -------
+        rows, bunches
+            (k, n_channels) array of the samples outside of bunches, and the
+            list of bunches completed by this chunk, each a (rows, n_channels) array
+        """
+        data = self._tail + bytes(chunk)
+        end = data.rfind(b'\n')
+        if end < 0:
+            self._tail = data
+            return self._empty(), []
+        self._tail = data[end + 1:]
+        return self.parse_block(data[:end + 1])
+
+    def parse_block(self, block):
+        """
+        Parse a block of complete lines (ending with a newline), see `feed`.
+        """
+        buf = np.frombuffer(block, dtype=np.uint8)
+        ends = np.flatnonzero(buf == NEWLINE)
+        starts = np.empty_like(ends)
+        starts[0:1] = 0
+        starts[1:] = ends[:-1] + 1
+        self.lines += len(ends)
+
+        # Marker lines are rare, find them from the first byte of each line
+        first = buf[np.minimum(starts, len(buf) - 1)]
+        candidates = np.flatnonzero((first == ord('s')) & (ends > starts))
+
+        rows, bunches = [], []
+        segment = 0
+        for i in candidates:
+            line = block[starts[i]:ends[i]].strip()
+            if not line.startswith((b'start', b'stop')):
+                continue
+            self._route(self._parse_lines(block, buf, starts[segment:i], ends[segment:i]), rows)
+            segment = i + 1
+            if line.startswith(b'start'):
+                self._bunch = []
+            elif self._bunch is not None:
+                bunches.append(np.concatenate(self._bunch) if self._bunch else self._empty())
+                self._bunch = None
+        self._route(self._parse_lines(block, buf, starts[segment:], ends[segment:]), rows)
+
+        rows = np.concatenate(rows) if len(rows) > 1 else (rows[0] if rows else self._empty())
+        return rows, [b for b in bunches if len(b)]
+
+    def _route(self, values, rows):
+        if not len(values):
+            return
+        if self._bunch is not None:
+            self._bunch.append(values)
+        else:
+            rows.append(values)
+
+    def _empty(self):
+        return np.empty((0, self.n_channels))
+
+    def _parse_lines(self, block, buf, starts, ends):
+        """
+        Parse the lines block[starts[i]:ends[i]], none of them a marker.
+        """
+        if not len(starts):
+            return self._empty()
+
+        # Blank lines ('' or a lone '\r') are skipped
+        lengths = ends - starts
+        blank = (lengths == 0) | ((lengths == 1) & (buf[starts] == ord('\r')))
+        if blank.all():
+            return self._empty()
+
+        # Field count of every line, lines with the most common one are parsed in bulk
+        commas = np.flatnonzero(buf[starts[0]:ends[-1] + 1] == COMMA) + starts[0]
+        count = np.searchsorted(commas, ends) - np.searchsorted(commas, starts)
+        width = int(np.bincount(count[~blank]).argmax()) + 1
+        regular = (count == width - 1) & ~blank
+        if width < self.n_channels:
+            regular[:] = False
+
+        other = np.flatnonzero(~NUMERIC[buf[starts[0]:ends[-1] + 1]]) + starts[0]
+        if len(other):
+            regular[np.searchsorted(ends, other)] = False
+
+        out = np.full((len(starts), self.n_channels), np.nan)
+
+        # Runs of consecutive regular lines are contiguous in the block
+        idx = np.flatnonzero(regular)
+        for run in np.split(idx, np.flatnonzero(np.diff(idx) > 1) + 1):
+            if len(run):
+                self._parse_bulk(block, starts[run], ends[run], run, width, out)
+
+        for i in np.flatnonzero(~regular & ~blank):
+            out[i] = self._parse_line(block[starts[i]:ends[i]])
+        return out[~blank] if blank.any() else out
+
+    def _parse_bulk(self, block, starts, ends, idx, width, out):
+        """
+        Parse consecutive lines of `width` fields into out[idx]. A block with a
+        field that is not a number is split in halves until the bad lines are isolated.
+        """
+        values = self._fromstring(block[starts[0]:ends[-1] + 1], len(starts) * width)
+        if values is not None:
+            out[idx] = values.reshape(-1, width)[:, :self.n_channels]
+        elif len(starts) == 1:
+            out[idx[0]] = self._parse_line(block[starts[0]:ends[0]])
+        else:
+            h = len(starts) // 2
+            self._parse_bulk(block, starts[:h], ends[:h], idx[:h], width, out)
+            self._parse_bulk(block, starts[h:], ends[h:], idx[h:], width, out)
+
+    @staticmethod
+    def _fromstring(text, size):
+        """
+        All numbers of `text` (comma or newline separated), or None if any field is not a number.
+        """
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                values = np.fromstring(text.replace(b'\n', b','), sep=',')
+        except (ValueError, DeprecationWarning):
+            return None
+        return values if values.size == size else None
+
+    def _parse_line(self, line):
+        fields = line.split(b',')
+        values = [np.nan] * self.n_channels
+        malformed = len(fields) < self.n_channels
+        for i in range(min(len(fields), self.n_channels)):
+            try:
+                values[i] = float(fields[i])
+            except ValueError:
+                malformed = True
+        if malformed:
+            self.malformed += 1
+        return values
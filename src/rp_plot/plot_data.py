@@ -1,4 +1,5 @@
 ﻿import time
+from contextlib import nullcontext
 import numpy as np
 
 import serial
@@ -7,11 +8,20 @@ from serial.tools import list_ports
 from bokeh.plotting import figure, curdoc
 from bokeh.models import Range1d
 from bokeh.models import ColumnDataSource
+from bokeh.core.property.descriptors import UnsetValueError
+from bokeh.events import RangesUpdate, Reset
 
+from rp_comm.instrumentation import probe
 from rp_plot.redpitaya import RedPitaya
+from rp_plot.decimation import decimate
+from rp_plot.framing import StreamDecoder
+from rp_plot.history import HistoryStore
+from rp_plot.lod import LODPyramid
+from rp_plot.recorder import Recorder
+from rp_plot.serial_reader import SerialReader
 
 class SerialPlot:
-    def __init__(self, plot_b, data_collect, n_plots=2, baud_rate=115200 ,roll_over=5000, colors=['red', 'blue', 'green', 'yellow', 'orange', 'purple'], update_time=25, scatter_plot=False, oscilloscope_mode=False, sampling_rate=125e6, rp=None, rp_ip='rp-f0c5e4.local'):
+    def __init__(self, plot_b, data_collect, n_plots=2, baud_rate=115200 ,roll_over=5000, colors=['red', 'blue', 'green', 'yellow', 'orange', 'purple'], update_time=25, scatter_plot=False, oscilloscope_mode=False, sampling_rate=125e6, rp=None, rp_ip='rp-f0c5e4.local', max_batch=2000, max_latency=0, threaded_reader=False, reader_capacity=100000, decimation='minmax', max_points=None, redraw_time=200, history_capacity=1_000_000):
         self.n_plots = n_plots
         self.plot_b = plot_b
         self.roll_over = roll_over
@@ -26,13 +36,64 @@ class SerialPlot:
         self.sampling_rate = sampling_rate
 
         self.counter = 0
+        self.captures = 0
         self.periodic_callback = None
+        self.engine = None
+
+        # Real time samples are buffered and streamed once per source, when
+        # max_batch are buffered or the oldest is max_latency ms old (0: every callback)
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._pending_x = np.empty(max_batch)
+        self._pending_y = np.empty((n_plots, max_batch))
+        self._pending_n = 0
+        self._pending_since = None
+
+        # Display decimation ('minmax', 'lttb' or None): at most display_points() points
+        # per channel are sent to the browser. The full resolution data stays in
+        # full_data (captures) and, in real time mode, in the history pyramid of
+        # the last history_capacity samples. Zooming or panning sets view, the
+        # visible x window, which is re-served from the full resolution data;
+        # history views are redrawn every redraw_time ms
+        self.decimation = decimation
+        self.max_points = max_points
+        self.redraw_time = redraw_time
+        self.history_capacity = history_capacity
+        self.full_data = [None] * n_plots
+        self.history = None
+        self.view = None
+        # Last roll_over real time samples, rendered and measured from here.
+        # The store is mirrored, it takes 2 * roll_over * (8 + 4 * n_plots) bytes
+        self.store = HistoryStore(roll_over, n_plots)
+
+        # Optional Recorder writing what is plotted to disk, see start_recording
+        self.recorder = None
+        self._showing = None
+        self._redrawn = 0.0
+        # New samples were held back by the redraw_time throttle
+        self._redraw_pending = False
+
+        # Serial data is read in blocks and decoded in one vectorized step,
+        # as CSV lines or binary frames (see rp_plot.framing)
+        self.parser = StreamDecoder(n_plots)
+        self._bunch = None
         
         self.baud_rate = baud_rate
         self.data_collect = data_collect
         self.start = time.time()
+        # Time of the previous read of the port, samples are spread from there
+        self._last_read = 0.0
         self.setup_plot()
 
+        # With threaded_reader the port is read by a SerialReader thread, the
+        # callbacks only take the samples it stored since the previous call
+        self.reader = None
+        if threaded_reader:
+            self.reader = SerialReader(data_collect, n_channels=n_plots, capacity=reader_capacity)
+            self._cursor = 0
+            self._t0 = time.monotonic()
+            self.reader.start()
+
         if rp is None:
             self.rp = RedPitaya(rp_ip)
         else:
@@ -49,6 +110,9 @@ class SerialPlot:
 
             line = self.plot_b.line('x', 'y', source=source, line_color=self.colors[i])
             self.lines.append(line)
+
+        self.plot_b.on_event(RangesUpdate, self.on_ranges_update)
+        self.plot_b.on_event(Reset, self.on_reset)
         
         print("Setup ready!")
 
@@ -62,52 +126,307 @@ class SerialPlot:
         else:
             self.periodic_callback = doc.add_periodic_callback(self.update_real_time, self.update_time)
 
+    @probe.timed('plot.update_oscilloscope')
     def update_oscilloscope(self):
+            if self.reader is not None:
+                data = self.reader.latest_bunch()
+                if data is not None:
+                    self.plot_bunch(data)
+                return
+
             if self.data_collect.is_open:
                 print('Starting data recollection.\n')
                 data = self.extract_bunch()
-
-                try:
-                    data = np.array(data, dtype=np.float32)
-                except:
-                    print("Data conversion failed.")
+                if len(data) == 0:
                     return
-                
-                 # Parámetros de muestreo
-                fs = self.sampling_rate  # Hz (tasa de muestreo)
-                ts_us = 1e6 / fs  # tiempo por muestra en microsegundos
-
-                # Eje X en tiempo (µs)
-                x_vals = np.arange(data.shape[0]) * ts_us
-
-                for i in range(self.n_plots):
-                    try:
-                        new_data = dict(x=x_vals, y=data[:, i])
-                        self.sources[i].stream(new_data, rollover=data.shape[0])
-                    except:
-                        print("Data not recognized, skipping plot.")
-            
+
+                data = np.asarray(data, dtype=np.float32)
+
+                self.plot_bunch(data)
+
             # print('succesful. \n')
 
+    def plot_bunch(self, data):
+        # Parámetros de muestreo
+        fs = self.sampling_rate  # Hz (tasa de muestreo)
+        ts_us = 1e6 / fs  # tiempo por muestra en microsegundos
+
+        # Eje X en tiempo (µs)
+        x_vals = np.arange(data.shape[0]) * ts_us
+
+        if self.recorder is not None and data.ndim == 2:
+            self.recorder.write_capture(data.T, time.time(), 1 / fs)
+        self.captures += 1
+
+        for i in range(self.n_plots):
+            try:
+                self.show_capture(i, x_vals, data[:, i])
+            except (IndexError, ValueError):
+                print("Data not recognized, skipping plot.")
+
+    def show_capture(self, i, x, y):
+        """
+        Replace the data of source i with a capture, decimated for display.
+        """
+        self.full_data[i] = (x, y)
+        self._showing = 'capture'
+        self.serve_capture(i)
+
+    def serve_capture(self, i):
+        """
+        Send the part of the capture of source i inside view, decimated.
+        """
+        x, y = self.full_data[i]
+        if self.view is not None:
+            lo = max(np.searchsorted(x, self.view[0], side='left') - 1, 0)
+            hi = np.searchsorted(x, self.view[1], side='right') + 1
+            x, y = x[lo:hi], y[lo:hi]
+        xd, yd = decimate(x, y, self.display_points(), self.decimation)
+        with probe.span('plot.stream'):
+            if len(xd):
+                self.sources[i].stream(dict(x=xd, y=yd), rollover=len(xd))
+            else:
+                self.sources[i].data = dict(x=[], y=[])
+
+    def display_points(self):
+        """
+        Points sent per channel: max_points, or two per pixel of the plot width.
+        """
+        if self.max_points is not None:
+            return self.max_points
+        try:
+            width = self.plot_b.inner_width
+        except UnsetValueError:
+            width = None
+        return 2 * (width or self.plot_b.width or 1000)
+
+    @probe.timed('plot.update_acquisition')
+    def update_acquisition(self):
+        frame = self.engine.latest() if self.engine is not None else None
+        if frame is None:
+            return
+
+        # Eje X en tiempo (µs)
+        decimation = self.engine.settings['decimation']
+        x_vals = np.arange(frame.length) * (1e6 * decimation / self.sampling_rate)
+
+        if self.recorder is not None:
+            self.recorder.write_capture(frame.data[:, :frame.length], frame.timestamp, decimation / self.sampling_rate)
+        self.captures += 1
+
+        for i in range(min(self.n_plots, frame.data.shape[0])):
+            self.show_capture(i, x_vals, frame.channel(i).copy())
+
+    @probe.timed('plot.update_real_time')
     def update_real_time(self):
+        if self.reader is not None:
+            self.update_from_reader()
+            return
+
         if self.data_collect is not None and self.data_collect.is_open:
-            while self.data_collect.in_waiting:
-                data = self.extract_data()
-                
-                for i in range(self.n_plots):
-                    try:
-                        y_temp = float(data[i])
-                        end = time.time()
-                    except:
-                        print("Data not recognized, skipping plot.")
-                        continue
-                    
-                    elapsed_time = end - self.start
-                    new_data = dict(x=[elapsed_time], y=[y_temp])
-
-                    self.sources[i].stream(new_data, rollover=self.roll_over)
-                    
-                self.counter += 1
+            malformed = self.parser.malformed
+            rows = self.extract_data()
+            if self.parser.malformed > malformed:
+                print(f"{self.parser.malformed - malformed} lines not recognized, skipping plot.")
+
+            end = time.time() - self.start
+            if len(rows):
+                self.queue_samples(np.linspace(self._last_read, end, len(rows) + 1)[1:], rows.T)
+                self.counter += len(rows)
+            self._last_read = end
+
+        if self._pending_since is not None and (time.time() - self._pending_since) * 1e3 >= self.max_latency:
+            self.flush_stream()
+        self.redraw_held_back()
+
+    def queue_samples(self, x, y):
+        """
+        Buffer real time samples, x : (n,) and y : (n_plots, n) with NaN for missing values.
+        They are streamed when max_batch samples are buffered or by the next flush_stream().
+        """
+        if self._pending_since is None:
+            self._pending_since = time.time()
+        pos = 0
+        while pos < len(x):
+            n = min(len(x) - pos, self.max_batch - self._pending_n)
+            self._pending_x[self._pending_n:self._pending_n + n] = x[pos:pos + n]
+            self._pending_y[:, self._pending_n:self._pending_n + n] = y[:self.n_plots, pos:pos + n]
+            self._pending_n += n
+            pos += n
+            if self._pending_n == self.max_batch:
+                self.flush_stream()
+                if pos < len(x):
+                    self._pending_since = time.time()
+
+    def flush_stream(self):
+        """
+        Stream the buffered real time samples, one stream() call per source.
+        """
+        n = self._pending_n
+        if n:
+            x, y = self._pending_x[:n], self._pending_y[:, :n]
+            self.store.extend(x, y)
+            self._showing = 'history'
+            if self.recorder is not None:
+                self.recorder.write(x, y)
+            if self.decimation is not None:
+                self.keep_history(x, y)
+
+            if self.view is None and (self.decimation is None or self.roll_over <= self.display_points()):
+                with probe.span('plot.stream'):
+                    for i in range(self.n_plots):
+                        valid = ~np.isnan(y[i])
+                        self.sources[i].stream(dict(x=x[valid], y=y[i][valid]), rollover=self.roll_over)
+            elif self.view is not None and self.view[1] < x[0]:
+                # The new samples are outside the visible window
+                pass
+            elif (time.time() - self._redrawn) * 1e3 >= self.redraw_time:
+                self.redraw_history()
+            else:
+                self._redraw_pending = True
+        self._pending_n = 0
+        self._pending_since = None
+
+    def redraw_held_back(self):
+        """
+        Redraw once redraw_time has passed if samples were held back by the
+        throttle, so the last samples are drawn when the data stops.
+        """
+        if self._redraw_pending and (time.time() - self._redrawn) * 1e3 >= self.redraw_time:
+            self.redraw_history()
+
+    def keep_history(self, x, y):
+        """
+        Store real time samples in the history pyramid, used for serving
+        zoomed views older than the last roll_over samples.
+        """
+        capacity = max(self.roll_over, self.history_capacity)
+        if self.history is None or self.history.capacity < capacity:
+            self.history = LODPyramid(self.n_plots, capacity=capacity)
+        self.history.extend(x, y)
+
+    @probe.timed('plot.redraw')
+    def redraw_history(self):
+        """
+        Send the last roll_over samples from the store, decimated, or view:
+        from the store when it lies inside the last roll_over samples,
+        otherwise from the history pyramid.
+        """
+        self._redrawn = time.time()
+        self._redraw_pending = False
+        n_out = self.display_points()
+        t, y = self.store.last(self.roll_over)
+        in_store = self.view is None or (len(t) and self.view[0] >= t[0])
+        if not in_store and self.history is not None:
+            points = self.history.query(self.view[0], self.view[1], n_out)
+        else:
+            if self.view is not None:
+                lo = max(np.searchsorted(t, self.view[0], side='left') - 1, 0)
+                hi = np.searchsorted(t, self.view[1], side='right') + 1
+                t, y = t[lo:hi], y[:, lo:hi]
+            points = [decimate(t, y[i], n_out, self.decimation) for i in range(self.n_plots)]
+        for i, (x, y) in enumerate(points):
+            valid = ~np.isnan(y)
+            self.sources[i].data = dict(x=x[valid], y=y[valid])
+
+    @property
+    def pending_samples(self):
+        """
+        Real time samples buffered and not yet streamed to the plot.
+        """
+        return self._pending_n
+
+    @property
+    def reader_backlog(self):
+        """
+        Samples stored by the reader thread and not yet taken by the plot.
+        """
+        return self.reader.ring.written - self._cursor if self.reader is not None else 0
+
+    def measure(self, n=None):
+        """
+        Measurements of the last n real time samples (roll_over by default),
+        see HistoryStore.measure.
+        """
+        return self.store.measure(self.roll_over if n is None else n)
+
+    def on_ranges_update(self, event):
+        """
+        Zoom or pan of the figure: re-serve the visible window at full detail.
+        """
+        if event.x0 is None or event.x1 is None:
+            return
+        self.view = (min(event.x0, event.x1), max(event.x0, event.x1))
+        self.serve_view()
+
+    def on_reset(self, event):
+        """
+        Reset of the figure: back to the whole capture, or to following the
+        last roll_over real time samples.
+        """
+        self.view = None
+        self.serve_view()
+
+    def serve_view(self):
+        if self._showing == 'capture':
+            for i in range(self.n_plots):
+                if self.full_data[i] is not None:
+                    self.serve_capture(i)
+        elif self._showing == 'history':
+            self.redraw_history()
+
+    def update_from_reader(self):
+        """
+        Queue the samples the reader thread stored since the previous call.
+        """
+        t, y, self._cursor, lost = self.reader.ring.read_new(self._cursor)
+        if lost:
+            print(f"{lost} samples lost, the plot is not keeping up with the serial data.")
+        if len(t):
+            self.queue_samples(t - self._t0, y)
+            self.counter += len(t)
+
+        if self._pending_since is not None and (time.time() - self._pending_since) * 1e3 >= self.max_latency:
+            self.flush_stream()
+        self.redraw_held_back()
+
+    def start_recording(self, path, format='npy', **kwargs):
+        """
+        Record the plotted samples to <path>_0000.npy (or .h5) segments, see
+        Recorder for the format and the other parameters. The acquisition
+        settings are stored as metadata.
+        """
+        self.stop_recording()
+        metadata = dict(sampling_rate=self.sampling_rate, baud_rate=self.baud_rate, roll_over=self.roll_over,
+                        mode='acquisition' if self.engine is not None else 'oscilloscope' if self.osci else 'real_time')
+        if self.engine is not None:
+            metadata.update(self.engine.settings)
+        metadata.update(kwargs.pop('metadata', {}))
+        self.recorder = Recorder(path, n_channels=self.n_plots, format=format, metadata=metadata, **kwargs)
+        return self.recorder
+
+    def stop_recording(self):
+        """
+        Stop recording, the queued samples are written before returning.
+        """
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+            print(f"Recorded {recorder.samples} samples to {len(recorder.files)} file(s), {recorder.dropped} blocks dropped.")
+
+    def port_lock(self):
+        """
+        Context in which the serial port may be opened, closed or reconfigured.
+        """
+        return self.reader.port_lock if self.reader is not None else nullcontext()
+
+    def reset_parsers(self):
+        """
+        Drop partially received lines, called when the port changes.
+        """
+        self.parser.reset()
+        if self.reader is not None:
+            self.reader.parser.reset()
 
     def search(self):
         self.ports = list_ports.comports()
@@ -117,49 +436,61 @@ class SerialPlot:
         return self.available_ports
 
     def extract_data(self):
-        serialRecieving = self.data_collect.readline()
-        data = serialRecieving.decode('utf-8').rstrip('\n')
-        # print(data)
-        self.data_serial = data.split(',')
-
-        return self.data_serial
+        """
+        Read all pending bytes at once and decode the complete lines or frames.
+        Returns a (samples, n_plots) float array, NaN where a value was not
+        recognized.
+
+        Before the vectorized parser this read a single line and returned
+        its fields as a list of strings; callers now get every pending
+        sample at once, already converted to floats.
+        """
+        with probe.span('serial.parse'):
+            rows, bunches = self.parser.feed(self._read_pending())
+        if bunches:
+            self._bunch = bunches[-1]
+        return rows
 
     def extract_bunch(self):
-        active = False
-        data_bunch = []
-        while self.data_collect.in_waiting:
-            serialRecieving = self.data_collect.readline()
-            data = serialRecieving.decode('utf-8').rstrip('\n')
-
-            if data.startswith('stop') and active:
-                active = False
-                break
-            elif data.startswith('start') and not active:
-                active = True
-                continue
-            
-            if active:
-                # print(data)
-                self.data_serial = data.split(',')
-                data_bunch.append(self.data_serial)
-
-        return data_bunch
-    
+        """
+        Read all pending bytes at once, returns the last complete start/stop
+        bunch or bunch frame as a (rows, n_plots) float array, with no rows
+        if no bunch is complete yet.
+
+        This used to return a list of rows of strings. The array is
+        already converted to floats, and len() still counts its rows.
+        """
+        with probe.span('serial.parse'):
+            _, bunches = self.parser.feed(self._read_pending())
+        if bunches:
+            self._bunch = bunches[-1]
+        bunch, self._bunch = self._bunch, None
+        return bunch if bunch is not None else np.empty((0, self.n_plots))
+
+    def _read_pending(self):
+        waiting = self.data_collect.in_waiting
+        probe.count('serial.bytes', waiting)
+        return self.data_collect.read(waiting) if waiting else b''
+
     def select_port(self, port_selected):
-        if self.data_collect.is_open:
-            self.data_collect.close()
-        print(port_selected + " was selected")
-        self.data_collect.baudrate=self.baud_rate
-        self.data_collect.port = port_selected
+        with self.port_lock():
+            if self.data_collect.is_open:
+                self.data_collect.close()
+            print(port_selected + " was selected")
+            self.data_collect.baudrate=self.baud_rate
+            self.data_collect.port = port_selected
 
-        if port_selected != "None":
-            self.data_collect.open()
+            self.reset_parsers()
+            if port_selected != "None":
+                self.data_collect.open()
 
     def update_baud_rate(self, bd):
-        if self.data_collect.is_open:
-            self.data_collect.close()
-        self.data_collect.baudrate = bd
-        self.data_collect.open()
+        with self.port_lock():
+            if self.data_collect.is_open:
+                self.data_collect.close()
+            self.data_collect.baudrate = bd
+            self.reset_parsers()
+            self.data_collect.open()
 
     def update_y_range(self, min_val=None, max_val=None):
         def _update():
@@ -181,7 +512,10 @@ class SerialPlot:
     def update_roll_over(self, ro):
         def _update():
             self.roll_over=ro
-            
+            self.store.resize(ro)
+            if self._showing == 'history':
+                self.redraw_history()
+
         if hasattr(self, "doc"):
             self.doc.add_next_tick_callback(_update)
         else:
@@ -195,8 +529,9 @@ class SerialPlot:
                 self.doc.remove_periodic_callback(self.periodic_callback)
             self.periodic_callback = self.doc.add_periodic_callback(self.update_oscilloscope, self.update_time)
 
-            if self.data_collect.is_open:
-                self.data_collect.close()
+            with self.port_lock():
+                if self.data_collect.is_open:
+                    self.data_collect.close()
 
         if hasattr(self, "doc"):
             self.doc.add_next_tick_callback(_update)
@@ -211,8 +546,29 @@ class SerialPlot:
                 self.doc.remove_periodic_callback(self.periodic_callback)
             self.periodic_callback = self.doc.add_periodic_callback(self.update_real_time, self.update_time)
 
-            if self.data_collect.is_open:
-                self.data_collect.close()
+            with self.port_lock():
+                if self.data_collect.is_open:
+                    self.data_collect.close()
+
+        if hasattr(self, "doc"):
+            self.doc.add_next_tick_callback(_update)
+        else:
+            print("Document not attached yet.")
+
+    def change_to_acquisition_mode(self, engine):
+        """
+        Plot the frames of a running AcquisitionEngine instead of the serial data.
+        """
+        def _update():
+            self.engine = engine
+
+            if self.periodic_callback:
+                self.doc.remove_periodic_callback(self.periodic_callback)
+            self.periodic_callback = self.doc.add_periodic_callback(self.update_acquisition, self.update_time)
+
+            with self.port_lock():
+                if self.data_collect.is_open:
+                    self.data_collect.close()
 
         if hasattr(self, "doc"):
             self.doc.add_next_tick_callback(_update)
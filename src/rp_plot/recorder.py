@@ -0,0 +1,328 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+class NpyWriter:
+    """
+    Segment file written through a memory-mapped .npy array of records
+    ('t' float64 timestamp, 'y' float32 value per channel).
+
+    The file is preallocated for `rows` records; `close` rewrites the header
+    with the number of records written and truncates the file, so it loads
+    with np.load(path, mmap_mode='r').
+    """
+    extension = '.npy'
+
+    def __init__(self, path, n_channels, rows, metadata):
+        self.path = path
+        self.dtype = np.dtype([('t', '<f8'), ('y', '<f4', (n_channels,))])
+        self.array = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype, shape=(rows,))
+        self.offset = self.array.offset
+        self.rows = 0
+        with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+    @property
+    def full(self):
+        return self.rows == len(self.array)
+
+    def write(self, t, y):
+        """
+        Write as many of the samples as fit, returns how many were written.
+        """
+        n = min(len(t), len(self.array) - self.rows)
+        out = self.array[self.rows:self.rows + n]
+        out['t'] = t[:n]
+        out['y'] = y[:, :n].T
+        self.rows += n
+        return n
+
+    def flush(self):
+        self.array.flush()
+
+    def close(self):
+        self.array.flush()
+        del self.array
+
+        # Same header length, padded with spaces, so the data does not move
+        header = {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': (self.rows,)}
+        with open(self.path, 'r+b') as f:
+            f.seek(8)
+            length = int.from_bytes(f.read(2), 'little')
+            text = repr(header).encode('latin1')
+            f.write(text.ljust(length - 1) + b'\n')
+            f.truncate(self.offset + self.rows * self.dtype.itemsize)
+
+
+class HDF5Writer:
+    """
+    Segment file written as chunked, resizable HDF5 datasets 't' (n,) and
+    'y' (n, n_channels), the metadata is stored as attributes of the file.
+    """
+    extension = '.h5'
+
+    def __init__(self, path, n_channels, rows, metadata):
+        if h5py is None:
+            raise ImportError("HDF5 recording needs the h5py package.")
+        self.path = path
+        self.limit = rows
+        self.rows = 0
+        self.file = h5py.File(path, 'w')
+        chunk = min(rows, 65536)
+        self.t = self.file.create_dataset('t', shape=(0,), maxshape=(rows,), dtype='<f8', chunks=(chunk,))
+        self.y = self.file.create_dataset('y', shape=(0, n_channels), maxshape=(rows, n_channels), dtype='<f4',
+                                          chunks=(chunk, n_channels))
+        for key, value in metadata.items():
+            self.file.attrs[key] = json.dumps(value) if isinstance(value, (dict, list)) else value
+
+    @property
+    def full(self):
+        return self.rows == self.limit
+
+    def write(self, t, y):
+        n = min(len(t), self.limit - self.rows)
+        end = self.rows + n
+        self.t.resize((end,))
+        self.y.resize((end, self.y.shape[1]))
+        self.t[self.rows:end] = t[:n]
+        self.y[self.rows:end] = y[:, :n].T
+        self.rows = end
+        return n
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def load_recording(path):
+    """
+    Load a recording written by Recorder.
+
+    Parameters
+    ----------
+    path : str
+        a segment file, or the base path given to Recorder for all its segments
+
+    Returns
+    -------
+    t, y, metadata
+        (n,) float64 timestamps, (n_channels, n) float32 values and the
+        metadata of the first segment
+    """
+    if os.path.splitext(path)[1] in ('.npy', '.h5'):
+        files = [path]
+    else:
+        files = sorted(f for f in glob.glob(glob.escape(path) + '_[0-9][0-9][0-9][0-9].*')
+                       if os.path.splitext(f)[1] in ('.npy', '.h5'))
+    if not files:
+        raise FileNotFoundError(f"No recording found at {path}")
+
+    ts, ys, metadata = [], [], None
+    for name in files:
+        if name.endswith('.npy'):
+            with open(os.path.splitext(name)[0] + '.json') as f:
+                segment = json.load(f)
+            records = np.load(name, mmap_mode='r')
+            t, y = records['t'], records['y']
+        else:
+            if h5py is None:
+                raise ImportError("Reading HDF5 recordings needs the h5py package.")
+            with h5py.File(name, 'r') as f:
+                segment = {key: _attribute(value) for key, value in f.attrs.items()}
+                t, y = f['t'][:], f['y'][:]
+        if metadata is None:
+            metadata = segment
+        elif segment.get('recording') != metadata.get('recording'):
+            # Left over from an older recording to the same path
+            break
+        ts.append(np.asarray(t))
+        ys.append(np.asarray(y).T)
+    return np.concatenate(ts), np.concatenate(ys, axis=1), metadata
+
+
+def _attribute(value):
+    if isinstance(value, str) and value[:1] in '[{':
+        return json.loads(value)
+    return value.item() if isinstance(value, np.generic) else value
+
+
+WRITERS = {
+    'npy': NpyWriter,
+    'hdf5': HDF5Writer,
+}
+
+
+class Recorder:
+    """
+    Records timestamped samples to disk from a background writer thread.
+
+    `write` and `write_capture` only copy the samples into a bounded queue,
+    so the caller (the plot callbacks, an acquisition loop) is never slowed
+    down by the disk; when the writer falls behind and the queue is full the
+    blocks are dropped and counted in `dropped`.
+
+    Files are segments named <path>_0000.npy (or .h5), with the metadata in
+    a .json file next to .npy segments or as HDF5 attributes. A new segment
+    is started when the current one holds max_bytes of samples or is
+    max_seconds old.
+
+    Parameters
+    ----------
+    path : str
+        base name of the files, without extension
+    n_channels : int
+    format : str
+        'npy' (memory-mapped, default) or 'hdf5' (needs h5py)
+    metadata : dict
+        stored with every segment, e.g. decimation, sample_rate, trigger settings
+    channel_names : list of str
+    queue_size : int
+        blocks waiting for the writer before new ones are dropped
+    flush_interval : float
+        in s, time between flushes of the current segment to disk
+    max_bytes : int
+        size of a segment, also its preallocated size for 'npy'
+    max_seconds : float
+        maximum duration of a segment, None for no limit
+    """
+    def __init__(self, path, n_channels=2, format='npy', metadata=None, channel_names=None, queue_size=256,
+                 flush_interval=1.0, max_bytes=256 * 2**20, max_seconds=None):
+        if format not in WRITERS:
+            raise ValueError(f"format must be one of {list(WRITERS)}")
+        if format == 'hdf5' and h5py is None:
+            raise ImportError("HDF5 recording needs the h5py package.")
+        self.path = path
+        self.n_channels = n_channels
+        self.format = format
+        self.metadata = dict(metadata or {})
+        self.metadata['channel_names'] = list(channel_names or [f'ch{i + 1}' for i in range(n_channels)])
+        # Tells the segments of this recording from older ones with the same path
+        self.metadata['recording'] = time.time()
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.files = []
+        self.samples = 0
+        self.dropped = 0
+        self.error = None
+        self._writer = None
+        self._opened = None
+        self._stop = object()
+        self._thread = threading.Thread(target=self._run, name='rp-recorder', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, t, y):
+        """
+        Queue a block of samples, t : (n,) and y : (n_channels, n). The data
+        is copied. Returns False if the block was dropped, always once the
+        writer stopped on an error.
+        """
+        if self.error is not None or self._thread is None:
+            self.dropped += 1
+            return False
+        y = np.asarray(y)
+        if y.ndim == 1:
+            y = y[None, :]
+        block = (np.array(t, dtype=np.float64), np.array(y, dtype=np.float32))
+        try:
+            self.queue.put_nowait(block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def write_capture(self, data, timestamp, sample_time):
+        """
+        Queue a capture, data : (n_channels, n) sampled every sample_time s
+        from timestamp on.
+        """
+        data = np.asarray(data)
+        return self.write(timestamp + np.arange(data.shape[-1]) * sample_time, data)
+
+    def close(self):
+        """
+        Write the queued blocks, close the current segment and stop the writer.
+        """
+        if self._thread is None:
+            return
+        # A writer that died on an error no longer empties the queue
+        while self._thread.is_alive():
+            try:
+                self.queue.put(self._stop, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self._thread.join()
+        self._thread = None
+
+    def stats(self):
+        return dict(samples=self.samples, dropped=self.dropped, queued=self.queue.qsize(), files=list(self.files),
+                    error=self.error)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    block = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    block = None
+                if block is self._stop:
+                    break
+                if block is not None:
+                    self._store(*block)
+
+                now = time.monotonic()
+                if self._writer is not None and now - last_flush >= self.flush_interval:
+                    self._writer.flush()
+                    last_flush = now
+        except Exception as e:
+            self.error = e
+            print(f"Recording stopped: {e}")
+        finally:
+            self._close_segment()
+
+    def _store(self, t, y):
+        while len(t):
+            if self._writer is None or self._writer.full or (
+                    self.max_seconds is not None and time.monotonic() - self._opened >= self.max_seconds):
+                self._open_segment()
+            n = self._writer.write(t, y)
+            self.samples += n
+            t, y = t[n:], y[:, n:]
+
+    def _open_segment(self):
+        self._close_segment()
+        writer = WRITERS[self.format]
+        name = f"{self.path}_{len(self.files):04d}{writer.extension}"
+        rows = max(1, self.max_bytes // (8 + 4 * self.n_channels))
+        metadata = dict(self.metadata, segment=len(self.files), started=time.time())
+        self._writer = writer(name, self.n_channels, rows, metadata)
+        self._opened = time.monotonic()
+        self.files.append(name)
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -1,13 +1,42 @@
 ﻿import numpy as np
 import rp_comm.redpitaya_scpi as scpi
+from rp_comm.instrumentation import probe
 import time
 import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Fast analog inputs: ADC resolution and full scale range (V) per input gain jumper
+ADC_BITS = 14
+FULL_SCALE = {'LV': 1.0, 'HV': 20.0}
+
+# Acquisition buffer length (samples) and ADC sample rate (Hz)
+BUFFER_SIZE = 16384
+ADC_RATE = 125e6
 
 class RedPitaya:
     def __init__(self, ip_address, port=5000):
         self.ip_address = ip_address
         self.port = port
-        self.rp = scpi.scpi(ip_address, port)
+        # Settings already on the board are not written again, see scpi.state
+        self.rp = scpi.scpi(ip_address, port=port, skip_redundant=True)
+
+        # Input gain jumper setting and (gain, offset) calibration per channel,
+        # used to convert RAW samples to Volts on the host
+        self.input_gain = {1: 'LV', 2: 'LV'}
+        self.calibration = {1: (1.0, 0.0), 2: (1.0, 0.0)}
+
+        # Serializes access to the connection, the acquisition engine runs in its own thread
+        self.lock = threading.RLock()
+        self.acquisition = None
+        self._rx_buffer = None
+        self._executor = None
+
+        # Waiting for the trigger: timeout (s), first and longest interval between FILL? polls (s)
+        self.trigger_timeout = 5
+        self.poll_min = 1e-4
+        self.poll_max = 0.02
+        self._armed_at = 0.0
 
     def generate_signal(self, channel=1, frequency=15000, amplitude=0.75, offset=0.0, waveform='sine'):
         """
@@ -40,20 +69,25 @@ class RedPitaya:
 
         print(f"Generating {waveform} signal on channel {channel} with frequency {frequency} Hz, amplitude {amplitude} Vpp, and offset {offset} V.")
 
-        # Reset the channel and set the waveform parameters
-        self.rp.tx_txt(f'SOUR{str(channel)}:FUNC:RESET')
+        # Send the whole configuration in a single write. Only the settings that
+        # changed since the last call reach the board.
+        with self.lock, self.rp.batch():
+            # Reset the channel if its state is unknown, then set the waveform parameters
+            if self.rp.state.get(f'SOUR{channel}:FUNC') is None:
+                self.rp.tx_txt(f'SOUR{str(channel)}:FUNC:RESET')
 
-        # Set the waveform type, frequency, amplitude, and offset
-        self.rp.tx_txt(f'SOUR{str(channel)}:FUNC {str(waveform.upper())}')
-        self.rp.tx_txt(f'SOUR{str(channel)}:FREQ:FIX {str(frequency)}')
-        self.rp.tx_txt(f'SOUR{str(channel)}:VOLT {str(amplitude)}')
-        self.rp.tx_txt(f'SOUR{str(channel)}:VOLT:OFFS {str(offset)}')
+            # Set the waveform type, frequency, amplitude, and offset
+            self.rp.tx_txt(f'SOUR{str(channel)}:FUNC {str(waveform.upper())}')
+            self.rp.tx_txt(f'SOUR{str(channel)}:FREQ:FIX {str(frequency)}')
+            self.rp.tx_txt(f'SOUR{str(channel)}:VOLT {str(amplitude)}')
+            self.rp.tx_txt(f'SOUR{str(channel)}:VOLT:OFFS {str(offset)}')
 
-        # Enable the output
-        self.rp.tx_txt(f'OUTPUT{str(channel)}:STATE ON')
+            # Enable the output
+            self.rp.tx_txt(f'OUTPUT{str(channel)}:STATE ON')
 
     def trigger_generation(self):
-        self.rp.tx_txt(f'SOUR:TRIG:INT')
+        with self.lock:
+            self.rp.tx_txt(f'SOUR:TRIG:INT')
 
     def stop_signal(self, channel=1):
         """
@@ -61,7 +95,8 @@ class RedPitaya:
         """
         if channel not in (1, 2):
             raise ValueError(f"Channel must be 1 or 2, got {channel}")
-        self.rp.tx_txt(f'OUTPUT{channel}:STATE OFF')
+        with self.lock:
+            self.rp.tx_txt(f'OUTPUT{channel}:STATE OFF')
 
     def reset(self, channel=1):
         """
@@ -70,56 +105,301 @@ class RedPitaya:
 
         if channel not in (1, 2):
             raise ValueError(f"Channel must be 1 or 2, got {channel}")
-        self.rp.tx_txt(f'SOUR{str(channel)}:FUNC:RESET')
+        with self.lock:
+            self.rp.tx_txt(f'SOUR{str(channel)}:FUNC:RESET')
 
     def configure_acquisition(self, decimation, trigger_level, data_units, data_format, trigger_source):
-        self.rp.tx_txt(f"ACQ:DEC {str(decimation)}")
-        self.rp.tx_txt(f"ACQ:DATA:UNITS {str(data_units).upper()}")
-        self.rp.tx_txt(f"ACQ:DATA:FORMAT {str(data_format).upper()}")
-        self.rp.tx_txt(f"ACQ:TRig:LEV {str(trigger_level)}")
-        self.rp.tx_txt(f"ACQ:TRig {str(trigger_source)}")
+        """
+        Configure the acquisition.
+
+        Parameters
+        ----------
+        data_units : str
+            'volts' or 'raw'
+        data_format : str
+            'ascii' or 'bin'. With 'bin' the samples are transferred as
+            big-endian float32 (volts) or int16 (raw).
+        """
+        data_units, data_format = self._validate_units_format(data_units, data_format)
+
+        with self.lock, self.rp.batch():
+            self.rp.tx_txt(f"ACQ:DEC {str(decimation)}")
+            self.rp.tx_txt(f"ACQ:DATA:UNITS {data_units}")
+            self.rp.tx_txt(f"ACQ:DATA:FORMAT {data_format}")
+            self.rp.tx_txt(f"ACQ:TRig:LEV {str(trigger_level)}")
+            self.rp.tx_txt(f"ACQ:TRig {str(trigger_source)}")
+
+        self.acquisition = dict(decimation=decimation, data_units=data_units, data_format=data_format, trigger_source=trigger_source)
+
+    def set_calibration(self, channel=1, gain=1.0, offset=0.0, input_gain=None):
+        """
+        Set the calibration used to convert RAW samples of a channel to Volts.
+
+        volts = raw / 2**(ADC_BITS - 1) * FULL_SCALE[input_gain] * gain + offset
+        """
+        if channel not in (1, 2):
+            raise ValueError(f"Channel must be 1 or 2, got {channel}")
+        if input_gain is not None:
+            if input_gain.upper() not in FULL_SCALE:
+                raise ValueError(f"input_gain must be one of {set(FULL_SCALE)}")
+            self.input_gain[channel] = input_gain.upper()
+        self.calibration[channel] = (gain, offset)
+
+    def raw_to_volts(self, raw, channel=1):
+        """
+        Convert RAW ADC samples of a channel to Volts (float32) in one vectorized step.
+        """
+        gain, offset = self.calibration[channel]
+        scale = FULL_SCALE[self.input_gain[channel]] * gain / 2**(ADC_BITS - 1)
+        volts = np.multiply(raw, scale, dtype=np.float32)
+        volts += offset
+        return volts
 
     def stop_acquisition(self):
-        self.rp.tx_txt('ACQ:STOP')
+        with self.lock:
+            self.rp.tx_txt('ACQ:STOP')
+
+    def read_data(self, decimation=8, trigger_level=0.1, data_units='Volts', data_format='ascii', trigger_source='CH1_PE', to_volts=False, timeout=None, recorder=None):
+        """
+        Read data from both channels.
+
+        Parameters
+        ----------
+        data_units : str
+            'volts' or 'raw'
+        data_format : str
+            'ascii' (default) or 'bin'. 'bin' transfers the samples as binary
+            blocks (int16 with RAW units, float32 with VOLTS) decoded with
+            np.frombuffer, much faster than parsing the ASCII reply.
+        to_volts : bool
+            Only used with RAW units. Convert the samples to Volts on the host
+            with the calibration set by `set_calibration`, otherwise (default)
+            return the raw ADC codes, as the board sends them.
+        timeout : float
+            in s, time to wait for the trigger, defaults to `trigger_timeout`
+        recorder : rp_plot.recorder.Recorder
+            if given, the capture is also queued for recording
+
+        With rp_comm.instrumentation.probe enabled the phases are timed as
+        read_data.arm, read_data.trigger_wait and read_data.transfer.
+        """
+        with self.lock, probe.span('read_data'):
+            with probe.span('read_data.arm'):
+                self.arm(decimation, trigger_level, data_units, data_format, trigger_source)
+            with probe.span('read_data.trigger_wait'):
+                self.wait_filled(timeout)
+            timestamp = time.time()
+            with probe.span('read_data.transfer'):
+                y1, y2 = self.read_channels(to_volts=to_volts)
+            self.rp.tx_txt('ACQ:STOP')
+        probe.count('read_data.frames')
+
+        if recorder is not None:
+            recorder.write_capture(np.vstack((y1, y2)), timestamp, decimation / ADC_RATE)
+        return y1, y2
+
+    def arm(self, decimation=8, trigger_level=0.1, data_units='Volts', data_format='ascii', trigger_source='CH1_PE'):
+        """
+        Reset the acquisition, configure it and start it.
+        The units and format are kept for `read_channels` and `rearm`.
+        """
+        data_units, data_format = self._validate_units_format(data_units, data_format)
+
+        with self.lock, self.rp.batch():
+            self.rp.tx_txt('ACQ:RST')
+            self.rp.tx_txt(f'ACQ:DEC {decimation}')
+            self.rp.tx_txt(f'ACQ:DATA:UNITS {data_units}')
+            self.rp.tx_txt(f'ACQ:DATA:FORMAT {data_format}')
+
+            # Set trigger to the buffer's center
+            self.rp.tx_txt('ACQ:TRig:DLY 0')
+
+            self.rp.tx_txt(f'ACQ:TRig:LEV {trigger_level}')
+            self.rp.tx_txt(f'ACQ:TRig {trigger_source}')
+            self.rp.tx_txt('ACQ:START')
 
-    def read_data(self, decimation=8, trigger_level=0.1, data_units='Volts', data_format='ascii', trigger_source='CH1_PE'):
+        self.mark_armed()
+        self.acquisition = dict(decimation=decimation, data_units=data_units, data_format=data_format, trigger_source=trigger_source)
+
+    def rearm(self):
+        """
+        Start the next acquisition with the settings of the last `arm` call.
+        Inside a batch this is sent together with the pending data queries.
+        """
+        with self.lock, self.rp.batch():
+            self.rp.tx_txt('ACQ:START')
+            self.rp.tx_txt(f"ACQ:TRig {self.acquisition['trigger_source']}")
+        self.mark_armed()
+
+    def mark_armed(self, at=None):
+        """
+        Record when the board started the acquisition (time.monotonic(), now
+        by default), `wait_filled` does not poll before the buffer can be full.
         """
-        Read data from the specified channel.
+        self._armed_at = time.monotonic() if at is None else at
+
+    def fill_time(self, decimation=None):
+        """
+        Time (s) to fill the acquisition buffer once, with the given or the armed decimation.
+        """
+        if decimation is None:
+            decimation = self.acquisition['decimation'] if self.acquisition else 1
+        return BUFFER_SIZE * int(decimation) / ADC_RATE
+
+    def wait_filled(self, timeout=None, poll_min=None, poll_max=None):
         """
-        self.rp.tx_txt('ACQ:RST')
-        self.rp.tx_txt(f'ACQ:DEC {decimation}')
-        self.rp.tx_txt(f'ACQ:DATA:UNITS {data_units.upper()}')
-        self.rp.tx_txt(f'ACQ:DATA:FORMAT {data_format.upper()}')
+        Wait until the acquisition buffer is filled after the trigger.
 
-        # Set trigger to the buffer's center
-        self.rp.tx_txt('ACQ:TRig:DLY 0')
+        Sleeps until the buffer can be full at the earliest (armed time plus
+        `fill_time`), then polls ACQ:TRig:FILL? with an interval doubling
+        from `poll_min` up to `poll_max`, so a slow trigger costs a few
+        queries per second instead of a busy loop.
 
-        self.rp.tx_txt(f'ACQ:TRig:LEV {trigger_level}')
-        self.rp.tx_txt(f'ACQ:TRig {trigger_source}')
-        self.rp.tx_txt('ACQ:START')
+        Parameters
+        ----------
+        timeout : float
+            in s, defaults to `trigger_timeout`
+        poll_min, poll_max : float
+            in s, default to the attributes of the same name
+        """
+        timeout = self.trigger_timeout if timeout is None else timeout
+        interval = self.poll_min if poll_min is None else poll_min
+        poll_max = self.poll_max if poll_max is None else poll_max
 
-        timeout = 5
-        start = time.time()
+        deadline = time.monotonic() + timeout
+        time.sleep(max(0.0, min(self._armed_at + self.fill_time(), deadline) - time.monotonic()))
 
         while True:
-            self.rp.tx_txt('ACQ:TRig:FILL?')
-            if self.rp.rx_txt().strip() == '1': #type: ignore
-                break
-            if time.time() - start > timeout:
+            with self.lock:
+                probe.count('read_data.fill_queries')
+                self.rp.tx_txt('ACQ:TRig:FILL?')
+                if self.rp.rx_txt().strip() == '1': #type: ignore
+                    return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
                 raise TimeoutError("Trigger timeout")
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, poll_max)
 
-        self.rp.tx_txt('ACQ:SOUR1:DATA?')
-        raw1 = self.rp.rx_txt().strip('{}\n\r') #type: ignore
-        y1 = np.array([float(s) for s in raw1.split(',')])
+    def read_data_future(self, callback=None, **kwargs):
+        """
+        Run `read_data` in a worker thread.
 
-        self.rp.tx_txt('ACQ:SOUR2:DATA?')
-        raw2 = self.rp.rx_txt().strip('{}\n\r') #type: ignore
-        y2 = np.array([float(s) for s in raw2.split(',')])
+        Returns a concurrent.futures.Future with the (y1, y2) result, `callback`
+        is called with the future when it is done. Takes the arguments of `read_data`.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rp-read')
+        future = self._executor.submit(self.read_data, **kwargs)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
 
+    def request_channels(self):
+        """
+        Request both channels at once, the replies are read back in order by `read_channels`.
+        """
+        with self.lock:
+            self.rp.tx_txt('ACQ:SOUR1:DATA?')
+            self.rp.tx_txt('ACQ:SOUR2:DATA?')
 
-        self.rp.tx_txt('ACQ:STOP')
+    def read_channels(self, to_volts=False, out=None, requested=False):
+        """
+        Read both channels of the last acquisition.
 
-        return y1, y2
+        Parameters
+        ----------
+        to_volts : bool
+            See `read_data`.
+        out : np.ndarray, optional
+            (2, n) float32 array the samples are decoded into, instead of
+            allocating new arrays. Returns the number of samples per channel then.
+        requested : bool
+            The data queries were already sent with `request_channels`.
+        """
+        if self.acquisition is None:
+            raise RuntimeError("Acquisition not configured, call arm() first")
+        data_units = self.acquisition['data_units']
+        data_format = self.acquisition['data_format']
+
+        with self.lock:
+            if not requested:
+                self.request_channels()
+            if out is None:
+                y1 = self._read_channel(1, data_units, data_format, to_volts)
+                y2 = self._read_channel(2, data_units, data_format, to_volts)
+                return y1, y2
+
+            n = 0
+            for i, channel in enumerate((1, 2)):
+                n = self._read_channel_into(out[i], channel, data_units, data_format, to_volts)
+            return n
+
+    def _read_channel(self, channel, data_units, data_format, to_volts):
+        """
+        Read and decode the reply to a pending ACQ:SOUR<channel>:DATA? query.
+        """
+        if data_format == 'ASCII':
+            raw = self.rp.rx_txt()
+            with probe.span('read_data.decode'):
+                y = scpi.scpi._decode_acq_ascii(raw)
+                if data_units == 'RAW' and to_volts:
+                    y = self.raw_to_volts(y, channel)
+            return y
+
+        buff = self.rp.rx_arb()
+        if buff is False:
+            raise ValueError(f"Invalid binary block received for channel {channel}")
+
+        with probe.span('read_data.decode'):
+            if data_units == 'RAW':
+                y = np.frombuffer(buff, dtype='>i2')
+                return self.raw_to_volts(y, channel) if to_volts else y.astype(np.int16)
+
+            return np.frombuffer(buff, dtype='>f4').astype(np.float32)
+
+    def _read_channel_into(self, out, channel, data_units, data_format, to_volts):
+        """
+        Like `_read_channel`, decoding into the preallocated row `out`.
+        Binary blocks are received into a buffer reused between calls.
+        """
+        if data_format == 'ASCII':
+            y = self._read_channel(channel, data_units, data_format, to_volts)
+            n = min(len(y), len(out))
+            out[:n] = y[:n]
+            return n
+
+        itemsize = 2 if data_units == 'RAW' else 4
+        if self._rx_buffer is None or len(self._rx_buffer) < len(out) * itemsize:
+            self._rx_buffer = bytearray(len(out) * itemsize)
+
+        buff = self.rp.rx_arb(out=self._rx_buffer)
+        if buff is False:
+            raise ValueError(f"Invalid binary block received for channel {channel}")
+
+        with probe.span('read_data.decode'):
+            y = np.frombuffer(buff, dtype='>i2' if data_units == 'RAW' else '>f4')
+            n = min(len(y), len(out))
+            if data_units == 'RAW' and to_volts:
+                gain, offset = self.calibration[channel]
+                np.multiply(y[:n], FULL_SCALE[self.input_gain[channel]] * gain / 2**(ADC_BITS - 1), out=out[:n], casting='unsafe')
+                out[:n] += offset
+            else:
+                out[:n] = y[:n]
+        return n
+
+    def _validate_units_format(self, data_units, data_format):
+        data_units = str(data_units).upper()
+        data_format = str(data_format).upper()
+        if data_units not in ('VOLTS', 'RAW'):
+            raise ValueError(f"data_units must be 'volts' or 'raw', got {data_units}")
+        if data_format not in ('ASCII', 'BIN'):
+            raise ValueError(f"data_format must be 'ascii' or 'bin', got {data_format}")
+        return data_units, data_format
 
     def close(self):
-        self.rp.close()
\ No newline at end of file
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self.lock:
+            self.rp.close()
\ No newline at end of file
@@ -0,0 +1,245 @@
+import time
+
+import numpy as np
+
+from rp_plot.framing import encode_frame
+from rp_plot.recorder import load_recording
+
+# Period (s) of a looped recording without a sample interval (one sample,
+# or all samples at the same time)
+MIN_PERIOD = 1e-3
+
+
+def _load(source):
+    """
+    (t, y, metadata) from a recording path or a (t, y) pair of arrays.
+    """
+    if isinstance(source, str):
+        return load_recording(source)
+    t, y = source
+    y = np.asarray(y, dtype=np.float32)
+    return np.asarray(t, dtype=np.float64), y.reshape(-1, len(t)), {}
+
+
+class ReplaySerial:
+    """
+    Serial port stand-in replaying a recording, for SerialPlot and
+    SerialReader (`is_open`, `in_waiting`, `read`, `readline`).
+
+    The samples are encoded as the device would send them, CSV lines or
+    binary frames, and become readable when their recorded time is reached:
+    at the recorded pace (speed=1), `speed` times faster, or all at once
+    (speed=None, `chunk` samples per read, for deterministic profiling).
+
+    Parameters
+    ----------
+    source : str or (t, y)
+        path of a recording (see rp_plot.recorder.load_recording) or arrays
+    speed : float
+        replay speed factor, None for as fast as possible
+    encoding : str
+        'csv' or 'binary' (float32 frames of `frame_samples`)
+    bunch : int
+        replay as oscilloscope bunches of this many samples, between
+        start/stop lines or as bunch frames (at most 8192 samples)
+    loop : bool
+        start over at the end of the recording
+    clock : callable
+        time source in s, time.monotonic by default
+    """
+    def __init__(self, source, speed=1.0, encoding='csv', bunch=None, loop=False, chunk=4096, frame_samples=64,
+                 precision=6, clock=time.monotonic, port='replay', baudrate=115200):
+        if encoding not in ('csv', 'binary'):
+            raise ValueError("encoding must be 'csv' or 'binary'")
+        self.t, self.y, self.metadata = _load(source)
+        self.speed = speed
+        self.encoding = encoding
+        self.bunch = bunch
+        self.loop = loop
+        self.chunk = chunk
+        self.frame_samples = frame_samples
+        self.precision = precision
+        self.clock = clock
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = None
+
+        n = len(self.t)
+        dt = np.median(np.diff(self.t)) if n > 1 else 0.0
+        self._times = self.t - self.t[0] if n else self.t
+        self._duration = (self._times[-1] + dt) if n else 0.0
+        if n and self._duration <= 0:
+            self._duration = MIN_PERIOD
+        self.is_open = False
+        self.open()
+
+    def open(self):
+        self.is_open = True
+        self._buf = bytearray()
+        self._next = 0
+        self._pass = 0
+        self.skipped_passes = 0
+        self._sequence = 0
+        self._started = self.clock()
+
+    def close(self):
+        self.is_open = False
+
+    @property
+    def finished(self):
+        return not self.loop and self._next == len(self.t) and not self._buf
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            return 0
+        self._release()
+        return len(self._buf)
+
+    def read(self, size=1):
+        self._release()
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+    def readline(self):
+        self._release()
+        end = self._buf.find(b'\n')
+        return self.read(end + 1 if end >= 0 else len(self._buf))
+
+    def write(self, data):
+        # Commands to the device are accepted and ignored
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._buf.clear()
+
+    def _release(self):
+        n = len(self.t)
+        if not self.is_open or n == 0:
+            return
+        restarted = False
+        while True:
+            if self.speed is None:
+                if self._buf:
+                    return
+                due = min(self._next + max(self.chunk, self.bunch or 0), n)
+            else:
+                elapsed = (self.clock() - self._started) * self.speed - self._pass * self._duration
+                due = int(np.searchsorted(self._times, elapsed, side='right'))
+            if self.bunch:
+                due = self._next + (due - self._next) // self.bunch * self.bunch if due < n else n
+
+            if due > self._next:
+                self._buf += self._encode(self._next, due)
+                self._next = due
+            if self._next < n or not self.loop:
+                return
+            self._next = 0
+            self._pass += 1
+            if restarted and self.speed is not None:
+                # At most one whole pass per call: the passes the reader
+                # fell behind are skipped instead of piling up in the buffer
+                behind = int(((self.clock() - self._started) * self.speed) // self._duration) - self._pass
+                if behind > 0:
+                    self._pass += behind
+                    self.skipped_passes += behind
+                return
+            restarted = True
+
+    def _encode(self, start, end):
+        if not self.bunch:
+            return self._encode_stream(start, end)
+        out = bytearray()
+        for pos in range(start, end, self.bunch):
+            stop = min(pos + self.bunch, end)
+            if self.encoding == 'csv':
+                out += b'start\n' + self._lines(pos, stop) + b'stop\n'
+            else:
+                out += self._frame(pos, stop, bunch=True)
+        return bytes(out)
+
+    def _encode_stream(self, start, end):
+        if self.encoding == 'csv':
+            return self._lines(start, end)
+        return b''.join(self._frame(pos, min(pos + self.frame_samples, end))
+                        for pos in range(start, end, self.frame_samples))
+
+    def _lines(self, start, end):
+        fmt = ','.join([f'%.{self.precision}g'] * self.y.shape[0]) + '\n'
+        return ''.join(fmt % tuple(row) for row in self.y[:, start:end].T.tolist()).encode()
+
+    def _frame(self, start, end, bunch=False):
+        frame = encode_frame(self.y[:, start:end].T, sequence=self._sequence, bunch=bunch, sample_type=3)
+        self._sequence += 1
+        return frame
+
+
+class ReplayRedPitaya:
+    """
+    RedPitaya stand-in returning the captures of a recording from
+    `read_data`, in order, at the recorded pace times `speed` (None for no
+    waiting).
+
+    Captures are told apart by the gaps between consecutive timestamps,
+    larger than `gap` sample intervals.
+
+    Parameters
+    ----------
+    source : str or (t, y)
+        path of a recording (see rp_plot.recorder.load_recording) or arrays
+    speed : float
+    loop : bool
+        start over after the last capture, otherwise read_data raises EOFError
+    """
+    def __init__(self, source, speed=1.0, loop=True, gap=1.5, clock=time.monotonic, sleep=time.sleep):
+        t, y, self.metadata = _load(source)
+        self.speed = speed
+        self.loop = loop
+        self.clock = clock
+        self.sleep = sleep
+
+        steps = np.diff(t)
+        dt = np.median(steps) if len(steps) else 0.0
+        bounds = np.flatnonzero((steps <= 0) | (steps > gap * dt)) + 1
+        edges = np.concatenate(([0], bounds, [len(t)]))
+        self.captures = [(t[a], y[:, a:b]) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+        self.sample_time = dt
+        self.index = 0
+        self._started = None
+        self._pass = 0
+        self._duration = (t[-1] - t[0] + dt) if len(t) else 0.0
+
+    def read_data(self, decimation=8, trigger_level=0.1, data_units='Volts', data_format='ascii', trigger_source='CH1_PE',
+                  to_volts=False, timeout=None, recorder=None):
+        """
+        Next recorded capture as (y1, y2), see RedPitaya.read_data. The
+        acquisition settings are ignored.
+        """
+        if self.index == len(self.captures):
+            if not self.loop or not self.captures:
+                raise EOFError("End of the recording.")
+            self.index = 0
+            self._pass += 1
+
+        timestamp, data = self.captures[self.index]
+        if self.speed is not None:
+            if self._started is None:
+                self._started = self.clock()
+            due = ((timestamp - self.captures[0][0]) + self._pass * self._duration) / self.speed
+            wait = due - (self.clock() - self._started)
+            if wait > 0:
+                self.sleep(wait)
+        self.index += 1
+
+        y1 = data[0].copy()
+        y2 = data[1].copy() if len(data) > 1 else np.full_like(y1, np.nan)
+        if recorder is not None:
+            recorder.write_capture(np.vstack((y1, y2)), time.time(), self.sample_time)
+        return y1, y2
+
+    def generate_signal(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        pass
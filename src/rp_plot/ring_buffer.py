@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed size buffer of timestamped multi-channel samples, for one writer
+    thread and one reader thread.
+
+    The writer stores samples and then advances `written`, the total number
+    of samples ever written. The reader never takes a lock: it copies the
+    samples it has not seen yet with `read_new`, and samples the writer
+    overwrote before they were copied are reported as lost.
+
+    Parameters
+    ----------
+    capacity : int
+        number of samples kept per channel
+    n_channels : int
+    """
+    def __init__(self, capacity, n_channels):
+        self.capacity = capacity
+        self.n_channels = n_channels
+        self.t = np.zeros(capacity)
+        self.y = np.full((n_channels, capacity), np.nan)
+        self.written = 0
+        self.lost = 0
+        # Advanced by the writer before it stores, marks slots that may be being replaced
+        self._reserved = 0
+
+    def append(self, t, values):
+        """
+        Store one sample, `values` holds one value per channel.
+        """
+        self._reserved = self.written + 1
+        i = self.written % self.capacity
+        self.t[i] = t
+        self.y[:, i] = values
+        self.written += 1
+
+    def extend(self, t, y):
+        """
+        Store a block of samples, t : (n,) and y : (n_channels, n).
+        """
+        n = len(t)
+        if n == 0:
+            return
+        if n > self.capacity:
+            t, y = t[-self.capacity:], y[:, -self.capacity:]
+            skipped, n = n - self.capacity, self.capacity
+        else:
+            skipped = 0
+
+        self._reserved = self.written + skipped + n
+        start = (self.written + skipped) % self.capacity
+        first = min(n, self.capacity - start)
+        self.t[start:start + first] = t[:first]
+        self.y[:, start:start + first] = y[:, :first]
+        if first < n:
+            self.t[:n - first] = t[first:]
+            self.y[:, :n - first] = y[:, first:]
+        self.written += skipped + n
+
+    def read_new(self, cursor):
+        """
+        Copy the samples written since `cursor` (a previous value of `written`).
+
+        Returns
+        -------
+        t, y, cursor, lost
+            copies of the new samples in chronological order, the cursor for
+            the next call, and the number of samples overwritten before they
+            could be read (also added to `lost`)
+        """
+        end = self.written
+        start = max(cursor, end - self.capacity)
+        t, y, overwritten = self._copy(start, end)
+
+        lost = start - cursor + overwritten
+        self.lost += lost
+        return t, y, end, lost
+
+    def snapshot(self, n=None):
+        """
+        Copy of the last `n` samples (all stored samples by default), oldest first.
+        """
+        end = self.written
+        n = min(end, self.capacity) if n is None else min(n, end, self.capacity)
+        t, y, _ = self._copy(end - n, end)
+        return t, y
+
+    def _copy(self, start, end):
+        idx = np.arange(start, end) % self.capacity
+        t = self.t[idx]
+        y = self.y[:, idx]
+
+        # Samples the writer replaced while they were being copied
+        overwritten = min(max(0, self._reserved - self.capacity - start), end - start)
+        if overwritten:
+            t, y = t[overwritten:], y[:, overwritten:]
+        return t, y, overwritten
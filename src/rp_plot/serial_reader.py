@@ -0,0 +1,129 @@
+import threading
+import time
+
+import numpy as np
+import serial
+
+from rp_comm.instrumentation import probe
+from rp_plot.framing import StreamDecoder
+from rp_plot.ring_buffer import RingBuffer
+
+
+class SerialReader:
+    """
+    Reads a serial port in a background thread.
+
+    CSV lines or binary frames are decoded as they arrive by a StreamDecoder
+    and stored in a RingBuffer, one row per channel, with time.monotonic()
+    times spread evenly between the previous read of the port and their
+    arrival. Lines between 'start' and 'stop' markers, or bunch
+    frames, form a bunch (oscilloscope mode), the last complete one is taken
+    with `latest_bunch`. Values that are not numbers are stored as NaN.
+
+    The thread owns the port while it runs, other threads open, close or
+    reconfigure it inside `with reader.port_lock:`.
+
+    Parameters
+    ----------
+    port : serial.Serial
+        may be closed, it is read once opened
+    n_channels : int
+    capacity : int
+        samples kept per channel
+    poll_interval : float
+        in s, sleep when no bytes are waiting
+    """
+    def __init__(self, port, n_channels=2, capacity=100000, poll_interval=0.001):
+        self.port = port
+        self.n_channels = n_channels
+        self.ring = RingBuffer(capacity, n_channels)
+        self.parser = StreamDecoder(n_channels)
+        self.poll_interval = poll_interval
+        self.port_lock = threading.Lock()
+
+        # Counters
+        self.serial_errors = 0
+        self.bunches = 0
+        self.bunches_dropped = 0
+
+        self._latest_bunch = None
+        self._last_read = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='serial-reader', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def latest_bunch(self):
+        """
+        Last complete bunch as a (rows, n_channels) float32 array, or None if
+        there is no new one since the previous call.
+        """
+        bunch, self._latest_bunch = self._latest_bunch, None
+        return bunch
+
+    def stats(self):
+        return dict(
+            lines=self.parser.lines,
+            samples=self.ring.written,
+            lost=self.ring.lost,
+            parse_errors=self.parser.malformed,
+            frames=self.parser.binary.frames,
+            crc_errors=self.parser.binary.crc_errors,
+            frames_lost=self.parser.binary.lost,
+            serial_errors=self.serial_errors,
+            bunches=self.bunches,
+            bunches_dropped=self.bunches_dropped,
+        )
+
+    def _run(self):
+        while not self._stop.is_set():
+            chunk = b''
+            with self.port_lock:
+                try:
+                    if self.port.is_open and self.port.in_waiting:
+                        chunk = self.port.read(self.port.in_waiting)
+                except (serial.SerialException, OSError):
+                    self.serial_errors += 1
+                    self.parser.reset()
+            now = time.monotonic()
+            if chunk:
+                self.feed(chunk, now)
+            else:
+                self._last_read = now
+                time.sleep(self.poll_interval)
+
+    def feed(self, chunk, t):
+        """
+        Parse bytes received at time `t`, the samples they complete are
+        stamped with times spread up to `t` from the previous read.
+        """
+        with probe.span('serial.parse'):
+            rows, bunches = self.parser.feed(chunk)
+        probe.count('serial.bytes', len(chunk))
+        for bunch in bunches:
+            self._publish_bunch(bunch)
+        if len(rows):
+            start = t if self._last_read is None else self._last_read
+            self.ring.extend(np.linspace(start, t, len(rows) + 1)[1:], rows.T)
+        self._last_read = t
+
+    def _publish_bunch(self, bunch):
+        if self._latest_bunch is not None:
+            self.bunches_dropped += 1
+        self._latest_bunch = bunch.astype(np.float32)
+        self.bunches += 1
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The packages are imported from src/, as the app and the benchmarks do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from rp_comm.fake_redpitaya import FakeRedPitaya  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    with FakeRedPitaya() as server:
+        yield server
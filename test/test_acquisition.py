@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+import pytest
+
+from rp_plot.acquisition import AcquisitionEngine, FrameBuffer
+from rp_plot.redpitaya import RedPitaya
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def rp(server):
+    rp = RedPitaya(server.host, port=server.port)
+    rp.rp.tx_txt('OUTPUT1:STATE ON')
+    yield rp
+    rp.close()
+
+
+def test_frame_buffer_swap():
+    buffer = FrameBuffer(samples=4)
+    assert buffer.latest() is None
+
+    frame = buffer.write_frame()
+    frame.data[0] = 1
+    buffer.publish()
+    # The writer gets another frame while the published one waits for the reader
+    assert buffer.write_frame() is not frame
+    assert buffer.latest() is frame
+    assert buffer.latest() is None
+
+    # The reader keeps its frame until the next call
+    buffer.write_frame().data[0] = 2
+    buffer.publish()
+    assert buffer.write_frame() is not frame
+    assert buffer.latest().data[0, 0] == 2
+
+
+def test_frame_buffer_drops_unread_frames():
+    buffer = FrameBuffer(samples=4)
+    for i in range(3):
+        buffer.write_frame().index = i
+        buffer.publish()
+    assert buffer.latest().index == 2
+    assert buffer.published == 3 and buffer.dropped == 2
+
+
+def test_engine_frames(rp):
+    engine = AcquisitionEngine(rp, decimation=1, trigger_level=0.0, trigger_source='NOW')
+    engine.start()
+    try:
+        wait_for(lambda: engine.frames >= 3)
+        frame = None
+        while frame is None:
+            frame = engine.latest()
+    finally:
+        engine.stop(5)
+    assert frame.length == 16384
+    expected, _ = rp.read_data(decimation=1, trigger_level=0.0, trigger_source='NOW', data_format='bin')
+    np.testing.assert_allclose(frame.channel(0), expected, atol=1e-6)
+    stats = engine.stats()
+    assert stats['frames'] == stats['published'] >= 3
+    assert stats['timeouts'] == 0 and stats['error'] is None
+
+
+def test_engine_rearms_after_timeout(server, rp):
+    server.board.trigger_delay = 60
+    engine = AcquisitionEngine(rp, decimation=1, trigger_level=0.0, trigger_source='NOW', timeout=0.05)
+    engine.start()
+    try:
+        wait_for(lambda: engine.stats()['timeouts'] >= 1)
+        started = server.board.acq_started
+        wait_for(lambda: engine.stats()['timeouts'] >= 2)
+        # Every timeout started a new acquisition
+        assert server.board.acq_started > started
+        assert engine.frames == 0
+
+        server.board.trigger_delay = 0
+        wait_for(lambda: engine.frames >= 1)
+    finally:
+        engine.stop(5)
+    assert engine.stats()['error'] is None
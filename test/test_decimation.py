@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from rp_plot.decimation import decimate, lttb, minmax
+
+
+@pytest.fixture
+def signal():
+    x = np.arange(10007, dtype=float)
+    y = np.random.default_rng(0).normal(size=len(x))
+    return x, y
+
+
+@pytest.mark.parametrize('method', [minmax, lttb])
+@pytest.mark.parametrize('n_out', [4, 100, 1000, 5002])
+def test_length_and_endpoints(signal, method, n_out):
+    x, y = signal
+    xs, ys = method(x, y, n_out)
+    assert len(xs) == len(ys) == n_out
+    assert xs[0] == x[0] and xs[-1] == x[-1]
+    assert (np.diff(xs) > 0).all()
+    # The points are samples of the input
+    np.testing.assert_array_equal(ys, y[xs.astype(int)])
+
+
+@pytest.mark.parametrize('method', [minmax, lttb])
+def test_pass_through(signal, method):
+    x, y = signal[0][:100], signal[1][:100]
+    for n_out in (100, 200):
+        xs, ys = method(x, y, n_out)
+        assert xs is x and ys is y
+
+
+def test_minmax_keeps_peaks(signal):
+    x, y = signal
+    y = y.copy()
+    y[[1234, 7777]] = 10, -10
+    _, ys = minmax(x, y, 100)
+    assert ys.max() == 10 and ys.min() == -10
+
+
+def test_minmax_odd_n_out(signal):
+    xs, _ = minmax(*signal, 101)
+    assert len(xs) == 100
+
+
+def test_lttb_follows_a_line():
+    x = np.linspace(0, 1, 1000)
+    xs, ys = lttb(x, 3 * x, 50)
+    np.testing.assert_allclose(ys, 3 * xs)
+
+
+def test_decimate_none(signal):
+    x, y = signal
+    xs, ys = decimate(x, y, 10, None)
+    assert xs is x and ys is y
@@ -0,0 +1,12 @@
+import importlib
+import sys
+
+from rp_plot import fake_serial
+
+
+def test_imports_without_tty(monkeypatch):
+    # As on Windows, where only PtySerialDevice is unavailable
+    monkeypatch.setitem(sys.modules, 'tty', None)
+    module = importlib.reload(fake_serial)
+    port = module.FakeSerialPort(line_rate=1000)
+    assert port.is_open
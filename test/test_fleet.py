@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from rp_comm.fake_redpitaya import FakeRedPitaya
+from rp_plot.fleet import Fleet, _split_address
+
+SETTINGS = dict(decimation=64, trigger_level=0.0, trigger_source='NOW', data_format='bin')
+
+
+class BrokenSocket:
+    def sendall(self, data):
+        raise ConnectionResetError("connection reset")
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('rp-f0c5e4.local', ('rp-f0c5e4.local', 5000)),
+    ('192.168.1.101:5001', ('192.168.1.101', 5001)),
+    ('fe80::1', ('fe80::1', 5000)),
+    ('[fe80::1]', ('fe80::1', 5000)),
+    ('[fe80::1]:5001', ('fe80::1', 5001)),
+])
+def test_split_address(address, expected):
+    assert _split_address(address, 5000) == expected
+
+
+@pytest.mark.parametrize('address', ['[fe80::1', '[fe80::1]5001'])
+def test_split_invalid_address(address):
+    with pytest.raises(ValueError):
+        _split_address(address, 5000)
+
+
+@pytest.fixture
+def fleet():
+    with FakeRedPitaya() as left, FakeRedPitaya() as right:
+        hosts = {'left': f'{left.host}:{left.port}', 'right': f'{right.host}:{right.port}'}
+        with Fleet(hosts) as fleet:
+            yield fleet, left, right
+
+
+def test_read_data(fleet):
+    fleet, _, _ = fleet
+    fleet.generate_signal(channel=1, frequency=10000)
+    capture = fleet.read_data(**SETTINGS)
+    assert capture.ok
+    names, timestamps, data = capture.aligned()
+    assert names == ['left', 'right'] and data.shape == (2, 2, 16384)
+    np.testing.assert_array_equal(data[0], data[1])
+
+
+def test_board_failing_to_arm(fleet):
+    fleet, _, _ = fleet
+    fleet['left'].rp._socket = BrokenSocket()
+    capture = fleet.read_data(**SETTINGS)
+    assert list(capture.errors) == ['left']
+    assert isinstance(capture.errors['left'], ConnectionResetError)
+    assert capture['right'].y.shape == (2, 16384)
+    names, _, _ = capture.aligned()
+    assert names == ['right']
+
+
+def test_board_timing_out(fleet):
+    fleet, left, _ = fleet
+    left.board.trigger_delay = 60
+    capture = fleet.read_data(timeout=0.2, **SETTINGS)
+    assert isinstance(capture.errors['left'], TimeoutError)
+    assert capture['right'].error is None and capture['right'].y.shape == (2, 16384)
+
+    # The board that timed out captures again with the next trigger
+    left.board.trigger_delay = 0
+    assert fleet.read_data(timeout=5, **SETTINGS).ok
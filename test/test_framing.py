@@ -0,0 +1,102 @@
+import numpy as np
+
+from rp_plot.framing import FrameDecoder, StreamDecoder, encode_frame
+
+
+def feed_all(parser, data, size):
+    rows, bunches = [], []
+    for i in range(0, len(data), size):
+        r, b = parser.feed(data[i:i + size])
+        rows.append(r)
+        bunches += b
+    return np.concatenate(rows), bunches
+
+
+def frames(count, samples=16, start=0):
+    values = np.arange(count * samples * 2).reshape(count, samples, 2) % 1000
+    return values, [encode_frame(v, sequence=start + i) for i, v in enumerate(values)]
+
+
+def test_frames_any_chunking():
+    values, encoded = frames(10)
+    data = b''.join(encoded)
+    for size in (1, 5, 100, len(data)):
+        decoder = FrameDecoder(2)
+        rows, _ = feed_all(decoder, data, size)
+        np.testing.assert_array_equal(rows, values.reshape(-1, 2))
+        assert decoder.frames == 10 and decoder.crc_errors == 0 and decoder.lost == 0
+
+
+def test_frame_crc_error_resync():
+    values, encoded = frames(3)
+    corrupted = bytearray(encoded[1])
+    corrupted[20] ^= 0xFF
+    decoder = FrameDecoder(2)
+    rows, _ = decoder.feed(encoded[0] + bytes(corrupted) + encoded[2])
+    np.testing.assert_array_equal(rows, values[[0, 2]].reshape(-1, 2))
+    assert decoder.crc_errors == 1
+    assert decoder.lost == 1
+
+
+def test_frame_resync_after_garbage():
+    values, encoded = frames(2)
+    decoder = FrameDecoder(2)
+    rows, _ = decoder.feed(b'\x00\xa5garbage' + encoded[0] + b'\xa5' + encoded[1])
+    np.testing.assert_array_equal(rows, values.reshape(-1, 2))
+    assert decoder.skipped == 10
+
+
+def test_frame_sequence_wraps():
+    _, encoded = frames(3, start=0xFFFE)
+    decoder = FrameDecoder(2)
+    decoder.feed(b''.join(encoded))
+    assert decoder.lost == 0
+
+
+def test_frame_channels_and_bunches():
+    decoder = FrameDecoder(2)
+    rows, bunches = decoder.feed(encode_frame(np.ones((4, 3)), bunch=True) + encode_frame(np.ones(4), sequence=1))
+    assert bunches[0].shape == (4, 2)
+    assert np.isnan(rows[:, 1]).all()
+
+
+def test_stream_decoder_switches_mode():
+    decoder = StreamDecoder(2, ascii_after=16)
+    rows, _ = decoder.feed(b'1,2\n' + encode_frame(np.full((2, 2), 3)))
+    np.testing.assert_array_equal(rows, [[1, 2], [3, 3], [3, 3]])
+    assert decoder.mode == 'binary'
+    rows, _ = decoder.feed(b''.join(b'%d,%d\n' % (i, i) for i in range(20)))
+    assert decoder.mode == 'ascii'
+    assert len(rows)
+
+
+def test_stream_decoder_resync_after_garbage():
+    values, encoded = frames(2)
+    data = b'1,2\n\xa5\x00\xa5\x5a\xff\xff' + encoded[0] + encoded[1]
+    for size in (1, 7, len(data)):
+        decoder = StreamDecoder(2)
+        rows, _ = feed_all(decoder, data, size)
+        # The noise goes to the CSV parser, the frames are decoded
+        assert decoder.mode == 'binary'
+        np.testing.assert_array_equal(rows[0], [1, 2])
+        np.testing.assert_array_equal(rows[-32:], values.reshape(-1, 2))
+
+
+def test_stream_decoder_rejects_bad_crc():
+    _, encoded = frames(1)
+    corrupted = bytearray(encoded[0])
+    corrupted[-1] ^= 0xFF
+    decoder = StreamDecoder(2)
+    rows, _ = decoder.feed(b'1,2\n' + bytes(corrupted) + b'\n3,4\n')
+    assert decoder.mode == 'ascii'
+    np.testing.assert_array_equal(rows[[0, -1]], [[1, 2], [3, 4]])
+
+
+def test_stream_decoder_stray_sync_byte_in_csv():
+    data = b'1,2\n3,\xa54\n5,6\n\xa5\n7,8\n'
+    for size in (1, 3, len(data)):
+        decoder = StreamDecoder(2)
+        rows, _ = feed_all(decoder, data, size)
+        assert decoder.mode == 'ascii'
+        np.testing.assert_array_equal(rows[[0, 2, -1]], [[1, 2], [5, 6], [7, 8]])
+        assert decoder.malformed >= 1
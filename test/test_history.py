@@ -0,0 +1,68 @@
+import numpy as np
+
+from rp_plot.history import HistoryStore
+
+
+def block(start, n, channels=2):
+    t = np.arange(start, start + n, dtype=float)
+    return t, np.vstack([t + 1000 * i for i in range(channels)])
+
+
+def test_extend_wraps_around():
+    store = HistoryStore(8, 2)
+    store.extend(*block(0, 6))
+    store.extend(*block(6, 5))
+    t, y = store.last()
+    np.testing.assert_array_equal(t, np.arange(3, 11))
+    np.testing.assert_array_equal(y[1], np.arange(3, 11) + 1000)
+    assert len(store) == 8
+
+
+def test_append_wraps_around():
+    store = HistoryStore(3, 2)
+    for i in range(7):
+        store.append(i, (i, -i))
+    t, y = store.last()
+    np.testing.assert_array_equal(t, [4, 5, 6])
+    np.testing.assert_array_equal(y, [[4, 5, 6], [-4, -5, -6]])
+
+
+def test_block_larger_than_capacity():
+    store = HistoryStore(4, 1)
+    store.extend(*block(0, 3, 1))
+    store.extend(*block(3, 10, 1))
+    t, _ = store.last()
+    np.testing.assert_array_equal(t, [9, 10, 11, 12])
+
+
+def test_last_returns_contiguous_views():
+    store = HistoryStore(8, 2)
+    for start in range(0, 50, 7):
+        store.extend(*block(start, 7))
+        t, y = store.last(5)
+        # Views into the store, whatever the position of the head
+        assert t.base is store.t and y.base is store.y
+        assert t.flags['C_CONTIGUOUS'] and y[0].flags['C_CONTIGUOUS']
+        np.testing.assert_array_equal(t, np.arange(start + 2, start + 7))
+
+
+def test_resize_keeps_latest():
+    store = HistoryStore(8, 2)
+    store.extend(*block(0, 11))
+    store.resize(4)
+    t, y = store.last()
+    np.testing.assert_array_equal(t, [7, 8, 9, 10])
+    store.resize(16)
+    store.extend(*block(11, 2))
+    t, _ = store.last()
+    np.testing.assert_array_equal(t, [7, 8, 9, 10, 11, 12])
+
+
+def test_measure_ignores_nan():
+    store = HistoryStore(8, 2)
+    y = np.array([[1, np.nan, -1, 3], [np.nan] * 4])
+    store.extend(np.arange(4.0), y)
+    m = store.measure()
+    assert m['samples'] == 4 and m['duration'] == 3
+    np.testing.assert_allclose(m['vpp'], [4, np.nan])
+    np.testing.assert_allclose(m['mean'], [1, np.nan])
@@ -0,0 +1,61 @@
+import numpy as np
+
+from rp_plot.lod import LODPyramid
+
+
+def stream(pyramid, blocks, size, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(blocks * size, dtype=float)
+    y = rng.normal(size=(2, len(t)))
+    for start in range(0, len(t), size):
+        pyramid.extend(t[start:start + size], y[:, start:start + size])
+    return t, y
+
+
+def test_drop_keeps_close_to_capacity():
+    pyramid = LODPyramid(2, capacity=100000)
+    t, y = stream(pyramid, 30, 10000)
+    assert len(pyramid) + pyramid.dropped == len(t)
+    assert 50000 <= len(pyramid) <= 100000
+    np.testing.assert_array_equal(pyramid.t[:len(pyramid)], t[-len(pyramid):])
+
+    # The levels match a pyramid built from the samples kept
+    fresh = LODPyramid(2, capacity=100000)
+    fresh.extend(pyramid.t[:len(pyramid)], pyramid.y[:, :len(pyramid)])
+    assert len(pyramid.levels) == len(fresh.levels)
+    for level, expected in zip(pyramid.levels, fresh.levels):
+        assert level[4] == expected[4]
+        for j in range(4):
+            np.testing.assert_array_equal(level[j][:, :level[4]], expected[j][:, :level[4]])
+
+
+def test_query_raw_window():
+    pyramid = LODPyramid(2, capacity=10000)
+    t, y = stream(pyramid, 1, 5000)
+    (x0, y0), (x1, y1) = pyramid.query(100, 199, 1000)
+    # One more sample on each side
+    np.testing.assert_array_equal(x0, t[99:201])
+    np.testing.assert_array_equal(y1, y[1, 99:201])
+
+
+def test_query_coarse_levels():
+    pyramid = LODPyramid(2, capacity=100000)
+    t, y = stream(pyramid, 30, 10000)
+    n = len(pyramid)
+    kept = pyramid.y[:, :n]
+    for x0, x1 in [pyramid.span, (t[-n] + 1000, t[-n] + 41000)]:
+        lo, hi = pyramid.index(x0, x1)
+        for i, (x, v) in enumerate(pyramid.query(x0, x1, 500)):
+            assert 0 < len(x) <= 500
+            assert (np.diff(x) >= 0).all()
+            # Whole entries of the level, they may start before the window
+            assert pyramid.span[0] <= x[0] and x[-1] <= pyramid.span[1]
+            # The envelope of the window is kept
+            assert v.max() >= kept[i, lo:hi].max() and v.min() <= kept[i, lo:hi].min()
+
+
+def test_larger_block_than_capacity():
+    pyramid = LODPyramid(1, capacity=1000)
+    pyramid.extend(np.arange(2500.0), np.arange(2500.0)[None])
+    assert len(pyramid) == 1000 and pyramid.dropped == 1500
+    assert pyramid.span == (1500.0, 2499.0)
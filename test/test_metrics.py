@@ -0,0 +1,78 @@
+import asyncio
+import re
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application
+
+from rp_comm.instrumentation import Probe
+from rp_plot.metrics import CONTENT_TYPE, collect, metrics_route
+from rp_plot.redpitaya import RedPitaya
+
+SAMPLE = re.compile(r'([a-zA-Z_:][a-zA-Z0-9_:]*)(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? (\S+)')
+
+
+def parse(text):
+    """
+    Samples of Prometheus exposition text, as (name, labels, value), checking
+    that every family is declared once with HELP and TYPE before its samples.
+    """
+    assert text.endswith('\n')
+    types, samples = {}, []
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            assert name not in types and kind in ('counter', 'gauge', 'summary', 'histogram', 'untyped')
+            types[name] = kind
+            continue
+        match = SAMPLE.fullmatch(line)
+        assert match, line
+        name, labels, value = match.group(1), match.group(2) or '', float(match.group(5))
+        family = re.sub(r'_(sum|count)$', '', name) if name not in types else name
+        assert family in types, name
+        samples.append((name, labels, value))
+    return types, samples
+
+
+def test_collect_probe_spans(server):
+    probe = Probe(enabled=True)
+    for ns in (1000, 2000, 400000):
+        probe.record('scpi.rx_txt', ns)
+    probe.count('read_data.fill_queries', 3)
+    rp = RedPitaya(server.host, port=server.port)
+    types, samples = parse(collect(rp=rp, probe=probe))
+    rp.close()
+
+    assert types['rp_span_duration_seconds'] == 'summary'
+    spans = {(n, l): v for n, l, v in samples if n.startswith('rp_span_duration_seconds')}
+    assert spans[('rp_span_duration_seconds_count', '{span="scpi.rx_txt"}')] == 3
+    assert 0 < spans[('rp_span_duration_seconds_sum', '{span="scpi.rx_txt"}')] < 1e-3
+    quantiles = [v for (n, l), v in spans.items() if 'quantile=' in l]
+    assert len(quantiles) == 3 and quantiles == sorted(quantiles)
+    assert ('rp_probe_total', '{counter="read_data.fill_queries"}', 3) in samples
+    assert ('rp_scpi_errors', '', 0) in samples
+
+
+def test_metrics_route():
+    probe = Probe(enabled=True)
+    probe.record('acquisition.transfer', 5000)
+
+    async def get():
+        app = Application([metrics_route(probe=probe)])
+        sockets = bind_sockets(0, '127.0.0.1')
+        server = HTTPServer(app)
+        server.add_sockets(sockets)
+        port = sockets[0].getsockname()[1]
+        try:
+            return await AsyncHTTPClient().fetch(f'http://127.0.0.1:{port}/metrics')
+        finally:
+            server.stop()
+
+    response = asyncio.run(get())
+    assert response.code == 200
+    assert response.headers['Content-Type'] == CONTENT_TYPE
+    _, samples = parse(response.body.decode())
+    assert ('rp_span_duration_seconds_count', '{span="acquisition.transfer"}', 1) in samples
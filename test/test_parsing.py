@@ -0,0 +1,47 @@
+import numpy as np
+
+from rp_plot.parsing import CSVParser
+
+
+def feed_all(parser, data, size):
+    rows, bunches = [], []
+    for i in range(0, len(data), size):
+        r, b = parser.feed(data[i:i + size])
+        rows.append(r)
+        bunches += b
+    return np.concatenate(rows), bunches
+
+
+def test_csv_any_chunking():
+    values = np.round(np.random.default_rng(0).normal(size=(500, 2)), 4)
+    data = ''.join(f'{a},{b}\n' for a, b in values).encode()
+    for size in (1, 7, 64, len(data)):
+        rows, bunches = feed_all(CSVParser(2), data, size)
+        np.testing.assert_allclose(rows, values)
+        assert bunches == []
+
+
+def test_csv_partial_line_kept():
+    parser = CSVParser(2)
+    rows, _ = parser.feed(b'1,2\n3,')
+    np.testing.assert_array_equal(rows, [[1, 2]])
+    rows, _ = parser.feed(b'4\r\n')
+    np.testing.assert_array_equal(rows, [[3, 4]])
+
+
+def test_csv_malformed_lines():
+    parser = CSVParser(2)
+    rows, _ = parser.feed(b'1,2\nfoo,3\n4\n\n5,6,7\n')
+    np.testing.assert_array_equal(rows, [[1, 2], [np.nan, 3], [4, np.nan], [5, 6]])
+    assert parser.malformed == 2
+
+
+def test_csv_bunches():
+    parser = CSVParser(2)
+    rows, bunches = parser.feed(b'1,1\nstart\n2,2\n3,3\nstop\n4,4\nstart\n5,5\n')
+    np.testing.assert_array_equal(rows, [[1, 1], [4, 4]])
+    assert len(bunches) == 1
+    np.testing.assert_array_equal(bunches[0], [[2, 2], [3, 3]])
+    # The open bunch completes with a later chunk
+    rows, bunches = parser.feed(b'stop\n')
+    np.testing.assert_array_equal(bunches[0], [[5, 5]])
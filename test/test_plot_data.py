@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+from bokeh.plotting import figure
+
+from rp_plot.plot_data import SerialPlot
+
+
+class Port:
+    """Serial port returning the bytes put in `data`."""
+    is_open = True
+
+    def __init__(self):
+        self.data = b''
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def read(self, size=1):
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+def test_real_time_samples_spread_between_reads():
+    port = Port()
+    plot = SerialPlot(figure(), port, n_plots=2, rp=object())
+    queued = []
+    plot.queue_samples = lambda x, y: queued.append(x)
+
+    time.sleep(0.01)
+    port.data = b'1,2\n3,4\n5,6\n7,8\n'
+    plot.update_real_time()
+    x, = queued
+    # Evenly spaced from the start up to the read
+    np.testing.assert_allclose(np.diff(x), x[0])
+    assert x[0] > 0
+
+    time.sleep(0.01)
+    plot.update_real_time()
+    assert len(queued) == 1
+    # The read without samples is the start of the next ones
+    empty_read = plot._last_read
+    assert empty_read - x[-1] >= 0.01
+    time.sleep(0.01)
+    port.data = b'9,10\n11,12\n'
+    plot.update_real_time()
+    x2 = queued[1]
+    np.testing.assert_allclose(np.diff(x2), x2[0] - empty_read)
@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+import pytest
+
+from rp_plot.recorder import Recorder, load_recording
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'run')
+    t = np.arange(1000) * 1e-3
+    y = np.vstack((np.sin(t), np.cos(t)))
+    with Recorder(path, metadata=dict(decimation=8), max_bytes=300 * 16) as recorder:
+        for start in range(0, 1000, 100):
+            assert recorder.write(t[start:start + 100], y[:, start:start + 100])
+    assert len(recorder.files) == 4
+
+    t2, y2, metadata = load_recording(path)
+    np.testing.assert_array_equal(t2, t)
+    np.testing.assert_allclose(y2, y.astype(np.float32))
+    assert metadata['decimation'] == 8
+    assert metadata['channel_names'] == ['ch1', 'ch2']
+
+    # A single segment loads on its own
+    t3, _, metadata = load_recording(recorder.files[1])
+    np.testing.assert_array_equal(t3, t[300:600])
+    assert metadata['segment'] == 1
+
+
+def test_capture_round_trip(tmp_path):
+    path = str(tmp_path / 'capture')
+    data = np.arange(20, dtype=np.float32).reshape(2, 10)
+    with Recorder(path) as recorder:
+        recorder.write_capture(data, 100.0, 0.5)
+    t, y, _ = load_recording(path)
+    np.testing.assert_array_equal(t, 100.0 + np.arange(10) * 0.5)
+    np.testing.assert_array_equal(y, data)
+
+
+def test_older_recording_ignored(tmp_path):
+    path = str(tmp_path / 'run')
+    with Recorder(path, max_bytes=10 * 16) as recorder:
+        recorder.write(np.arange(30.0), np.zeros((2, 30)))
+    with Recorder(path, max_bytes=10 * 16) as recorder:
+        recorder.write(np.arange(15.0), np.ones((2, 15)))
+    t, y, _ = load_recording(path)
+    assert len(t) == 15 and (y == 1).all()
+
+
+def test_missing_recording(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_recording(str(tmp_path / 'none'))
+
+
+def test_writer_error(tmp_path):
+    recorder = Recorder(str(tmp_path / 'missing' / 'run'), queue_size=2)
+    recorder.write(np.arange(10.0), np.zeros((2, 10)))
+    recorder._thread.join(5)
+    assert recorder.error is not None
+    # Blocks are refused, and close() does not wait for the dead writer
+    assert not recorder.write(np.arange(10.0), np.zeros((2, 10)))
+    assert not recorder.write(np.arange(10.0), np.zeros((2, 10)))
+    start = time.monotonic()
+    recorder.close()
+    assert time.monotonic() - start < 1
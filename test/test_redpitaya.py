@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+import pytest
+
+from rp_plot.redpitaya import RedPitaya
+
+SETTINGS = dict(decimation=64, trigger_level=0.0, trigger_source='NOW')
+
+
+@pytest.fixture
+def rp(server):
+    rp = RedPitaya(server.host, port=server.port)
+    rp.rp.tx_txt('OUTPUT1:STATE ON')
+    yield rp
+    rp.close()
+
+
+def test_read_data_ascii_default(rp):
+    y1, y2 = rp.read_data(**SETTINGS)
+    assert len(y1) == len(y2) == 16384
+    assert y1.dtype == np.float64
+    assert np.abs(y1).max() == pytest.approx(1.0, abs=1e-3)
+    assert not y2.any()
+
+
+def test_read_data_bin_matches_ascii(rp):
+    ascii1, _ = rp.read_data(**SETTINGS)
+    y1, y2 = rp.read_data(data_format='bin', **SETTINGS)
+    assert y1.dtype == np.float32
+    np.testing.assert_allclose(y1, ascii1, atol=1e-6)
+
+
+@pytest.mark.parametrize('data_format', ['ascii', 'bin'])
+def test_read_data_raw(rp, data_format):
+    volts, _ = rp.read_data(data_format='bin', **SETTINGS)
+    raw, _ = rp.read_data(data_units='raw', data_format=data_format, **SETTINGS)
+    # RAW codes unless a conversion is asked for
+    np.testing.assert_array_equal(raw, np.clip(np.round(volts * 2**13), -2**13, 2**13 - 1))
+
+    rp.set_calibration(channel=1, gain=2.0, offset=0.1)
+    y1, _ = rp.read_data(data_units='raw', data_format=data_format, to_volts=True, **SETTINGS)
+    assert y1.dtype == np.float32
+    np.testing.assert_allclose(y1, raw / 2**13 * 2.0 + 0.1, atol=1e-6)
+
+    rp.set_calibration(channel=1, gain=2.0, offset=0.1, input_gain='HV')
+    y1, _ = rp.read_data(data_units='raw', data_format=data_format, to_volts=True, **SETTINGS)
+    np.testing.assert_allclose(y1, raw / 2**13 * 20.0 * 2.0 + 0.1, rtol=1e-6, atol=1e-6)
+
+
+def test_invalid_ascii_reply(rp):
+    rp.arm(**SETTINGS)
+    rp.wait_filled()
+    rp.rp.tx_txt('ACQ:SOUR1:DATA?')
+    rp.rp.rx_txt()
+    rp.rp.tx_txt('*IDN?')
+    with pytest.raises(ValueError):
+        rp._read_channel(1, 'VOLTS', 'ASCII', False)
+
+
+def test_wait_filled_timeout(server, rp):
+    server.board.trigger_delay = 60
+    rp.arm(**SETTINGS)
+    rp.rp.txrx_txt('*OPC?')
+    commands = server.stats['commands']
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        rp.wait_filled(timeout=0.2)
+    assert 0.2 <= time.monotonic() - start < 1
+    # The poll interval grows up to poll_max, a few queries instead of a busy loop
+    assert server.stats['commands'] - commands <= 0.2 / rp.poll_max + 15
+
+
+def test_wait_filled_after_trigger_delay(server, rp):
+    server.board.trigger_delay = 0.1
+    rp.arm(**SETTINGS)
+    start = time.monotonic()
+    rp.wait_filled(timeout=5)
+    assert time.monotonic() - start >= 0.1
+
+
+def test_wait_filled_already_filled(server, rp):
+    server.board.trigger_delay = 0.1
+    rp.arm(**SETTINGS)
+    rp.rp.txrx_txt('*OPC?')
+    time.sleep(0.15)
+    commands = server.stats['commands']
+    start = time.monotonic()
+    rp.wait_filled(timeout=5)
+    # Returns on the first query
+    assert time.monotonic() - start < 0.05
+    assert server.stats['commands'] == commands + 1
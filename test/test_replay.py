@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+import pytest
+from bokeh.plotting import figure
+
+from rp_plot.plot_data import SerialPlot
+from rp_plot.recorder import Recorder
+from rp_plot.replay import ReplaySerial
+
+
+def test_replay_recording(tmp_path):
+    path = str(tmp_path / 'run')
+    t = np.arange(50) * 1e-3
+    with Recorder(path) as recorder:
+        recorder.write(t, np.vstack((t, -t)))
+    port = ReplaySerial(path, speed=None, chunk=20)
+    data = b''
+    while not port.finished:
+        data += port.read(port.in_waiting)
+    assert data.count(b'\n') == 50
+
+
+def test_replay_single_sample_loop():
+    now = [0.0]
+    port = ReplaySerial((np.zeros(1), np.ones((2, 1))), loop=True, clock=lambda: now[0])
+    assert port.in_waiting
+    now[0] = 10.0
+    # Returns instead of spinning, the passes fallen behind are skipped
+    lines = port.read(port.in_waiting).count(b'\n')
+    assert lines <= 3
+    assert port.skipped_passes > 0
+
+
+@pytest.mark.parametrize('encoding', ['csv', 'binary'])
+def test_recording_through_serial_plot(tmp_path, encoding):
+    path = str(tmp_path / 'run')
+    t = 1000 + np.arange(100) * 5e-3
+    y = np.vstack((np.sin(t), np.cos(t))).astype(np.float32)
+    with Recorder(path) as recorder:
+        recorder.write(t, y)
+
+    port = ReplaySerial(path, encoding=encoding)
+    plot = SerialPlot(figure(), port, n_plots=2, rp=object())
+    # The replay and the plot start together
+    port.open()
+    plot.start = time.time()
+    xs, ys = [], []
+    plot.queue_samples = lambda x, values: (xs.append(x), ys.append(values))
+    while not port.finished:
+        time.sleep(0.01)
+        plot.update_real_time()
+    plot.update_real_time()
+
+    x, values = np.concatenate(xs), np.hstack(ys)
+    # CSV lines carry 6 significant digits
+    np.testing.assert_allclose(values, y, atol=1e-6)
+    # Plotted at the recorded pace, within the poll interval
+    np.testing.assert_allclose(x, t - t[0], atol=0.03)
@@ -0,0 +1,57 @@
+import numpy as np
+
+from rp_plot.ring_buffer import RingBuffer
+
+
+def block(start, n, channels=2):
+    t = np.arange(start, start + n, dtype=float)
+    return t, np.vstack([t + 1000 * i for i in range(channels)])
+
+
+def test_extend_wraps_around():
+    ring = RingBuffer(8, 2)
+    ring.extend(*block(0, 6))
+    ring.extend(*block(6, 5))
+    t, y = ring.snapshot()
+    np.testing.assert_array_equal(t, np.arange(3, 11))
+    np.testing.assert_array_equal(y[1], np.arange(3, 11) + 1000)
+    assert ring.written == 11
+
+
+def test_extend_larger_than_capacity():
+    ring = RingBuffer(4, 1)
+    ring.extend(*block(0, 10, 1))
+    t, _ = ring.snapshot()
+    np.testing.assert_array_equal(t, [6, 7, 8, 9])
+    assert ring.written == 10
+
+
+def test_read_new_across_the_wrap():
+    ring = RingBuffer(8, 2)
+    ring.extend(*block(0, 6))
+    t, _, cursor, lost = ring.read_new(0)
+    assert len(t) == 6 and lost == 0
+    ring.extend(*block(6, 4))
+    t, y, cursor, lost = ring.read_new(cursor)
+    np.testing.assert_array_equal(t, [6, 7, 8, 9])
+    np.testing.assert_array_equal(y[0], [6, 7, 8, 9])
+    assert cursor == 10 and lost == 0
+
+
+def test_read_new_reports_overwritten_samples():
+    ring = RingBuffer(8, 2)
+    ring.extend(*block(0, 4))
+    _, _, cursor, _ = ring.read_new(0)
+    ring.extend(*block(4, 12))
+    t, _, cursor, lost = ring.read_new(cursor)
+    np.testing.assert_array_equal(t, np.arange(8, 16))
+    assert lost == 4 and ring.lost == 4
+
+
+def test_append_and_snapshot_last():
+    ring = RingBuffer(3, 2)
+    for i in range(5):
+        ring.append(i, (i, -i))
+    t, y = ring.snapshot(2)
+    np.testing.assert_array_equal(t, [3, 4])
+    np.testing.assert_array_equal(y, [[3, 4], [-3, -4]])
@@ -0,0 +1,288 @@
+import socket
+
+import numpy as np
+import pytest
+
+import rp_comm.redpitaya_scpi as scpi
+from rp_comm.redpitaya_scpi import ErrorPolicy, SCPIError
+
+
+@pytest.fixture
+def rp(server):
+    rp = scpi.scpi(server.host, port=server.port)
+    yield rp
+    rp.close()
+
+
+@pytest.fixture
+def pair(server):
+    """Client talking to a raw socket instead of the fake board, to control the framing."""
+    rp = scpi.scpi(server.host, port=server.port)
+    rp._socket.close()
+    rp._socket, peer = socket.socketpair()
+    yield rp, peer
+    peer.close()
+    rp.close()
+
+
+class BrokenSocket:
+    def sendall(self, data):
+        raise ConnectionResetError("connection reset")
+
+    def close(self):
+        pass
+
+
+def test_rx_arb_block(pair):
+    rp, peer = pair
+    payload = np.arange(1000, dtype='>i2').tobytes()
+    peer.sendall(b'#42000' + payload[:500])
+    peer.sendall(payload[500:] + b'\r\n1\r\n')
+    assert bytes(rp.rx_arb()) == payload
+    # The reply after the block is kept
+    assert rp.rx_txt() == '1'
+
+
+def test_rx_arb_into_buffer(pair):
+    rp, peer = pair
+    out = bytearray(16)
+    peer.sendall(b'#18abcdefgh\r\n')
+    data = rp.rx_arb(out=out)
+    assert isinstance(data, memoryview) and bytes(data) == b'abcdefgh'
+    assert out[:8] == b'abcdefgh'
+
+
+def test_rx_arb_invalid_header(pair):
+    rp, peer = pair
+    peer.sendall(b'{1,2}\r\n')
+    assert rp.rx_arb() is False
+
+
+def test_rx_arb_from_board(server, rp):
+    rp.tx_txt('ACQ:DATA:FORMAT BIN')
+    rp.tx_txt('ACQ:SOUR1:DATA?')
+    y = np.frombuffer(rp.rx_arb(), dtype='>f4')
+    assert len(y) == 16384
+
+
+def test_rx_txt_reply_split_across_packets(pair):
+    rp, peer = pair
+    peer.sendall(b'REDPI')
+    peer.sendall(b'TAYA\r')
+    peer.sendall(b'\nnext\r\n')
+    assert rp.rx_txt(chunksize=4) == 'REDPITAYA'
+    assert rp.rx_txt(chunksize=4) == 'next'
+    assert rp.rx_buffered == 0
+
+
+def test_rx_txt_several_replies_in_one_packet(pair):
+    rp, peer = pair
+    peer.sendall(b'1\r\n0,"No error"\r\n')
+    assert rp.rx_txt() == '1'
+    assert rp.rx_txt() == '0,"No error"'
+    assert rp.rx_buffered == 0
+
+
+def test_rx_txt_connection_closed(pair):
+    rp, peer = pair
+    peer.sendall(b'partial')
+    peer.close()
+    with pytest.raises(ConnectionError):
+        rp.rx_txt()
+
+
+def test_batch_single_write(server, rp):
+    commands = server.stats['commands']
+    with rp.batch(opc=True):
+        rp.tx_txt('SOUR1:FREQ:FIX 2000')
+        rp.tx_txt('SOUR1:VOLT 0.5')
+        assert server.stats['commands'] == commands
+    assert server.stats['commands'] == commands + 3
+    assert server.board.get('SOUR1:VOLT') == '0.5'
+
+
+def test_batch_flushed_by_a_read(server, rp):
+    with rp.batch():
+        rp.tx_txt('SOUR1:VOLT 0.25')
+        assert rp.txrx_txt('SOUR1:VOLT?') == '0.25'
+
+
+def test_batch_discarded_on_exception(server, rp):
+    rp.tx_txt('SOUR1:VOLT 0.5')
+    with pytest.raises(RuntimeError):
+        with rp.batch():
+            rp.tx_txt('SOUR1:VOLT 0.75')
+            raise RuntimeError
+    assert rp._batch is None
+    assert rp.state.get('SOUR1:VOLT') == '0.5'
+    assert rp.txrx_txt('SOUR1:VOLT?') == '0.5'
+
+
+def test_batch_send_failure(rp):
+    rp.tx_txt('SOUR1:VOLT 0.5')
+    rp._socket.close()
+    rp._socket = BrokenSocket()
+    with pytest.raises(ConnectionResetError):
+        with rp.batch():
+            rp.tx_txt('SOUR1:VOLT 0.75')
+    # Left batch mode, and the state of the board is unknown
+    assert rp._batch is None
+    assert rp.state.get('SOUR1:VOLT') is None
+
+
+def test_batch_defers_error_check(server, rp):
+    with rp.batch():
+        rp.tx_txt('NOT:A:COMMAND')
+        rp.check_error(stop=False)
+        assert not rp.errors
+    assert [e.code for e in rp.errors] == [-113]
+
+
+def test_check_error_prints_non_fatal(server, rp, capsys):
+    rp.tx_txt('NOT:A:COMMAND')
+    rp.check_error()
+    assert rp.pop_errors() == [scpi.SCPIErrorEntry(-113, 'Undefined header')]
+    assert '-113,"Undefined header"' in capsys.readouterr().out
+
+
+def test_check_error_raises_fatal(server, rp):
+    server.board._error(9501, 'Fatal')
+    server.board._error(-113, 'Undefined header')
+    with pytest.raises(SCPIError) as e:
+        rp.check_error()
+    assert e.value.errors == [scpi.SCPIErrorEntry(9501, 'Fatal')]
+    assert len(rp.errors) == 2
+
+
+def test_check_error_no_stop(server, rp):
+    server.board._error(9501, 'Fatal')
+    rp.check_error(stop=False)
+    assert [e.code for e in rp.errors] == [9501]
+
+
+def test_check_error_every_code_fatal(server):
+    rp = scpi.scpi(server.host, port=server.port, fatal_code=None)
+    rp.tx_txt('NOT:A:COMMAND')
+    with pytest.raises(SCPIError):
+        rp.check_error()
+    rp.close()
+
+
+def test_check_error_deferred(server):
+    rp = scpi.scpi(server.host, port=server.port, error_policy=ErrorPolicy.DEFERRED)
+    server.board._error(9501, 'Fatal')
+    rp.check_error()
+    assert not rp.errors
+    with pytest.raises(SCPIError):
+        with rp.batch():
+            rp.tx_txt('SOUR1:VOLT 0.5')
+    rp.close()
+
+
+def test_check_error_deferred_forced(server):
+    rp = scpi.scpi(server.host, port=server.port, error_policy=ErrorPolicy.DEFERRED)
+    rp.tx_txt('NOT:A:COMMAND')
+    rp.check_error(force=True)
+    assert [e.code for e in rp.errors] == [-113]
+    rp.close()
+
+
+def test_check_error_sampled(server):
+    rp = scpi.scpi(server.host, port=server.port, error_policy=ErrorPolicy.SAMPLED, error_sample=3)
+    rp.tx_txt('NOT:A:COMMAND')
+    rp.check_error()
+    rp.check_error()
+    assert not rp.errors
+    rp.check_error()
+    assert [e.code for e in rp.errors] == [-113]
+    rp.close()
+
+
+def test_check_error_after_batched_queries(server):
+    rp = scpi.scpi(server.host, port=server.port, error_policy=ErrorPolicy.DEFERRED)
+    rp.tx_txt('NOT:A:COMMAND')
+    rp.check_error()
+    with rp.batch():
+        rp.tx_txt('SOUR1:VOLT?')
+        rp.check_error()
+    # The replies are not mixed with the error check
+    assert rp.rx_txt() == '1'
+    assert not rp.errors
+    rp.check_error(force=True)
+    assert [e.code for e in rp.errors] == [-113]
+    rp.close()
+
+
+def test_acq_data_from_cached_settings(server):
+    rp = scpi.scpi(server.host, port=server.port, error_policy=ErrorPolicy.DEFERRED)
+
+    def commands(call):
+        # Commands the board received for the call, *OPC? makes sure all arrived
+        before = server.stats['commands']
+        result = call()
+        rp.txrx_txt('*OPC?')
+        return result, server.stats['commands'] - before - 1
+
+    # Unknown settings are read once: units, format and two input gains
+    y, sent = commands(lambda: rp.acq_data(1))
+    assert sent == 5 and len(y) == 16384
+
+    # Units, format and the error check deferred to the end of the batch
+    _, sent = commands(lambda: rp.acq_set_units_format(scpi.Units.VOLTS, scpi.DataFormat.BIN))
+    assert sent == 3
+    y, sent = commands(lambda: rp.acq_data(1))
+    assert sent == 1 and y.dtype == np.dtype('>f4')
+
+    # Changed by another client, seen after refresh_state()
+    other = scpi.scpi(server.host, port=server.port)
+    other.tx_txt('ACQ:DATA:FORMAT ASCII')
+    other.txrx_txt('*OPC?')
+    other.close()
+    _, sent = commands(rp.refresh_state)
+    assert sent == 4 and rp.state.get('ACQ:DATA:FORMAT') == 'ASCII'
+    y, sent = commands(lambda: rp.acq_data(1))
+    assert sent == 1 and y.dtype == np.float64 and len(y) == 16384
+    rp.close()
+
+
+def test_resets_invalidate_state(rp):
+    rp.tx_txt('SOUR1:FREQ:FIX 1000')
+    rp.tx_txt('SOUR2:FREQ:FIX 2000')
+    rp.tx_txt('ACQ:DEC 8')
+    rp.tx_txt('SOUR1:FUNC:RESET')
+    assert rp.state.get('SOUR1:FREQ:FIX') is None
+    assert rp.state.get('SOUR2:FREQ:FIX') == '2000'
+    rp.tx_txt('SOUR:FUNC:RESET')
+    assert rp.state.get('SOUR2:FREQ:FIX') is None
+    assert rp.state.get('ACQ:DEC:FACTOR') == '8'
+    rp.tx_txt('*RST')
+    assert rp.state.get('ACQ:DEC:FACTOR') is None
+
+
+def test_fake_board_generator_reset(server, rp):
+    rp.tx_txt('SOUR1:VOLT 0.5')
+    rp.tx_txt('SOUR2:VOLT 0.5')
+    rp.tx_txt('SOUR2:FUNC:RESET')
+    assert rp.txrx_txt('SOUR1:VOLT?') == '0.5'
+    assert rp.txrx_txt('SOUR2:VOLT?') == '1'
+    rp.tx_txt('SOUR:FUNC:RESET')
+    assert rp.txrx_txt('SOUR1:VOLT?') == '1'
+    assert not server.board.errors
+
+
+@pytest.mark.parametrize('commands', [
+    ['ACQ:TRig:DLY 0', 'ACQ:TRig:DLY:NS 100', 'ACQ:TRig:DLY 0'],
+    ['ACQ:DEC:Factor 8', 'ACQ:DEC:Factor:CH1 64', 'ACQ:DEC 8'],
+])
+def test_skip_redundant_same_register(server, commands):
+    rp = scpi.scpi(server.host, port=server.port, skip_redundant=True)
+    received = server.stats['commands']
+    for command in commands:
+        rp.tx_txt(command)
+    # The last write sets the register back, it is not redundant
+    rp.txrx_txt('*OPC?')
+    assert server.stats['commands'] == received + len(commands) + 1
+    rp.tx_txt(commands[-1])
+    rp.txrx_txt('*OPC?')
+    assert server.stats['commands'] == received + len(commands) + 2
+    rp.close()
@@ -0,0 +1,93 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from rp_comm.device_state import DeviceState
+from rp_comm.fake_redpitaya import AsyncFakeRedPitaya
+from rp_comm.redpitaya_scpi import DataFormat, ErrorPolicy, SCPIError, Units, Waveform, scpi
+from rp_comm.redpitaya_scpi_async import _CommandRecorder, scpi_async
+
+
+def run(test, **kwargs):
+    """Run ``test(server, rp)`` with a client connected to a fresh fake board."""
+    async def main():
+        async with AsyncFakeRedPitaya() as server:
+            rp = await scpi_async.open(server.host, port=server.port, timeout=5, **kwargs)
+            try:
+                await test(server, rp)
+            finally:
+                await rp.close()
+    asyncio.run(main())
+
+
+def test_query():
+    async def test(server, rp):
+        assert 'REDPITAYA' in (await rp.idn_q()).upper()
+        await rp.tx_txt('SOUR1:VOLT 0.5')
+        assert await rp.txrx_txt('SOUR1:VOLT?') == '0.5'
+    run(test)
+
+
+def test_block_read_matches_ascii():
+    async def test(server, rp):
+        await rp.gen_set(1, Waveform.SINE, 0.5, 1000)
+        await rp.tx_txt('OUTPUT1:STATE ON')
+        await rp.acq_set_units_format(Units.VOLTS, DataFormat.ASCII)
+        ascii = await rp.acq_data(1)
+        await rp.acq_set_units_format(data_format=DataFormat.BIN)
+        binary = await rp.acq_data(1)
+        assert binary.dtype == np.dtype('>f4') and len(binary) == 16384
+        np.testing.assert_allclose(binary, ascii, atol=1e-6)
+    run(test)
+
+
+def test_batch():
+    async def test(server, rp):
+        async with rp.batch(opc=True):
+            await rp.gen_set(1, Waveform.SQUARE, 0.25, 2000)
+            await rp.tx_txt('SOUR2:VOLT 0.5')
+            assert server.board.get('SOUR2:VOLT') != '0.5'
+        assert server.board.get('SOUR1:FREQ:FIX') == '2000'
+        assert server.board.get('SOUR2:VOLT') == '0.5'
+
+        # A failing block sends nothing and keeps the previous shadow state
+        with pytest.raises(RuntimeError):
+            async with rp.batch():
+                await rp.tx_txt('SOUR2:VOLT 0.75')
+                raise RuntimeError
+        assert rp.state.get('SOUR2:VOLT') == '0.5'
+        assert await rp.txrx_txt('SOUR2:VOLT?') == '0.5'
+    run(test)
+
+
+def test_error_policy_immediate():
+    async def test(server, rp):
+        await rp.tx_txt('NOT:A:COMMAND')
+        await rp.check_error()
+        assert [e.code for e in rp.pop_errors()] == [-113]
+        server.board._error(9501, 'Fatal')
+        with pytest.raises(SCPIError):
+            await rp.check_error()
+    run(test)
+
+
+def test_error_policy_deferred():
+    async def test(server, rp):
+        server.board._error(9501, 'Fatal')
+        await rp.check_error()
+        assert not rp.errors
+        with pytest.raises(SCPIError):
+            async with rp.batch():
+                await rp.tx_txt('SOUR1:VOLT 0.5')
+    run(test, error_policy=ErrorPolicy.DEFERRED)
+
+
+def test_command_recorder_has_scpi_attributes(server):
+    # A setter may read any attribute of the blocking client
+    rp = scpi(server.host, port=server.port)
+    recorder = _CommandRecorder(DeviceState())
+    assert set(vars(rp)) <= set(vars(recorder))
+    rp.close()
+    recorder.acq_set(64, Units.VOLTS, DataFormat.BIN)
+    assert recorder.commands[0] == 'ACQ:DEC:Factor 64'
@@ -0,0 +1,23 @@
+import numpy as np
+
+from rp_plot.serial_reader import SerialReader
+
+
+def test_samples_spread_between_reads():
+    reader = SerialReader(None, n_channels=2, capacity=100)
+    reader.feed(b'1,2\n3,4\n', 10.0)
+    reader.feed(b'5,6\n7,8\n9,', 12.0)
+    reader.feed(b'10\n', 13.0)
+    t, y = reader.ring.snapshot()
+    # The first read has no start, its samples are stamped with its time
+    np.testing.assert_allclose(t, [10, 10, 11, 12, 13])
+    np.testing.assert_array_equal(y[0], [1, 3, 5, 7, 9])
+
+
+def test_read_without_samples_moves_the_start():
+    reader = SerialReader(None, n_channels=2, capacity=100)
+    reader.feed(b'1,2\n', 10.0)
+    reader.feed(b'3,', 14.0)
+    reader.feed(b'4\n5,6\n', 16.0)
+    t, _ = reader.ring.snapshot()
+    np.testing.assert_allclose(t, [10, 15, 16])